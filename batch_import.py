@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module imports many PSS Sincal projects at once with the
+ImporterXMLSincal. Each export folder is imported, repaired and converted to a
+PyPSA network in a pool of worker processes. The networks are pickled to an
+output directory together with a summary of the run time and errors of each
+folder. A failing folder does not stop the others.
+
+Usage from the command line:
+
+    python batch_import.py exports/feeder_* -o networks -p 8
+"""
+
+import os
+import sys
+import glob
+import time
+import pickle
+import argparse
+import contextlib
+import multiprocessing
+import pandas as pd
+
+from xml_to_pypsa import ImporterXMLSincal
+
+
+def find_folders(patterns):
+    """
+    Expands the given folders and glob patterns to a sorted list of existing
+    directories.
+
+    Parameters
+    ----------
+    patterns: list
+        folders or glob patterns
+
+    Returns
+    -------
+    folders: list
+    """
+    folders = set()
+    for pattern in patterns:
+        folders.update(path for path in glob.glob(pattern)
+                       if os.path.isdir(path))
+    return sorted(folders)
+
+
+def import_folder(job):
+    """
+    Imports one export folder and stores the network as pickle in the output
+    directory. All errors are caught and returned in the summary.
+
+    Parameters
+    ----------
+    job: tuple
+        (folder, name, output directory, cache directory, parameters of
+        ImporterXMLSincal.build_network, quiet)
+
+    Returns
+    -------
+    summary: dict
+        name, folder, status, run time, size of the network and error
+    """
+    folder, name, output, cachedir, params, quiet = job
+    folder = os.path.abspath(folder)
+    summary = {'name': name,
+               'folder': folder,
+               'status': 'ok',
+               'seconds': 0.,
+               'buses': 0,
+               'lines': 0,
+               'error': ''}
+    start = time.time()
+    try:
+        with open(os.devnull, 'w') as devnull:
+            stdout = devnull if quiet is True else sys.stdout
+            with contextlib.redirect_stdout(stdout):
+                imp = ImporterXMLSincal(name,
+                                        foldername=os.path.basename(folder),
+                                        path=os.path.dirname(folder))
+                imp.build_network(cachedir=cachedir, **params)
+        with open(os.path.join(output, name + '.p'), 'wb') as file:
+            pickle.dump(imp.network, file, protocol=pickle.HIGHEST_PROTOCOL)
+        summary['buses'] = len(imp.network.buses)
+        summary['lines'] = len(imp.network.lines)
+    except Exception as error:
+        summary['status'] = 'failed'
+        summary['error'] = '{}: {}'.format(type(error).__name__, error)
+    summary['seconds'] = time.time() - start
+    return summary
+
+
+def batch_import(folders,
+                 output,
+                 processes=None,
+                 cachedir=None,
+                 quiet=True,
+                 **params):
+    """
+    Imports all given export folders in a pool of worker processes and
+    writes the networks and a summary (summary.csv) to output.
+
+    Parameters
+    ----------
+    folders: list
+        export folders or glob patterns
+    output: str
+        output directory
+    processes: int, default None
+        number of worker processes; if None, all cores are used
+    cachedir: str, default None
+        cache directory of ImporterXMLSincal.build_network
+    quiet: boolean, default True
+        suppress the output of the importer
+    params:
+        further parameters of ImporterXMLSincal.build_network
+
+    Returns
+    -------
+    summary: pd.DataFrame
+    """
+    folders = find_folders(folders)
+    if not os.path.exists(output):
+        os.makedirs(output)
+
+    # the folder names are used as network names, so they must be unique:
+    jobs = []
+    names = set()
+    for folder in folders:
+        name = os.path.basename(os.path.normpath(folder))
+        i = 1
+        new_name = name
+        while new_name in names:
+            new_name = name + '_' + str(i)
+            i += 1
+        names.add(new_name)
+        jobs += [(folder, new_name, output, cachedir, params, quiet)]
+    print('importing {} folders'.format(len(jobs)))
+
+    summary = []
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(import_folder, jobs):
+            print('{}: {} after {:.1f} s {}'.format(result['name'],
+                                                    result['status'],
+                                                    result['seconds'],
+                                                    result['error']))
+            summary += [result]
+    finally:
+        pool.close()
+        pool.join()
+
+    summary = pd.DataFrame(summary,
+                           columns=['name', 'folder', 'status', 'seconds',
+                                    'buses', 'lines', 'error'])
+    summary = summary.set_index('name').sort_index()
+    summary.to_csv(os.path.join(output, 'summary.csv'))
+    print('{} of {} folders failed'.format(
+            (summary['status'] == 'failed').sum(), len(summary)))
+    return summary
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+            description='Import PSS Sincal xml exports to PyPSA networks.')
+    parser.add_argument('folders', nargs='+',
+                        help='export folders or glob patterns')
+    parser.add_argument('-o', '--output', default='networks',
+                        help='output directory (default: networks)')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--cache', default=None,
+                        help='cache directory for the built networks')
+    parser.add_argument('--net-voltage', default='0',
+                        help='net operating voltage (default: from Sincal)')
+    parser.add_argument('--no-breaker', action='store_true',
+                        help='ignore breakers')
+    parser.add_argument('--no-repair', action='store_true',
+                        help='do not repair lines with more than two nodes')
+    parser.add_argument('--dummyparameters', action='store_true',
+                        help='set dummy parameters to lines without r, x, b')
+    parser.add_argument('--reduce', action='store_true',
+                        help='reduce the network before the import')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='show the output of the importer')
+    args = parser.parse_args(args)
+
+    summary = batch_import(args.folders,
+                           args.output,
+                           processes=args.processes,
+                           cachedir=args.cache,
+                           quiet=not args.verbose,
+                           set_net_voltage=args.net_voltage,
+                           with_breaker=not args.no_breaker,
+                           repair=not args.no_repair,
+                           dummyparameters=args.dummyparameters,
+                           reduce=args.reduce)
+    return int((summary['status'] == 'failed').any())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
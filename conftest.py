@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixtures of the tests: a small xml-export of PSS-Sincal and small converted
+networks.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from xml_to_pypsa import ImporterXMLSincal
+
+ROWSET = ('<xml xmlns:s="uuid:BDC6E3F0-6DA3-11d1-A2A3-00AA00C14882" '
+          'xmlns:dt="uuid:C2F41010-65B3-11d1-A29F-00AA00C14882" '
+          'xmlns:rs="urn:schemas-microsoft-com:rowset" '
+          'xmlns:z="#RowsetSchema">\n<rs:data>\n{}</rs:data>\n</xml>\n')
+
+
+def write_table(directory, filename, rows):
+    """
+    Writes the rows (list of dicts) as an xml-file in the rowset format of
+    the Sincal export.
+    """
+    lines = ''.join('<z:row {}/>\n'.format(' '.join(
+            '{}="{}"'.format(key, value) for key, value in row.items()))
+                    for row in rows)
+    with open(os.path.join(directory, filename), 'w') as file:
+        file.write(ROWSET.format(lines))
+
+
+def write_export(directory):
+    """
+    Writes a 0.4 kV feeder fed by the Infeeder 'I1' at node 1: lines
+    1-2, 2-3, 3-4 and 2-5, a load at node 4 and an open breaker at the
+    terminal of line 'L4' at node 5. No node belongs to an eco-station, so
+    the infeeder is the only slack.
+    """
+    os.makedirs(directory)
+    nodes = ['1', '2', '3', '4', '5']
+    write_table(directory, 'Node.xml',
+                [{'Node_ID': node, 'VoltLevel_ID': '0.4',
+                  'EcoStation_ID': '0',
+                  'Name': 'N' + node} for node in nodes])
+    write_table(directory, 'GraphicNode.xml',
+                [{'Node_ID': node, 'NodeStartX': str(350000 + 100 * i),
+                  'NodeStartY': '5650000'} for i, node in enumerate(nodes)])
+    write_table(directory, 'CalcParameter.xml', [{'Uref': '0.4', 'f': '50'}])
+    write_table(directory, 'EcoStation.xml',
+                [{'EcoStation_ID': '1', 'Flag_Typ': '3'}])
+    lines = [('L1', '1', '2'), ('L2', '2', '3'), ('L3', '3', '4'),
+             ('L4', '2', '5')]
+    write_table(directory, 'Line.xml',
+                [{'Element_ID': name, 'Ith': '0.25', 'Un': '0.4', 'c': '0',
+                  'fn': '50', 'l': '0.1', 'q': '150', 'r': '0.2',
+                  'x': '0.08', 'r0': '0.8', 'x0': '0.32'}
+                 for name, _, _ in lines])
+    elements = [(name, 'Line') for name, _, _ in lines]
+    elements += [('I1', 'Infeeder'), ('D1', 'Load')]
+    write_table(directory, 'Element.xml',
+                [{'Element_ID': name, 'Type': kind}
+                 for name, kind in elements])
+    terminals = []
+    for name, bus0, bus1 in lines:
+        terminals += [(name + '_1', name, bus0, '1'),
+                      (name + '_2', name, bus1, '2')]
+    terminals += [('I1_1', 'I1', '1', '1'), ('D1_1', 'D1', '4', '1')]
+    write_table(directory, 'Terminal.xml',
+                [{'Terminal_ID': term, 'Element_ID': name, 'Node_ID': node,
+                  'TerminalNo': num} for term, name, node, num in terminals])
+    write_table(directory, 'Load.xml', [{'Element_ID': 'D1', 'Eap': '3000'}])
+    write_table(directory, 'Breaker.xml',
+                [{'Terminal_ID': 'L4_2', 'Flag_State': '0'}])
+    write_table(directory, 'Infeeder.xml',
+                [{'Element_ID': 'I1', 'Sk2': '100', 'R_X': '0.2'}])
+
+
+@pytest.fixture
+def export(tmp_path):
+    """
+    Importer of the xml-export of write_export (not imported yet).
+    """
+    write_export(str(tmp_path / 'grid'))
+    return ImporterXMLSincal('grid', 'grid', path=str(tmp_path))
+
+
+
+def make_feeder(nbuses=8, nsnaps=24, mesh=False, seed=0):
+    """
+    Importer with the converted dataframes of a 0.4 kV feeder 0-1-...-n
+    with the slack at bus 0, a load at all other buses and random load
+    series; with mesh a line from the last bus back to bus 2 is added.
+    """
+    random = np.random.RandomState(seed)
+    importer = ImporterXMLSincal('feeder', 'feeder')
+    buses = [str(i) for i in range(nbuses)]
+    importer.buses = pd.DataFrame({'v_nom': 0.4,
+                                   'x': np.arange(nbuses, dtype=float),
+                                   'y': 0.,
+                                   'carrier': 'AC'},
+                                  index=pd.Index(buses, name='name'))
+    rows = [(str(i), str(i-1), str(i)) for i in range(1, nbuses)]
+    if mesh is True:
+        rows += [('m', str(nbuses-1), '2')]
+    importer.lines = pd.DataFrame(
+            {'bus0': [row[1] for row in rows],
+             'bus1': [row[2] for row in rows],
+             'r': random.uniform(0.02, 0.06, len(rows)),
+             'x': random.uniform(0.01, 0.03, len(rows)),
+             'b': 0.,
+             's_nom': 0.2},
+            index=pd.Index([row[0] for row in rows], name='name'))
+    importer.generators = pd.DataFrame({'control': 'slack', 'bus': '0'},
+                                       index=['g0'])
+    importer.loads = pd.DataFrame({'bus': buses[1:], 'p_set': 0.01},
+                                  index=['l' + bus for bus in buses[1:]])
+    snapshots = pd.date_range('2019-01-01', periods=nsnaps, freq='15min')
+    importer.snapshots = pd.Series(1., index=snapshots, name='weighting')
+    importer.loads_p_set = pd.DataFrame(
+            random.uniform(0., 0.02, (nsnaps, nbuses-1)),
+            index=snapshots, columns=importer.loads.index)
+    return importer
+
+
+@pytest.fixture
+def feeder():
+    """
+    Factory of converted feeders, see make_feeder.
+    """
+    return make_feeder
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module provides a fast N-1 contingency screening for the networks
+converted by ImporterXMLSincal. The flows after the outage of each single line
+are calculated for all snapshots with line outage distribution factors (LODF)
+derived from the cached PTDF (see module ptdf). Only the violations of s_nom
+are reported.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class ContingencyScreening():
+    """
+    N-1 screening of single line outages with LODF.
+
+    Parameters
+    ----------
+    engine: ptdf.PTDF
+        PTDF-engine of the network
+    s_nom: pd.Series
+        thermal limit of the lines in MVA
+    outages: list, default None
+        lines to be outaged; if None, all lines connected to a slack
+    """
+
+    def __init__(self, engine, s_nom, outages=None):
+        self.engine = engine
+        lines = engine.lines
+        self.s_nom = s_nom.reindex(lines).astype(float).values
+        supplied = ~lines.isin(engine.lines_unsupplied)
+        if outages is None:
+            outages = lines[supplied]
+        self.outages = pd.Index(outages)
+        self._lodf = None
+
+    @classmethod
+    def from_importer(cls, importer, outages=None):
+        """
+        Creates the screening from the converted lines of an
+        ImporterXMLSincal, using its cached PTDF.
+        """
+        return cls(importer.ptdf(), importer.lines['s_nom'], outages=outages)
+
+    @property
+    def lodf(self):
+        """
+        The LODF matrix (lines x outages). Column k holds the change of the
+        line flows per MW flow on the outaged line k before the outage.
+        Outages that split the network (e.g. of radial lines) have nan
+        columns; they are listed in self.islanding.
+        """
+        if self._lodf is None:
+            engine = self.engine
+            ptdf = np.nan_to_num(engine.ptdf)
+            out = engine.lines.get_indexer(self.outages)
+            # flow change on all lines for a transfer between the ends of
+            # the outaged lines:
+            incidence = engine.incidence[out]
+            transfer = (incidence @ ptdf.T).T
+            own = transfer[out, np.arange(len(out))]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                lodf = transfer / (1. - own)
+            islanding = np.isclose(own, 1.)
+            lodf[:, islanding] = np.nan
+            lodf[out, np.arange(len(out))] = -1.
+            self.islanding = self.outages[islanding]
+            self._lodf = lodf
+        return self._lodf
+
+    def screen(self, flows, threshold=1., max_elements=int(1e7)):
+        """
+        Screens all single line outages for all snapshots.
+
+        Parameters
+        ----------
+        flows: pd.DataFrame
+            snapshots x lines, flows before the outage in MW (e.g. from
+            PTDF.flows or ImporterXMLSincal.ptdf_flows)
+        threshold: float, default 1.
+            violations are reported, if |flow| > threshold * s_nom
+        max_elements: int, default 1e7
+            maximum size of the intermediate snapshots x lines x outages
+            arrays; limits the memory used.
+
+        Returns
+        -------
+        violations: pd.DataFrame
+            one row per violation with the columns snapshot, outage, line,
+            flow, s_nom and loading. Violations in the base case have an
+            empty outage.
+        """
+        lodf = self.lodf
+        lines = self.engine.lines
+        out = lines.get_indexer(self.outages)
+        f = flows.reindex(columns=lines).values
+        limit = threshold * np.where(self.s_nom > 0, self.s_nom, np.inf)
+        valid = ~np.isnan(lodf).any(axis=0)
+
+        violations = []
+        # base case:
+        t, l = np.nonzero(np.abs(f) > limit)
+        violations += [(t, np.full(len(t), -1), l, f[t, l])]
+
+        nsnaps, nlines = f.shape
+        per_outage = max(1, nsnaps * nlines)
+        chunk = max(1, max_elements // per_outage)
+        snapchunk = nsnaps if chunk > 1 else max(1, max_elements // nlines)
+        cols = np.flatnonzero(valid)
+        for start in range(0, len(cols), chunk):
+            k = cols[start:start+chunk]
+            for t0 in range(0, nsnaps, snapchunk):
+                ft = f[t0:t0+snapchunk]
+                # flows of all lines after each outage in this chunk:
+                post = ft[:, :, None] + ft[:, None, out[k]] * lodf[None, :, k]
+                # the outaged line itself carries no flow:
+                post[:, out[k], np.arange(len(k))] = 0.
+                t, l, kk = np.nonzero(np.abs(post) > limit[None, :, None])
+                violations += [(t + t0, k[kk], l, post[t, l, kk])]
+
+        t, k, l, flow = (np.concatenate(v) for v in zip(*violations))
+        # k = -1 (base case) picks the empty name appended at the end; this
+        # also works without outages:
+        names = np.append(np.asarray(self.outages, dtype=object), '')
+        outage = names[k]
+        violations = pd.DataFrame({'snapshot': flows.index[t],
+                                   'outage': outage,
+                                   'line': lines[l],
+                                   'flow': flow,
+                                   's_nom': self.s_nom[l]})
+        violations['loading'] = violations['flow'].abs() / violations['s_nom']
+        violations = violations.sort_values(['snapshot', 'loading'],
+                                            ascending=[True, False])
+        print('{} violations found, {} outages split the network'.format(
+                len(violations), len(self.islanding)))
+        return violations.reset_index(drop=True)
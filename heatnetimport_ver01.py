@@ -7,12 +7,15 @@ Created on Tue Oct  9 17:14:55 2018
 """
 
 import os
+import copy
+import collections
+import multiprocessing
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 import networkx as nx
-import matplotlib.pyplot as plt
-import operator
 import pickle
-import pylab
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
 
 from tespy import nwk, con, subsys, cmp
 from tespy.helpers import MyComponentError
@@ -23,6 +26,41 @@ from dhs_comps import simple_fork as sf
 from dhs_comps import pipe_fb as pipe
 
 from xmlimport import XMLimport
+from spatialindex import SpatialIndex
+from hydraulics import HydraulicSolver
+
+
+def _solve_partition(job):
+    """
+    Creates and solves the TESPy network of one partition in a worker
+    process (see DHimport.solve_partitions) and returns the results of its
+    connections. Errors are returned instead of raised, so that one failing
+    partition does not abort the other ones.
+    """
+    part, directory, kwargs = job
+    try:
+        part.createTESPynet(part.name, directory=directory, **kwargs)
+        results = pd.read_csv(os.path.join(directory, part.name,
+                                           'results.csv'),
+                              sep=';', decimal='.')
+    except Exception as error:
+        return part.name, None, '{}: {}'.format(type(error).__name__, error)
+    return part.name, results, None
+
+
+def _run_timeseries_block(job):
+    """
+    Creates the TESPy network of one block of snapshots in a worker process
+    and runs the time series of the block (see DHimport.run_timeseries).
+    Errors are returned instead of raised, like in _solve_partition.
+    """
+    part, name, demand, T_amb, outdir, kwargs = job
+    try:
+        summary = part.run_timeseries(name, demand, T_amb=T_amb,
+                                      outdir=outdir, **kwargs)
+    except Exception as error:
+        return name, None, '{}: {}'.format(type(error).__name__, error)
+    return name, summary, None
 
 
 class DHimport():
@@ -119,46 +157,334 @@ class DHimport():
             self.xmls[name] = pickle.load(open(filename, 'rb'))
 
     # %%
+    def fingerprint(self, **params):
+        """
+        Returns a fingerprint of the xml-files of the network and the given
+        parameters, see XMLimport.fingerprint.
+        """
+        xml = XMLimport(self.name, foldername=self.foldername,
+                        list_file=self.list_file)
+        return xml.fingerprint(extra=params)
+
+    def solve_design(self, init_file=None, max_iter=10, printdata=False):
+        """
+        Solves self.nw in design mode. With init_file (results.csv of an
+        earlier solution, see TESPy's network.save) the mass flows,
+        pressures and enthalpies of all matching connections are used as
+        starting values, so a repeated calculation needs only a few
+        iterations. If printdata is set to True, the starting values and the
+        iterations are printed.
+        """
+        if printdata is True and init_file is not None:
+            print('warm start from {}'.format(init_file))
+        self.nw.solve('design', init_file=init_file, max_iter=max_iter)
+        if printdata is True:
+            print('design solved in {} iterations (residual {:.2e})'.format(
+                    self.nw.iter, self.nw.res[-1]))
+
+    # %%
+    def terminal_topology(self):
+        """
+        Returns the incidence of the nodes and elements of flowTerminal with
+        integer codes. It is built once and reused, as long as flowTerminal
+        is not replaced (e.g. by prune_deadends or reducenetwork).
+
+        Returns
+        -------
+        topology: dict
+            nodes (pd.Index of Node_ID, sorted), elements (pd.Index of
+            Element_ID), node_code and element_code (per terminal),
+            incidence (csr, nodes x elements, number of terminals), degree
+            (number of terminals per node) and terminals (the table)
+        """
+        terminals = self.xmls['flowTerminal']
+        topology = getattr(self, '_topology', None)
+        if topology is not None and topology['terminals'] is terminals:
+            return topology
+        node_code, nodes = pd.factorize(terminals['Node_ID'], sort=True)
+        element_code, elements = pd.factorize(pd.Series(terminals.index))
+        incidence = sp.csr_matrix((np.ones(len(terminals)),
+                                   (node_code, element_code)),
+                                  shape=(len(nodes), len(elements)))
+        self._topology = {'nodes': nodes,
+                          'elements': elements,
+                          'node_code': node_code,
+                          'element_code': element_code,
+                          'incidence': incidence,
+                          'degree': np.bincount(node_code,
+                                                minlength=len(nodes)),
+                          'terminals': terminals}
+        return self._topology
+
     def creategraph(self, draw=True):
         """
         This function creates a networkx graph from the imported xml dataframes
         to validate the district heating network and further process it.
-        
+        The nodes (flowNode and the nodes of flowTerminal) get integer codes
+        (self.graph_nodes), the pipes are the edges between the codes of
+        their two terminals (self.edge_codes), taken from terminal_topology
+        in one pass. The coordinates are kept as array (self.node_coords).
+        The queries degree_histogram, components and cycles work on these
+        arrays; self.g is created from them at once.
+
         Parameters
         ----------
         draw: boolean, default "True"
-            
+            draw the graph with matplotlib (only imported then)
+
         +++
         TODO: implement checking functions (e.g. to check if the necessary
         DataFrames are available)
         +++
         """
-
-        self.g = nx.Graph()
-
-        nodes = list(self.xmls['flowNode'].index)
-        x = self.xmls['flowGraphicNode']['NodeStartX']
-        y = self.xmls['flowGraphicNode']['NodeStartY']
-        for node in nodes:
-            self.g.add_node(node, pos=tuple([float(x[node]), float(y[node])]))
+        topology = self.terminal_topology()
+        nodes = self.xmls['flowNode'].index
+        nodes = nodes.append(topology['nodes'].difference(nodes))
+        coords = self.xmls['flowGraphicNode'].reindex(nodes)
+        self.node_coords = np.column_stack(
+                [coords['NodeStartX'].astype(float).values,
+                 coords['NodeStartY'].astype(float).values])
         print("{} nodes in the network.".format(self.xmls['flowNode'].index.size))
 
-        ### Diese Zeile produziert eine Warnung... Scheint aber nicht so schlimm zu sein...
-        self.flowlines = self.xmls['flowTerminal'][self.xmls['flowElement']['Type'] == 'FlowLine']
-        edges_gen = self.flowlines.groupby('Element_ID')['Node_ID']
-        b = pd.DataFrame(edges_gen.first())
-        b['Node_ID2'] = edges_gen.last()
-        self.edges = b[['Node_ID', 'Node_ID2']].apply(tuple, axis=1)
-        self.g.add_edges_from(self.edges.values)
+        types = self.xmls['flowElement']['Type'].reindex(topology['elements'])
+        lines = np.flatnonzero((types == 'FlowLine').values)
+        # first and last node of each pipe (both the same for self-loops):
+        by_element = topology['incidence'].T.tocsr()
+        code = nodes.get_indexer(topology['nodes'])
+        first = code[by_element.indices[by_element.indptr[lines]]]
+        last = code[by_element.indices[by_element.indptr[lines + 1] - 1]]
+        self.graph_nodes = nodes
+        self.edge_codes = np.column_stack([first, last])
+        self.edges = pd.DataFrame({'Node_ID': nodes[first],
+                                   'Node_ID2': nodes[last]},
+                                  index=topology['elements'][lines])
+        self._graph_terminals = topology['terminals']
+
+        self.g = nx.Graph()
+        self.g.add_nodes_from(zip(nodes, ({'pos': tuple(xy)}
+                                          for xy in self.node_coords)))
+        self.g.add_edges_from(zip(self.edges['Node_ID'],
+                                  self.edges['Node_ID2']))
         print("{} edges in the network.".format(len(self.g.edges)))
-        pos = nx.get_node_attributes(self.g, 'pos')
         if draw == True:
-            # nx.draw(self.g,pos,node_size=10)
-            pylab.figure(1)
+            import matplotlib.pyplot as plt
+            pos = nx.get_node_attributes(self.g, 'pos')
+            plt.figure(1)
             nx.draw(self.g, pos)
             nx.draw_networkx_labels(self.g, pos, node_size=0.1)
             plt.draw()
 
+    def _graph(self):
+        # (re)creates the graph of creategraph, if flowTerminal changed:
+        if getattr(self, '_graph_terminals', None) is not \
+                self.xmls['flowTerminal']:
+            self.creategraph(draw=False)
+
+    def degree_histogram(self):
+        """
+        Returns the number of nodes per degree (number of pipes at the node,
+        a self-loop counts twice) of the graph of creategraph.
+
+        Returns
+        -------
+        histogram: pd.Series
+            index degree
+        """
+        self._graph()
+        degree = np.bincount(self.edge_codes.ravel(),
+                             minlength=len(self.graph_nodes))
+        histogram = np.bincount(degree)
+        return pd.Series(histogram, index=pd.RangeIndex(len(histogram),
+                                                        name='degree'))
+
+    def components(self, extra_edges=None):
+        """
+        Finds the connected components of the graph of creategraph.
+
+        Parameters
+        ----------
+        extra_edges: np.array, default None
+            further edges (n x 2 codes of self.graph_nodes), e.g. the
+            pressure regulators
+
+        Returns
+        -------
+        components: pd.Series
+            number of the component of each node (index Node_ID)
+        """
+        self._graph()
+        edges = self.edge_codes
+        if extra_edges is not None:
+            edges = np.vstack([edges, np.asarray(extra_edges, dtype=int)])
+        n = len(self.graph_nodes)
+        adjacency = sp.csr_matrix((np.ones(len(edges)),
+                                   (edges[:, 0], edges[:, 1])), shape=(n, n))
+        ncomp, labels = connected_components(adjacency, directed=False)
+        return pd.Series(labels, index=self.graph_nodes)
+
+    def cycles(self):
+        """
+        Finds the meshes of the graph of creategraph: the pipes that are not
+        part of a spanning forest. Each of them closes one independent cycle
+        (the cycle basis), so their number is edges - nodes + components.
+        Parallel pipes and self-loops are cycles as well.
+
+        Returns
+        -------
+        chords: pd.Index
+            Element_IDs of the pipes closing a cycle
+        """
+        self._graph()
+        edges = self.edge_codes
+        n = len(self.graph_nodes)
+        low = edges.min(axis=1)
+        high = edges.max(axis=1)
+        # one weighted edge per pair of nodes (the first pipe), the weights
+        # are the positions + 1, so the tree edges can be mapped back:
+        pair = pd.Series(np.arange(len(edges))).groupby(
+                [low, high]).first().values
+        pair = pair[low[pair] != high[pair]]
+        weights = sp.csr_matrix((pair + 1., (low[pair], high[pair])),
+                                shape=(n, n))
+        tree = minimum_spanning_tree(weights).tocoo()
+        in_tree = np.zeros(len(edges), dtype=bool)
+        in_tree[np.round(tree.data).astype(int) - 1] = True
+        chords = self.edges.index[~in_tree]
+        print('{} independent cycles in the network.'.format(len(chords)))
+        return chords
+
+    # %%
+    def spatial_index(self):
+        """
+        Returns a KD-tree over the UTM coordinates of FlowGraphicNode (see
+        spatialindex.SpatialIndex). The index is cached and only built
+        again, if the coordinates changed.
+        """
+        nodes = self.xmls['flowGraphicNode'].reindex(self.xmls['flowNode'].index)
+        x = nodes['NodeStartX'].astype(float).values
+        y = nodes['NodeStartY'].astype(float).values
+        key = SpatialIndex.coordinatekey(x, y, nodes.index)
+        if getattr(self, '_spatial', None) is None or self._spatial_key != key:
+            self._spatial = SpatialIndex(x, y, nodes.index)
+            self._spatial_key = key
+        return self._spatial
+
+    # %%
+    def partitions(self):
+        """
+        Finds the hydraulically independent partitions of the network: the
+        connected components of the graph of creategraph (pipes), joined by
+        the pressure regulators.
+        The pressure regulators are not used as borders, because the
+        partitions on both sides would need boundary models (pressure and
+        mass flow at the regulator) to be solved independently.
+
+        Returns
+        -------
+        partitions: pd.Series
+            number of the partition of each node (index Node_ID)
+        """
+        self._graph()
+        terminals = self.xmls['flowTerminal']
+        regulators = terminals[terminals.index.isin(
+                self.xmls['flowPressureReg'].index)]
+        nodes = regulators.groupby(level=0)['Node_ID']
+        extra = np.column_stack(
+                [self.graph_nodes.get_indexer(nodes.first()),
+                 self.graph_nodes.get_indexer(nodes.last())])
+        return self.components(extra_edges=extra)
+
+    def split(self):
+        """
+        Splits the importer into one importer per partition (see partitions)
+        with the filtered xml-tables. Partitions without infeeder cannot be
+        calculated and are left out.
+
+        Returns
+        -------
+        parts: list
+            DHimport objects named name_p<number>
+        """
+        partitions = self.partitions()
+        terminals = self.xmls['flowTerminal']
+        element_part = pd.Series(
+                partitions.reindex(terminals['Node_ID']).values,
+                index=terminals.index).groupby(level=0).first()
+        infeeders = set(element_part.reindex(
+                self.xmls['flowInfeeder'].index).dropna())
+        unsupplied = set(partitions) - infeeders
+        if len(unsupplied) > 0:
+            print('WARNING: {} partitions without infeeder are left '
+                  'out.'.format(len(unsupplied)))
+        parts = []
+        for number in sorted(infeeders):
+            nodes = partitions.index[partitions == number]
+            elements = element_part.index[element_part == number]
+            part = copy.copy(self)
+            part.name = '{}_p{}'.format(self.name, int(number))
+            part.xmls = {}
+            for name, table in self.xmls.items():
+                if name in ['flowNode', 'flowGraphicNode', 'flowHSNodeResult']:
+                    table = table[table.index.isin(nodes)]
+                elif name != 'flowNetworkLevel':
+                    table = table[table.index.isin(elements)]
+                part.xmls[name] = table
+            for attr in ['g', 'nw', '_spatial']:
+                part.__dict__.pop(attr, None)
+            parts += [part]
+        print('{} partitions with infeeder found.'.format(len(parts)))
+        return parts
+
+    def solve_partitions(self, processes=None, directory=None, **kwargs):
+        """
+        Creates and solves a separate TESPy network for each partition (see
+        split) in a pool of worker processes and merges the results of the
+        connections. Failing partitions are reported and stored in
+        self.failed_partitions, while the other ones are still calculated.
+
+        Parameters
+        ----------
+        processes: int, default None
+            number of worker processes; if None, all cores are used
+        directory: str, default None
+            directory the networks of the partitions are saved to (one
+            subfolder per partition); if None, the working directory
+        kwargs:
+            further parameters of createTESPynet (e.g. warmstart_dir)
+
+        Returns
+        -------
+        results: pd.DataFrame
+            results of all connections (see TESPy's results.csv) with the
+            column partition
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        # the workers get the absolute path, independent of their directory:
+        directory = os.path.abspath('.' if directory is None else directory)
+        parts = self.split()
+        jobs = ((part, directory, kwargs) for part in parts)
+        results = []
+        self.failed_partitions = {}
+        pool = multiprocessing.Pool(processes)
+        try:
+            for name, part_results, error in pool.imap_unordered(
+                    _solve_partition, jobs):
+                if error is not None:
+                    print('partition {} failed: {}'.format(name, error))
+                    self.failed_partitions[name] = error
+                    continue
+                part_results['partition'] = name
+                results += [part_results]
+        finally:
+            pool.close()
+            pool.join()
+        print('{} of {} partitions failed'.format(len(self.failed_partitions),
+                                                  len(parts)))
+        self.partition_results = (pd.concat(results, ignore_index=True)
+                                  if results else pd.DataFrame())
+        return self.partition_results
+
     def link(self, comp1, comp2, num1=2, num2=1):
         """
         This function connects two components withfeed and back.
@@ -223,21 +549,673 @@ class DHimport():
 #            raise
         return conns
 
-    def createTESPynet(self, name):
+    # %%
+    def prune_deadends(self):
+        """
+        Removes all dead-ends of the network in one pass: elements at nodes
+        with only one terminal are removed, as long as this creates new
+        dead-ends (chains of pipes). The nodes to be checked are kept in a
+        queue with their number of terminals (see terminal_topology).
+        Afterwards flowTerminal, flowElement, flowLine and the component
+        tables are filtered once.
+
+        Returns
+        -------
+        pruned: pd.Index
+            Element_IDs of the removed elements
+        """
+        terminals = self.xmls['flowTerminal']
+        topology = self.terminal_topology()
+        elements = topology['elements']
+        # node x element incidence and its transpose, both as csr:
+        elements_of = topology['incidence']
+        terminals_of = elements_of.T.tocsr()
+        degree = topology['degree'].copy()
+
+        removed = np.zeros(len(elements), dtype=bool)
+        queue = collections.deque(np.flatnonzero(degree == 1))
+        while queue:
+            node = queue.popleft()
+            if degree[node] != 1:
+                continue
+            row = slice(elements_of.indptr[node], elements_of.indptr[node+1])
+            for element in elements_of.indices[row]:
+                if removed[element]:
+                    continue
+                removed[element] = True
+                col = slice(terminals_of.indptr[element],
+                            terminals_of.indptr[element+1])
+                for other, count in zip(terminals_of.indices[col],
+                                        terminals_of.data[col]):
+                    degree[other] -= int(count)
+                    if degree[other] == 1:
+                        queue.append(other)
+
+        pruned = elements[removed]
+        self.numberofdels = int(terminals.index.isin(pruned).sum())
+        for name in ['flowTerminal', 'flowElement', 'flowLine',
+                     'flowConsumer', 'flowPressureReg', 'flowInfeeder']:
+            table = self.xmls[name]
+            self.xmls[name] = table[~table.index.isin(pruned)]
+        self.nodeadends = True
+        print('deadend check removed {} elements ({} terminals).'.format(
+                len(pruned), self.numberofdels))
+        return pruned
+
+    # %%
+    def reducenetwork(self, merge_series=True, aggregate_consumers=False):
+        """
+        Reduces the imported dataframes before the TESPy network is created,
+        so that less subsystems and equations are needed:
+            - series pipes (FlowLine) meeting at nodes with only these two
+              elements are merged into one hydraulically equivalent pipe
+              (see below).
+            - optionally, house connections (pipes to nodes with only
+              consumers) are removed and their consumers are moved to the
+              node of the junction; all consumers at the same node are
+              aggregated into one (Q summed, T weighted by Q). The losses
+              of the removed pipes are neglected.
+        The equivalent pipe has the summed length; its diameter keeps the
+        pressure drop of the chain for equal friction factors:
+        D = (sum(L) / sum(L / D^5))^(1/5). Roughness and HeatingCond are
+        weighted by length. The merged pipe keeps the name and direction of
+        the first pipe.
+        The mapping is stored in self.reduction_pipes and
+        self.reduction_consumers to expand results with expand_results.
+
+        Parameters
+        ----------
+        merge_series: boolean, default True
+        aggregate_consumers: boolean, default False
+        """
+        terminals = self.xmls['flowTerminal']
+        element = list(terminals.index)
+        node = list(terminals['Node_ID'])
+        side = list(terminals['TerminalNo'].astype(int))
+        types = self.xmls['flowElement']['Type'].to_dict()
+        lines = self.xmls['flowLine']
+        par = pd.DataFrame({'L': lines['LineLength'].astype(float),
+                            'D': lines['Diameter'].astype(float),
+                            'ks': lines['SandRoughness'].astype(float),
+                            'HC': lines['HeatingCond'].astype(float)})
+        par = par.to_dict('index')
+
+        node_terms = collections.defaultdict(set)
+        elem_terms = collections.defaultdict(list)
+        for pos in range(len(element)):
+            node_terms[node[pos]].add(pos)
+            elem_terms[element[pos]].append(pos)
+        removed_terms = set()
+        removed_nodes = []
+
+        # original pipes: representative, sign of the direction, weights of
+        # the pressure drop (L/D^5) and the heat losses (HeatingCond*L)
+        pipes = pd.DataFrame({'pipe': list(par),
+                              'sign': 1,
+                              'w_dp': [p['L'] / p['D']**5 for p in par.values()],
+                              'w_q': [p['HC'] * p['L'] for p in par.values()]},
+                             index=list(par))
+        members = {name: [name] for name in par}
+        represent = pipes['pipe'].to_dict()
+        sign = pipes['sign'].to_dict()
+
+        def is_pipe(pos):
+            return types.get(element[pos]) == 'FlowLine'
+
+        if merge_series is True:
+            for n in list(node_terms):
+                terms = node_terms[n]
+                if len(terms) != 2:
+                    continue
+                t1, t2 = sorted(terms)
+                a, b = element[t1], element[t2]
+                if a == b or not (is_pipe(t1) and is_pipe(t2)):
+                    continue
+                far_a = [t for t in elem_terms[a] if t != t1][0]
+                far_b = [t for t in elem_terms[b] if t != t2][0]
+                m = node[far_b]
+                if m == node[far_a]:
+                    continue  # parallel pipes, merging would create a loop
+                pa, pb = par[a], par.pop(b)
+                length = pa['L'] + pb['L']
+                pa['D'] = (length / (pa['L'] / pa['D']**5 +
+                                     pb['L'] / pb['D']**5))**0.2
+                pa['ks'] = (pa['ks'] * pa['L'] + pb['ks'] * pb['L']) / length
+                pa['HC'] = (pa['HC'] * pa['L'] + pb['HC'] * pb['L']) / length
+                pa['L'] = length
+                # b has the same direction as a, if it starts where a ends:
+                sign_b = 1 if side[t1] != side[t2] else -1
+                for orig in members.pop(b):
+                    represent[orig] = a
+                    sign[orig] *= sign_b
+                    members[a] += [orig]
+                # a now ends at the far node of b:
+                node_terms[m].discard(far_b)
+                node_terms[m].add(t1)
+                node[t1] = m
+                del node_terms[n]
+                removed_nodes += [n]
+                removed_terms |= {t2, far_b}
+                del elem_terms[b]
+
+        consumers = self.xmls['flowConsumer']
+        con = pd.DataFrame({'consumer': consumers.index,
+                            'Q': consumers['Power'].astype(float),
+                            'T': consumers['T'].astype(float)},
+                           index=consumers.index)
+        if aggregate_consumers is True:
+            def is_consumer(pos):
+                return types.get(element[pos]) == 'FlowConsumer'
+
+            def is_house(n):
+                terms = node_terms[n]
+                pipe_terms = [t for t in terms if is_pipe(t)]
+                return (len(pipe_terms) == 1 and len(terms) > 1 and
+                        all(is_consumer(t) for t in terms
+                            if t != pipe_terms[0]))
+
+            # house connections (only one level, the nodes the consumers are
+            # moved to are not checked again):
+            houses = [n for n in node_terms if is_house(n)]
+            for n in houses:
+                if not is_house(n):
+                    continue
+                terms = node_terms[n]
+                t1 = [t for t in terms if is_pipe(t)][0]
+                a = element[t1]
+                far = [t for t in elem_terms[a] if t != t1][0]
+                j = node[far]
+                if j == n:
+                    continue
+                for t in terms - {t1}:
+                    node[t] = j
+                    node_terms[j].add(t)
+                node_terms[j].discard(far)
+                del node_terms[n]
+                removed_nodes += [n]
+                removed_terms |= {t1, far}
+                del elem_terms[a]
+                par.pop(a)
+                for orig in members.pop(a):
+                    represent[orig] = None
+            # consumers at the same node:
+            for n, terms in node_terms.items():
+                con_terms = sorted(t for t in terms if is_consumer(t))
+                if len(con_terms) < 2:
+                    continue
+                first = element[con_terms[0]]
+                for t in con_terms[1:]:
+                    con.loc[element[t], 'consumer'] = first
+                    removed_terms.add(t)
+            total = con.groupby('consumer')['Q'].transform('sum')
+            con['share'] = con['Q'] / total.where(total != 0, np.nan)
+            con['share'] = con['share'].fillna(1.)
+
+        else:
+            con['share'] = 1.
+
+        # filter and update the tables once:
+        keep = np.ones(len(element), dtype=bool)
+        keep[list(removed_terms)] = False
+        terminals = terminals.copy()
+        terminals['Node_ID'] = node
+        self.xmls['flowTerminal'] = terminals[keep]
+        kept = list(par)
+        lines = lines.loc[kept].copy()
+        lines['LineLength'] = [par[name]['L'] for name in kept]
+        lines['Diameter'] = [par[name]['D'] for name in kept]
+        lines['SandRoughness'] = [par[name]['ks'] for name in kept]
+        lines['HeatingCond'] = [par[name]['HC'] for name in kept]
+        self.xmls['flowLine'] = lines
+        reps = con['consumer'].unique()
+        aggregated = con.groupby('consumer').apply(
+                lambda group: pd.Series({
+                        'Q': group['Q'].sum(),
+                        'T': ((group['Q'] * group['T']).sum() /
+                              group['Q'].sum()) if group['Q'].sum() != 0
+                        else group['T'].mean()}))
+        consumers = consumers.loc[reps].copy()
+        consumers['Power'] = aggregated.loc[reps, 'Q'].values
+        consumers['T'] = aggregated.loc[reps, 'T'].values
+        self.xmls['flowConsumer'] = consumers
+        dropped = (set(self.xmls['flowElement'].index) -
+                   set(self.xmls['flowTerminal'].index))
+        self.xmls['flowElement'] = self.xmls['flowElement'].drop(list(dropped))
+        for name in ['flowNode', 'flowGraphicNode']:
+            table = self.xmls[name]
+            self.xmls[name] = table[~table.index.isin(removed_nodes)]
+
+        pipes['pipe'] = pd.Series(represent)
+        pipes['sign'] = pd.Series(sign)
+        self.reduction_pipes = pipes
+        self.reduction_consumers = con[['consumer', 'share']]
+        print('network reduced: {} of {} pipes, {} of {} consumers and {} '
+              'nodes removed.'.format(len(pipes) - len(par), len(pipes),
+                                      len(con) - len(reps), len(con),
+                                      len(removed_nodes)))
+
+    def expand_results(self, pipe_results=None, consumer_results=None):
+        """
+        Expands results of the reduced network (see reducenetwork) onto the
+        original elements.
+
+        Parameters
+        ----------
+        pipe_results: pd.DataFrame, default None
+            index: pipes of the reduced network; the column m (mass flow) is
+            taken over with the direction of each original pipe, dp
+            (pressure drop) and Q (heat losses) are split with the weights
+            L/D^5 and HeatingCond*L, all other columns are copied. Removed
+            house connections get nan.
+        consumer_results: pd.DataFrame, default None
+            index: consumers of the reduced network; the columns m and Q are
+            split by the share of the original consumers in the power, all
+            other columns are copied.
+
+        Returns
+        -------
+        pipe_results, consumer_results: pd.DataFrame
+        """
+        if pipe_results is not None:
+            red = self.reduction_pipes
+            expanded = pipe_results.reindex(red['pipe']).set_axis(red.index,
+                                                                  axis=0)
+            for col, weight in [('dp', 'w_dp'), ('Q', 'w_q')]:
+                if col in expanded.columns:
+                    total = red.groupby('pipe')[weight].transform('sum')
+                    expanded[col] = expanded[col] * red[weight] / total
+            if 'm' in expanded.columns:
+                expanded['m'] = expanded['m'] * red['sign']
+            pipe_results = expanded
+        if consumer_results is not None:
+            red = self.reduction_consumers
+            expanded = consumer_results.reindex(red['consumer']).set_axis(
+                    red.index, axis=0)
+            for col in ['m', 'Q']:
+                if col in expanded.columns:
+                    expanded[col] = expanded[col] * red['share']
+            consumer_results = expanded
+        return pipe_results, consumer_results
+
+    # %%
+    def pipe_parameters(self):
+        """
+        Computes the parameters of all pipes from flowLine at once.
+
+        Returns
+        -------
+        parameters: pd.DataFrame
+            index Element_ID, columns ks (m), L (m), D (m), kA (W/K, used
+            by the pipes) and kA_cond (W/K, from HeatingCond)
+        """
+        lines = self.xmls['flowLine']
+        parameters = pd.DataFrame(index=lines.index)
+        # TESPy parameters are in m!
+        parameters['ks'] = lines['SandRoughness'].astype(float) / 1000
+        parameters['L'] = lines['LineLength'].astype(float)
+        parameters['D'] = lines['Diameter'].astype(float) / 1000
+        # TODO: kA is not yet implemented in the pipes component!!!
+        # HeatingCond(uctivity) is in W/mK, whereas kA is in W/K
+        parameters['kA_cond'] = (lines['HeatingCond'].astype(float) *
+                                 parameters['L'])
+        parameters['kA'] = 2.
+        return parameters
+
+    def node_results(self, circuit='1'):
+        """
+        Returns the results of flowHSNodeResult of one circuit with one row
+        per node.
+        """
+        results = self.xmls['flowHSNodeResult']
+        results = results[results['Circuit'] == circuit]
+        return results[~results.index.duplicated()]
+
+    def consumer_parameters(self):
+        """
+        Computes the parameters of all consumers from flowConsumer and the
+        node results (pDiff of circuit 1 at the first terminal with a
+        result) at once.
+
+        Returns
+        -------
+        parameters: pd.DataFrame
+            index Element_ID, columns Q (W, negative), pr (nan without node
+            result), T_out (°C) and Node_ID
+        """
+        consumer = self.xmls['flowConsumer']
+        # The xmls include Q1 to Q4, while Q1-Q3 are always empty,
+        # Q4 sometimes is filled.. significance??
+        # pDiffMin and pRelMin are given...
+        terminals = self.xmls['flowTerminal']
+        terminals = terminals[terminals.index.isin(consumer.index)]
+        pdiff = self.node_results()['pDiff'].astype(float)
+        pdiff = pd.Series(pdiff.reindex(terminals['Node_ID']).values,
+                          index=terminals.index)
+        parameters = pd.DataFrame(index=consumer.index)
+        parameters['Q'] = consumer['Power'].astype(float) * (-1000000)
+        parameters['pr'] = pdiff.groupby(level=0).first().reindex(
+                consumer.index)
+        missing = parameters.index[parameters['pr'].isna()]
+        if len(missing) > 0:
+            print('WARNING: no node result (pDiff) found for the consumers '
+                  '{}; their pressure ratio pr is nan.'.format(list(missing)))
+        parameters['T_out'] = consumer['T'].astype(float)
+        parameters['Node_ID'] = terminals['Node_ID'].groupby(
+                level=0).first().reindex(consumer.index)
+        return parameters
+
+    def preg_parameters(self, zeta=1):
+        """
+        Computes the parameters of all pressure regulators from
+        flowPressureReg at once.
+
+        Returns
+        -------
+        parameters: pd.DataFrame
+            index Element_ID, columns pr (pOutlet - pInlet) and zeta
+        """
+        regulators = self.xmls['flowPressureReg']
+        parameters = pd.DataFrame(index=regulators.index)
+        parameters['pr'] = (regulators['pOutlet'].astype(float) -
+                            regulators['pInlet'].astype(float))
+        parameters['zeta'] = zeta
+        return parameters
+
+    # %%
+    def presolve(self, p_in=15., T_supply=90., cp=4200., **kwargs):
+        """
+        Calculates the mass flows and pressures of the feed line with the
+        sparse hydraulic solver (see hydraulics.HydraulicSolver), e.g. as
+        quick screening or as starting values of TESPy (see seed_tespy).
+        The mass flows of the consumers follow from their heat demand and
+        the temperature difference T_supply - T_out.
+
+        Parameters
+        ----------
+        p_in: float, default 15.
+            pressure of the infeeders in bar
+        T_supply: float, default 90.
+            supply temperature in °C
+        cp: float, default 4200.
+            heat capacity of the water in J/kgK
+        kwargs:
+            passed to HydraulicSolver.solve (tol, max_iter)
+
+        Returns
+        -------
+        results: dict
+            m, v, p and iterations (see HydraulicSolver.solve) and the mass
+            flows of the consumers (m_consumer, kg/s)
+        """
+        consumers = self.consumer_parameters()
+        m_consumer = -consumers['Q'] / (cp * (T_supply -
+                                              consumers['T_out']))
+        demand = m_consumer.groupby(consumers['Node_ID']).sum()
+        solver = HydraulicSolver.from_importer(self)
+        results = solver.solve(demand, p_supply=p_in, **kwargs)
+        results['m_consumer'] = m_consumer
+        results['p_in'] = p_in
+        self.hydraulics = results
+        print('minimum pressure {:.2f} bar, maximum velocity {:.2f} m/s'.format(
+                results['p'].min(), results['v'].abs().max()))
+        return results
+
+    def seed_tespy(self, p_return=5.):
+        """
+        Sets the results of presolve as starting values (m0, p0) of the
+        connections of self.nw.
+        At each node the feed flows from or into the elements (pipes and
+        pressure regulators in their direction of flow, consumers always
+        into them, infeeders out of them); the connection from an element
+        into the node or from the node into an element gets the feed
+        pressure of the node, the other one the return pressure
+        p_return + (p_in - p). Connections between forks are not seeded,
+        as their mass flows are partial sums.
+
+        Parameters
+        ----------
+        p_return: float, default 5.
+            return pressure at the infeeders in bar
+
+        Returns
+        -------
+        seeded: int
+            number of seeded connections
+        """
+        results = self.hydraulics
+        table = self.junctions_table
+        # feed mass flow out of each element into the node (terminal 1 is
+        # the start of the pipes):
+        feed = results['m'].reindex(table['Element_ID']).values
+        feed = np.where(table['side'].values == 1, -feed, feed)
+        consumer = (-results['m_consumer']).reindex(table['Element_ID']).values
+        feed = np.where(np.isnan(feed), consumer, feed)
+        feed = pd.Series(feed, index=pd.MultiIndex.from_arrays(
+                [table['comp'], table['Node_ID']]))
+        # the infeeders supply the rest of their node:
+        infeeders = table['comp'].str.startswith('infeed').values
+        rest = -feed[~infeeders].groupby(level=1).sum()
+        feed[infeeders] = rest.reindex(table['Node_ID'][infeeders]).values
+        feed = feed.to_dict()
+        p_feed = results['p']
+
+        seeded = 0
+        for label, conn in self.conns.items():
+            node = self.conn_nodes[label]
+            # the labels of conn.s and conn.t are the ones of the inlets and
+            # outlets of the subsystems, so the ones of build_junctions are
+            # used:
+            source, target = self.conn_ends[label]
+            if (source, node) in feed:
+                m = feed[(source, node)]
+                is_feed = m > 0
+            elif (target, node) in feed:
+                m = feed[(target, node)]
+                is_feed = m < 0
+            else:
+                continue
+            p = p_feed.get(node, np.nan)
+            if np.isnan(m) or m == 0 or np.isnan(p):
+                continue
+            if not is_feed:
+                p = p_return + results['p_in'] - p
+            conn.set_attr(m0=abs(m), p0=p)
+            seeded += 1
+        print('{} of {} connections seeded by the hydraulic pre-solver'.format(
+                seeded, len(self.conns)))
+        return seeded
+
+    # %%
+    def junctions(self):
+        """
+        Resolves for all nodes the connected elements, their component names
+        and the side (TerminalNo) at the node in one grouped pass over
+        flowTerminal.
+        Per node, the elements are sorted by component name and side
+        (descending), so that pipes are connected before consumers; else a
+        consumer could get connected to the input of a fork.
+
+        Returns
+        -------
+        junctions: pd.DataFrame
+            one row per terminal (per element and node, if both terminals of
+            an element are at the same node) with the columns Node_ID,
+            Element_ID, comp
+            (label of the component), side, rank (position at the node) and
+            degree (number of elements at the node)
+        """
+        componentnames = {'FlowLine': 'pipe',
+                          'FlowConsumer': 'con',
+                          'FlowPressureReg': 'preg',
+                          'FlowInfeederH': 'infeed'}
+        terminals = self.xmls['flowTerminal']
+        types = self.xmls['flowElement']['Type']
+        topology = self.terminal_topology()
+        junctions = pd.DataFrame({
+                'node': topology['node_code'],
+                'Node_ID': terminals['Node_ID'].values,
+                'Element_ID': terminals.index.values,
+                'name': types.reindex(terminals.index).map(
+                        componentnames).values,
+                'side': terminals['TerminalNo'].astype(int).values,
+                'position': np.arange(len(terminals))})
+        unknown = junctions['name'].isna()
+        if unknown.any():
+            print('{} terminals of unknown element types are neglected.'.format(
+                    unknown.sum()))
+            junctions = junctions[~unknown]
+        # the node codes are sorted like Node_ID:
+        junctions = junctions.sort_values(['node', 'name', 'side',
+                                           'position'],
+                                          ascending=[True, False, False, True])
+        junctions['comp'] = junctions['name'] + junctions['Element_ID'].astype(str)
+        loops = junctions.duplicated(['Node_ID', 'Element_ID'])
+        if loops.any():
+            print('WARNING: the elements {} have both terminals at one node; '
+                  'only one terminal is connected.'.format(
+                          list(junctions.loc[loops, 'Element_ID'])))
+            junctions = junctions[~loops]
+        node = junctions['node'].values
+        position = np.arange(len(node))
+        start = np.maximum.accumulate(np.where(
+                np.r_[True, node[1:] != node[:-1]], position, 0))
+        junctions['rank'] = position - start
+        junctions['degree'] = np.bincount(
+                node, minlength=len(topology['nodes']))[node]
+        return junctions.drop(columns=['node', 'name',
+                                       'position']).reset_index(drop=True)
+
+    def build_junctions(self, components):
+        """
+        Creates the forks and connections of all nodes with any number of
+        elements. Two elements are linked directly; at nodes with n > 2
+        elements a chain of n-2 forks is created: the first element is
+        linked to the inlet of the first fork, outlet 2 of fork k to element
+        k and outlet 3 to the next fork (the last fork to the last element).
+        The forks are named 'fork'+node (n = 3) or 'fork'+node+'_k' (n > 3).
+        The node of each connection is stored in self.conn_nodes, the labels
+        of its source and target (keys of components or fork names) in
+        self.conn_ends.
+
+        Parameters
+        ----------
+        components: dict
+            components by label (e.g. 'pipe'+Element_ID)
+
+        Returns
+        -------
+        forks: dict
+        conns: dict
+        """
+        junctions = self.junctions()
+        self.junctions_table = junctions
+        nodes = junctions['Node_ID'].values
+        comps = junctions['comp'].values
+        sides = junctions['side'].values
+        starts = np.flatnonzero(junctions['rank'].values == 0)
+        ends = np.r_[starts[1:], len(junctions)]
+
+        forks = {}
+        conns = {}
+        self.conn_nodes = {}
+        self.conn_ends = {}
+        objects = dict(components)
+
+        def link(label1, label2, num1, num2):
+            # link() returns the connection label1 -> label2 first:
+            linked = self.link(objects[label1], objects[label2],
+                               num1=num1, num2=num2)
+            forward, backward = list(linked)
+            self.conn_ends[forward] = (label1, label2)
+            self.conn_ends[backward] = (label2, label1)
+            return linked
+
+        single = 0
+        for start, end in zip(starts, ends):
+            node = nodes[start]
+            degree = end - start
+            if degree < 2:
+                single += 1
+                continue
+            elements = list(comps[start:end])
+            side = sides[start:end]
+            new = {}
+            if degree == 2:
+                new.update(link(elements[0], elements[1],
+                                int(side[0]), int(side[1])))
+            else:
+                if degree == 3:
+                    names = ['fork' + str(node)]
+                else:
+                    names = ['fork' + str(node) + '_' + str(k)
+                             for k in range(1, degree - 1)]
+                chain = [sf(forkname) for forkname in names]
+                forks.update(zip(names, chain))
+                objects.update(zip(names, chain))
+                new.update(link(elements[0], names[0], int(side[0]), 1))
+                for k, fork in enumerate(names):
+                    new.update(link(fork, elements[k+1], 2, int(side[k+1])))
+                    if k + 1 < len(names):
+                        new.update(link(fork, names[k+1], 3, 1))
+                new.update(link(names[-1], elements[-1], 3, int(side[-1])))
+            conns.update(new)
+            self.conn_nodes.update(dict.fromkeys(new, node))
+        if single > 0:
+            print('WARNING: {} nodes with only one element are not '
+                  'connected.'.format(single))
+        print('{} connections and {} forks created.'.format(len(conns),
+                                                            len(forks)))
+        return forks, conns
+
+    def createTESPynet(self, name, warmstart_dir=None, init_file=None,
+                       max_iter=10, reduce=False, presolve=False,
+                       printdata=False, directory=None):
         """
         This function creates a district heating network with the python
         package TESPy, calculates it and saves it.
+        If warmstart_dir is given, the results of the solution are saved
+        there, keyed by the fingerprint of the xml-files; as long as they do
+        not change, the last solution is used as starting values (warm
+        start). This is no cache of the network: the components are always
+        created from the xml-files, reloading the structure is out of scope.
 
         Parameters
         ----------
             name: str
                 name of the network to be created --> for storing!
+            warmstart_dir: str, default None
+                directory of the stored solutions (relative to the working
+                directory, like TESPy's save)
+            init_file: str, default None
+                results.csv of an earlier solution (e.g. name/results.csv)
+                to start from; else the one in the cache is used, if found
+            max_iter: int, default 10
+            reduce: boolean, default False
+                reduce the network after the deadend-check, see
+                reducenetwork
+            presolve: boolean, default False
+                without init_file, use the results of the hydraulic
+                pre-solver as starting values, see presolve and seed_tespy
+            printdata: boolean, default False
+                print the starting values and iterations of the design
+                calculation, see solve_design
+            directory: str, default None
+                directory the network is saved to (in the subfolder name);
+                if None, the working directory
         +++ 
         TODO:
         - split this function into several ones...
         - import all parameters into the components
         +++
         """
+        warmstart = None
+        if warmstart_dir is not None:
+            fingerprint = self.fingerprint(name=name, reduce=reduce)
+            warmstart = os.path.relpath(os.path.join(
+                    warmstart_dir, '{}_{}'.format(name, fingerprint)))
+            if init_file is None and os.path.exists(warmstart + '/results.csv'):
+                init_file = warmstart + '/results.csv'
+
         fluids = ['water']
         T_unit = 'C'
         Tamb = 0
@@ -252,56 +1230,11 @@ class DHimport():
         print('Starting to create a TESPy district heating network.')
 
         # %% deadend-check
-        self.nodeadends = False
-        # TODO: put this into a function, to be able to iterate through dead-pipes!!!
         print('Terminal has {} entries bedore deadendcheck.'.format(str(len(self.xmls['flowTerminal']))))
-        self.numberofdels = 0
-
-        def deadendcheck():
-            # Check for deadends first and delete them! - else there will be errors!
-            allcon = self.xmls['flowTerminal'].groupby('Node_ID')['Element_ID']
-            ball = allcon.count()
-            self.df_filter = pd.DataFrame(data=ball, index=ball.index, columns=['Element_ID'])
-            self.df_filter.columns = ['count_all']
-            # dead-ends
-            # network has errors - how to resolve?
-            deadend = self.df_filter['count_all'][self.df_filter['count_all'] == 1]
-            if len(deadend) > 0:
-                print('deadend check found some dead_ends:')
-                for node in ball[deadend.index].index:
-                    # get the element connected to the node:
-                    element = allcon.get_group(node)
-                    print('deadend in node{}, with element {}.'.format(node, element[0]))
-                    # delete all connections with the element
-                    a = self.xmls['flowTerminal']
-                    a = a.T
-                    # print(len(a[element[0]].loc['Element_ID']))
-                    self.numberofdels += len(a[element[0]].loc['Element_ID'])
-                    del a[element[0]]
-                    a = a.T
-                    self.xmls['flowTerminal'] = a
-                    # delete the element
-                    a = self.xmls['flowElement']
-                    a = a.T
-                    # print(a[element[0]]['Element_ID'])
-                    del a[element[0]]
-                    a = a.T
-                    self.xmls['flowElement'] = a
-                    # delete the line
-                    a = self.xmls['flowLine']
-                    a = a.T
-                    # print(a[element[0]]['Element_ID'])
-                    del a[element[0]]
-                    a = a.T
-                    self.xmls['flowLine'] = a
-            else:
-                print('network cleaned from deadends!')
-                self.nodeadends = True
-
-        while self.nodeadends == False:
-            deadendcheck()
-        # print(self.numberofdels)
+        self.prune_deadends()
         print('Terminal has {} entries after deadendcheck.'.format(str(len(self.xmls['flowTerminal']))))
+        if reduce is True:
+            self.reducenetwork()
         
         # locate and save the input pressure!
         p_in = 15
@@ -321,17 +1254,14 @@ class DHimport():
 
         # pipe_feedings and backs
         pipes = {}
-        for i in self.xmls['flowLine'].index:
-            ks = float(self.xmls['flowLine']['SandRoughness'][i]) / 1000  # TESPy parameter is in m!
-            L = float(self.xmls['flowLine']['LineLength'][i])
-            D = float(self.xmls['flowLine']['Diameter'][i]) / 1000  # TESPy parameter is in m!
-            # TODO: kA is not yet implemented in the pipes component!!!
-            # HeatingCond(uctivity) is in W/mK, whereas kA is in W/K
-            kA = float(self.xmls['flowLine']['HeatingCond'][i]) * L
-            kA = 2
-            pipes['pipe' + str(i)] = pipe(label='pipe' + str(i), ks_pb=ks, L_pb=L,
-                                          D_pb=D, ks_pf=ks, L_pf=L, D_pf=D,
-                                          kA_pb=kA, kA_pf=kA, Tamb=Tamb,
+        for par in self.pipe_parameters().itertuples():
+            i = par.Index
+            pipes['pipe' + str(i)] = pipe(label='pipe' + str(i),
+                                          ks_pb=par.ks, L_pb=par.L,
+                                          D_pb=par.D, ks_pf=par.ks,
+                                          L_pf=par.L, D_pf=par.D,
+                                          kA_pb=par.kA, kA_pf=par.kA,
+                                          Tamb=Tamb,
                                           design_pf=['kA'], design_pb=['kA'])
         self.pipes = pipes
 
@@ -339,360 +1269,33 @@ class DHimport():
         print('Creating consumers...')
 
         consumers = {}
-        for i in self.xmls['flowConsumer'].index:
+        for par in self.consumer_parameters().itertuples():
+            i = par.Index
             consumers['con' + str(i)] = sc('con' + str(i))  # name of consumer; class defined above
-            # consumer attributes
-            ### TODO: import values from the xml-dataframes!
-            # The xmls include Q1 to Q4, while Q1-Q3 are always empty,
-            # Q4 sometimes is filled.. significance??
-            Q = self.xmls['flowConsumer'].loc[i,'Power']
-            # pDiffMin and pRelMin are given... 
-            prelmin = float(self.xmls['flowConsumer'].loc[i,'pRelMin'])
-            nodeid = self.xmls['flowTerminal'].loc[i,'Node_ID']
-            results = self.xmls['flowHSNodeResult'].loc[nodeid]
-            results = results[results['Circuit']=='1']['pDiff']
-            pdiff = results.values
-            pdiff = float(pdiff[0])
-            pr = (p_in-prelmin)/p_in
-            T_out = self.xmls['flowConsumer'].loc[i,'T']
-            consumers['con' + str(i)].set_attr(Q=float(Q)*(-1000000),
-                                               pr=pdiff,
-                                               T_out=float(T_out))
+            consumers['con' + str(i)].set_attr(Q=par.Q,
+                                               pr=par.pr,
+                                               T_out=par.T_out)
 
         self.consumers = consumers
 
         print('Creating pressure regulators...')
         preg = {}
-        for i in self.xmls['flowPressureReg'].index:
+        for par in self.preg_parameters().itertuples():
+            i = par.Index
             preg["preg" + str(i)] = pressurereg("preg" + str(i))
-            p_in = self.xmls['flowPressureReg'].loc[i,'pInlet']
-            p_out = self.xmls['flowPressureReg'].loc[i,'pOutlet']
-            pr = float(p_out)-float(p_in)
-            zeta = 1
-            preg["preg" + str(i)].set_attr(pr_vf=pr, pr_vb=pr,
-                                           zeta_vf=zeta,zeta_vb=zeta)
+            preg["preg" + str(i)].set_attr(pr_vf=par.pr, pr_vb=par.pr,
+                                           zeta_vf=par.zeta,
+                                           zeta_vb=par.zeta)
 
         self.preg = preg
 
         # %% connections
         print('Creating connections...')
-        # create a dict for connection objects stored inside
-        conns = {}
-
-        allcon = self.xmls['flowTerminal'].groupby('Node_ID')['Element_ID']
-        ball = allcon.count()
-        self.df_filter = pd.DataFrame(data=ball, index=ball.index, columns=['Element_ID'])
-        self.df_filter.columns = ['count_all']
-
-        # two-way connections
-        twoway = self.df_filter['count_all'][self.df_filter['count_all'] == 2]
-        self.twoway = twoway
-        componentnames = {'FlowLine': 'pipe',
-                          'FlowConsumer': 'con',
-                          'FlowPressureReg': 'preg',
-                          'FlowInfeederH': 'infeed'}
-        for node in ball[twoway.index].index:
-            elements = allcon.get_group(node)
-            eltype = {}
-            comps = []
-            for i in elements:
-                a = self.xmls['flowTerminal'].loc[i]
-                if type(a) == type(pd.Series()):
-                    side = int(a['TerminalNo'])
-                else:
-                    side = int(a[a['Node_ID'] == node]['TerminalNo'])
-                el = {i: [componentnames[self.xmls['flowElement'].loc[i]['Type']], side]}
-                eltype.update(el)
-            # print(eltype)
-            # Components get sorted, so that pipes always are first to be connected
-            # else a consumer could get connected to the input of the fork...
-            # Another solution is very welcome!
-            sorted_eltype = sorted(eltype.items(), key=operator.itemgetter(1), reverse=True)
-            # print('Sorted: '+str(sorted_eltype))
-            for comp in sorted_eltype:
-                if comp[1][0] == 'pipe':
-                    comps += [pipes["pipe" + str(comp[0])]]
-                elif comp[1][0] == 'con':
-                    comps += [consumers["con" + str(comp[0])]]
-                elif comp[1][0] == 'preg':
-                    comps += [preg["preg" + str(comp[0])]]
-                elif comp[1][0] == 'infeed':
-                    comps += [infeed["infeed" + str(comp[0])]]
-
-            # create connections:
-            conns.update(self.link(comps[0],
-                                   comps[1],
-                                   num1=int(sorted_eltype[0][1][1]),
-                                   num2=int(sorted_eltype[1][1][1])))
-
-        # three-way connections
-        threeway = self.df_filter['count_all'][self.df_filter['count_all'] == 3]
-        self.threeway = threeway
-        forks = {}
-        componentnames = {'FlowLine': 'pipe',
-                          'FlowConsumer': 'con',
-                          'FlowPressureReg': 'preg',
-                          'FlowInfeederH': 'infeed'}
-        for node in ball[threeway.index].index:
-            elements = allcon.get_group(node)
-            eltype = {}
-            comps = []
-            for i in elements:
-                a = self.xmls['flowTerminal'].loc[i]
-                if type(a) == type(pd.Series()):
-                    side = int(a['TerminalNo'])
-                else:
-                    side = int(a[a['Node_ID'] == node]['TerminalNo'])
-                el = {i: [componentnames[self.xmls['flowElement'].loc[i]['Type']], side]}
-                eltype.update(el)
-            # print(eltype)
-            # Components get sorted, so that pipes always are first to be connected
-            # else a consumer could get connected to the input of the fork...
-            # Another solution is very welcome!
-            sorted_eltype = sorted(eltype.items(), key=operator.itemgetter(1), reverse=True)
-            # print('Sorted: '+str(sorted_eltype))
-            for comp in sorted_eltype:
-                if comp[1][0] == 'pipe':
-                    comps += [pipes["pipe" + str(comp[0])]]
-                elif comp[1][0] == 'con':
-                    comps += [consumers["con" + str(comp[0])]]
-                elif comp[1][0] == 'preg':
-                    comps += [preg["preg" + str(comp[0])]]
-                elif comp[1][0] == 'infeed':
-                    comps += [infeed["infeed" + str(comp[0])]]
-            # create fork:
-            forks['fork' + str(node)] = sf('fork' + str(node))
-
-            # create connections:
-            conns.update(self.link(comps[0],
-                                   forks['fork' + str(node)],
-                                   num1=int(sorted_eltype[0][1][1]),
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node)],
-                                   comps[1],
-                                   num1=2,
-                                   num2=int(sorted_eltype[1][1][1])))
-            conns.update(self.link(forks['fork' + str(node)],
-                                   comps[2],
-                                   num1=3,
-                                   num2=int(sorted_eltype[2][1][1])))
-
-        # print('node{} does not fit!!!!!!!!!!!!'.format(str(node)))
-
-        # four-way connections
-        fourway = self.df_filter['count_all'][self.df_filter['count_all'] == 4]
-        self.fourway = fourway
-        componentnames = {'FlowLine': 'pipe',
-                          'FlowConsumer': 'con',
-                          'FlowPressureReg': 'preg',
-                          'FlowInfeederH': 'infeed'}
-        for node in ball[fourway.index].index:
-            elements = allcon.get_group(node)
-            eltype = {}
-            comps = []
-            for i in elements:
-                a = self.xmls['flowTerminal'].loc[i]
-                if type(a) == type(pd.Series()):
-                    side = int(a['TerminalNo'])
-                else:
-                    side = int(a[a['Node_ID'] == node]['TerminalNo'])
-                el = {i: [componentnames[self.xmls['flowElement'].loc[i]['Type']], side]}
-                eltype.update(el)
-            # print(eltype)
-            # Components get sorted, so that pipes always are first to be connected
-            # else a consumer could get connected to the input of the fork...
-            # Another solution is very welcome!
-            sorted_eltype = sorted(eltype.items(), key=operator.itemgetter(1), reverse=True)
-            # print('Sorted: '+str(sorted_eltype))
-            for comp in sorted_eltype:
-                if comp[1][0] == 'pipe':
-                    comps += [pipes["pipe" + str(comp[0])]]
-                elif comp[1][0] == 'con':
-                    comps += [consumers["con" + str(comp[0])]]
-                elif comp[1][0] == 'preg':
-                    print('oho')
-                    # comps += preg["preg"+str(comp[0])]
-                elif comp[1][0] == 'infeed':
-                    # comps += infeed["infeed"+str(comp[0])]
-                    print('oho')
-
-            # create two forks:
-            forks['fork' + str(node) + '_1'] = sf('fork' + str(node) + '_1')
-            forks['fork' + str(node) + '_2'] = sf('fork' + str(node) + '_2')
-            # print(sorted_eltype[0][1][1][0])
-            conns.update(self.link(comps[0],
-                                   forks['fork' + str(node) + '_1'],
-                                   num1=int(sorted_eltype[0][1][1]),
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_1'],
-                                   comps[1],
-                                   num1=2,
-                                   num2=int(sorted_eltype[1][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_1'],
-                                   forks['fork' + str(node) + '_2'],
-                                   num1=3,
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_2'],
-                                   comps[2],
-                                   num1=2,
-                                   num2=int(sorted_eltype[2][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_2'],
-                                   comps[3],
-                                   num1=3,
-                                   num2=int(sorted_eltype[3][1][1])))
-
-        # ES GIBT NOCH KNOTEN MIT 5 UND 6 ELEMENTEN!!!!
-        # Außerdem können forks mit beliebig vielen Ausgängen erstellt werden...
-        # Das auf lange Sicht komplett umschreiben... ist so viel zu langer Code...
-
-        # fiveway
-        fiveway = self.df_filter['count_all'][self.df_filter['count_all'] == 5]
-        componentnames = {'FlowLine': 'pipe',
-                          'FlowConsumer': 'con',
-                          'FlowPressureReg': 'preg',
-                          'FlowInfeederH': 'infeed'}
-        for node in ball[fiveway.index].index:
-            elements = allcon.get_group(node)
-            eltype = {}
-            comps = []
-            for i in elements:
-                a = self.xmls['flowTerminal'].loc[i]
-                if type(a) == type(pd.Series()):
-                    side = int(a['TerminalNo'])
-                else:
-                    side = int(a[a['Node_ID'] == node]['TerminalNo'])
-                el = {i: [componentnames[self.xmls['flowElement'].loc[i]['Type']], side]}
-                eltype.update(el)
-            # print(eltype)
-            # Components get sorted, so that pipes always are first to be connected
-            # else a consumer could get connected to the input of the fork...
-            # Another solution is very welcome!
-            sorted_eltype = sorted(eltype.items(), key=operator.itemgetter(1), reverse=True)
-            # print('Sorted: '+str(sorted_eltype))
-            for comp in sorted_eltype:
-                if comp[1][0] == 'pipe':
-                    comps += [pipes["pipe" + str(comp[0])]]
-                elif comp[1][0] == 'con':
-                    comps += [consumers["con" + str(comp[0])]]
-                elif comp[1][0] == 'preg':
-                    print('oho')
-                    # comps += preg["preg"+str(comp[0])]
-                elif comp[1][0] == 'infeed':
-                    # comps += infeed["infeed"+str(comp[0])]
-                    print('oho')
-
-            # create three forks:
-            forks['fork' + str(node) + '_1'] = sf('fork' + str(node) + '_1')
-            forks['fork' + str(node) + '_2'] = sf('fork' + str(node) + '_2')
-            forks['fork' + str(node) + '_3'] = sf('fork' + str(node) + '_3')
-            # print(sorted_eltype[0][1][1][0])
-            conns.update(self.link(comps[0],
-                                   forks['fork' + str(node) + '_1'],
-                                   num1=int(sorted_eltype[0][1][1]),
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_1'],
-                                   comps[1],
-                                   num1=2,
-                                   num2=int(sorted_eltype[1][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_1'],
-                                   forks['fork' + str(node) + '_2'],
-                                   num1=3,
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_2'],
-                                   comps[2],
-                                   num1=2,
-                                   num2=int(sorted_eltype[2][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_2'],
-                                   forks['fork' + str(node) + '_3'],
-                                   num1=3,
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_3'],
-                                   comps[3],
-                                   num1=2,
-                                   num2=int(sorted_eltype[3][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_3'],
-                                   comps[4],
-                                   num1=3,
-                                   num2=int(sorted_eltype[4][1][1])))
-
-        # sixway
-        sixway = self.df_filter['count_all'][self.df_filter['count_all'] == 6]
-        componentnames = {'FlowLine': 'pipe',
-                          'FlowConsumer': 'con',
-                          'FlowPressureReg': 'preg',
-                          'FlowInfeederH': 'infeed'}
-        for node in ball[sixway.index].index:
-            elements = allcon.get_group(node)
-            eltype = {}
-            comps = []
-            for i in elements:
-                a = self.xmls['flowTerminal'].loc[i]
-                if type(a) == type(pd.Series()):
-                    side = int(a['TerminalNo'])
-                else:
-                    side = int(a[a['Node_ID'] == node]['TerminalNo'])
-                el = {i: [componentnames[self.xmls['flowElement'].loc[i]['Type']], side]}
-                eltype.update(el)
-            # print(eltype)
-            # Components get sorted, so that pipes always are first to be connected
-            # else a consumer could get connected to the input of the fork...
-            # Another solution is very welcome!
-            sorted_eltype = sorted(eltype.items(), key=operator.itemgetter(1), reverse=True)
-            # print('Sorted: '+str(sorted_eltype))
-            for comp in sorted_eltype:
-                if comp[1][0] == 'pipe':
-                    comps += [pipes["pipe" + str(comp[0])]]
-                elif comp[1][0] == 'con':
-                    comps += [consumers["con" + str(comp[0])]]
-                elif comp[1][0] == 'preg':
-                    print('oho')
-                    # comps += preg["preg"+str(comp[0])]
-                elif comp[1][0] == 'infeed':
-                    # comps += infeed["infeed"+str(comp[0])]
-                    print('oho')
-
-            # create two forks:
-            forks['fork' + str(node) + '_1'] = sf('fork' + str(node) + '_1')
-            forks['fork' + str(node) + '_2'] = sf('fork' + str(node) + '_2')
-            forks['fork' + str(node) + '_3'] = sf('fork' + str(node) + '_3')
-            forks['fork' + str(node) + '_4'] = sf('fork' + str(node) + '_4')
-            # print(sorted_eltype[0][1][1][0])
-            conns.update(self.link(comps[0],
-                                   forks['fork' + str(node) + '_1'],
-                                   num1=int(sorted_eltype[0][1][1]),
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_1'],
-                                   comps[1],
-                                   num1=2,
-                                   num2=int(sorted_eltype[1][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_1'],
-                                   forks['fork' + str(node) + '_2'],
-                                   num1=3,
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_2'],
-                                   comps[2],
-                                   num1=2,
-                                   num2=int(sorted_eltype[2][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_2'],
-                                   forks['fork' + str(node) + '_3'],
-                                   num1=3,
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_3'],
-                                   comps[3],
-                                   num1=2,
-                                   num2=int(sorted_eltype[3][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_3'],
-                                   forks['fork' + str(node) + '_4'],
-                                   num1=3,
-                                   num2=1))
-            conns.update(self.link(forks['fork' + str(node) + '_4'],
-                                   comps[4],
-                                   num1=2,
-                                   num2=int(sorted_eltype[4][1][1])))
-            conns.update(self.link(forks['fork' + str(node) + '_4'],
-                                   comps[5],
-                                   num1=3,
-                                   num2=int(sorted_eltype[5][1][1])))
+        components = {}
+        for comps in [pipes, consumers, preg, infeed]:
+            components.update(comps)
+        forks, conns = self.build_junctions(components)
+        self.forks = forks
 
         print('implementing the connections')
         self.conns = conns
@@ -748,14 +1351,175 @@ class DHimport():
                 heat_consumer.add_comps({'c': comp})
 
         self.nw.add_busses(heat_losses, heat_consumer)
-
-        self.nw.max_iter = 10
-        self.nw.solve('design')
-        self.nw.save(name, structure=True)
+        self.busses = {'Q_consumer': heat_consumer, 'Q_losses': heat_losses}
+
+        if presolve is True and init_file is None:
+            self.presolve(p_in=p_in)
+            self.seed_tespy()
+        self.solve_design(init_file=init_file, max_iter=max_iter,
+                          printdata=printdata)
+        path = name
+        if directory is not None:
+            path = os.path.relpath(os.path.join(directory, name))
+        self.nw.save(path, structure=True)
+        self.design_file = os.path.join(path, 'results.csv')
+        if warmstart is not None:
+            self.nw.save(warmstart)
         
         print('Heat demand consumer:', heat_consumer.P.val)
         print('network losses at 0 °C outside temperature (design):', heat_losses.P.val)
 
+    def run_timeseries(self, name, demand, T_amb=None, outdir=None,
+                       max_iter=10, processes=None, blocks=None, **kwargs):
+        """
+        Runs a quasi-static time series: for each snapshot the heat demand
+        of the consumers (and the ambient temperature of the pipes) is set
+        and the network is solved in offdesign mode. Each step starts from
+        the solution of the previous one (TESPy keeps it as starting
+        values), the design point is read from self.design_file.
+        The results of the connections are appended to outdir/results.csv
+        after each step, so they are not kept in memory.
+        With processes, the snapshots are split into blocks, which are
+        calculated in a pool of worker processes, each with its own network
+        (design calculation with createTESPynet) and the subfolder
+        outdir/block<number>.
+
+        Parameters
+        ----------
+        name: str
+            name of the network, see createTESPynet
+        demand: pd.DataFrame
+            snapshots x consumers (Element_ID), heat demand in MW (like
+            Power of flowConsumer)
+        T_amb: pd.Series, default None
+            ambient temperature of the pipes per snapshot in °C
+        outdir: str, default None
+            folder of the results, default name + '_timeseries'
+        max_iter: int, default 10
+            iterations per step
+        processes: int, default None
+            number of worker processes; if None, the time series runs in
+            this process with self.nw (created, if missing)
+        blocks: int, default None
+            number of blocks of snapshots, default processes
+        kwargs:
+            further parameters of createTESPynet (e.g. warmstart_dir)
+
+        Returns
+        -------
+        summary: pd.DataFrame
+            per snapshot the iterations, the residual and the heat flows of
+            the busses (Q_consumer and Q_losses)
+        """
+        if outdir is None:
+            outdir = name + '_timeseries'
+        if processes is not None:
+            return self._run_timeseries_blocks(name, demand, T_amb, outdir,
+                                               max_iter, processes, blocks,
+                                               kwargs)
+        if getattr(self, 'nw', None) is None:
+            self.createTESPynet(name, **kwargs)
+        if not getattr(self, 'consumers', None):
+            raise ValueError('The consumers of the network are not known, '
+                             'create it with createTESPynet.')
+        unknown = [i for i in demand.columns
+                   if 'con' + str(i) not in self.consumers]
+        if len(unknown) > 0:
+            print('WARNING: {} consumers of the demand are not in the '
+                  'network and are neglected.'.format(len(unknown)))
+        known = [i for i in demand.columns if i not in unknown]
+        consumers = [self.consumers['con' + str(i)] for i in known]
+        if T_amb is not None:
+            pipes = [comp for comp in self.nw.comps.index
+                     if isinstance(comp, cmp.pipe)]
+
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        results_file = os.path.join(outdir, 'results.csv')
+        if os.path.exists(results_file):
+            os.remove(results_file)
+
+        summary = []
+        self.failed_steps = {}
+        for snapshot, step in zip(demand.index,
+                                  demand[known].values.astype(float)):
+            print('time step {}'.format(snapshot))
+            for consumer, power in zip(consumers, step):
+                consumer.set_attr(Q=float(power) * (-1000000))
+            if T_amb is not None:
+                for comp in pipes:
+                    comp.set_attr(Tamb=float(T_amb[snapshot]))
+            row = {'iterations': np.nan, 'residual': np.nan}
+            try:
+                self.nw.solve('offdesign', design_file=self.design_file,
+                              max_iter=max_iter)
+            except Exception as error:
+                print('time step {} failed: {}'.format(snapshot, error))
+                self.failed_steps[snapshot] = str(error)
+                summary += [row]
+                continue
+            row['iterations'] = self.nw.iter
+            row['residual'] = self.nw.res[-1]
+            for key, bus in getattr(self, 'busses', {}).items():
+                row[key] = bus.P.val
+            summary += [row]
+            results = pd.DataFrame(
+                    [(c.s.label, c.s_id, c.t.label, c.t_id, c.m.val,
+                      c.p.val, c.h.val, c.T.val)
+                     for c in self.nw.conns.index],
+                    columns=['s', 's_id', 't', 't_id', 'm', 'p', 'h', 'T'])
+            results.insert(0, 'snapshot', snapshot)
+            results.to_csv(results_file, sep=';', decimal='.', index=False,
+                           mode='a', header=not os.path.exists(results_file))
+        summary = pd.DataFrame(summary, index=demand.index)
+        summary.to_csv(os.path.join(outdir, 'summary.csv'), sep=';',
+                       decimal='.')
+        print('{} of {} time steps failed'.format(len(self.failed_steps),
+                                                  len(demand)))
+        return summary
+
+    def _run_timeseries_blocks(self, name, demand, T_amb, outdir, max_iter,
+                               processes, blocks, kwargs):
+        # the workers get a copy of the importer without the TESPy network
+        # and create their own one:
+        if blocks is None:
+            blocks = processes
+        positions = [pos for pos in np.array_split(np.arange(len(demand)),
+                                                   blocks) if len(pos) > 0]
+        part = copy.copy(self)
+        part.xmls = dict(self.xmls)
+        for attr in ['g', 'nw', '_spatial', 'pipes', 'consumers', 'preg',
+                     'infeed', 'forks', 'conns', 'busses']:
+            part.__dict__.pop(attr, None)
+        jobs = []
+        for number, pos in enumerate(positions):
+            block_kwargs = dict(kwargs, max_iter=max_iter)
+            jobs += [(part, '{}_b{}'.format(name, number), demand.iloc[pos],
+                      None if T_amb is None else T_amb.reindex(
+                              demand.index[pos]),
+                      os.path.join(outdir, 'block{}'.format(number)),
+                      block_kwargs)]
+        summaries = []
+        self.failed_blocks = {}
+        pool = multiprocessing.Pool(processes)
+        try:
+            for block, summary, error in pool.imap_unordered(
+                    _run_timeseries_block, jobs):
+                if error is not None:
+                    print('block {} failed: {}'.format(block, error))
+                    self.failed_blocks[block] = error
+                    continue
+                summary['block'] = block
+                summaries += [summary]
+        finally:
+            pool.close()
+            pool.join()
+        print('{} of {} blocks failed'.format(len(self.failed_blocks),
+                                              len(jobs)))
+        if not summaries:
+            return pd.DataFrame()
+        return pd.concat(summaries).reindex(demand.index)
+
     def creategraph1(self):
         import networkx as nx
         import pylab
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module calculates the hosting capacity of the buses of a network
+converted by ImporterXMLSincal, i.e. how much additional feed-in (e.g. PV) or
+load (e.g. EV) each bus can take before a line limit or a voltage limit is
+hit. All candidate buses are evaluated at once with linear sensitivities:
+    - line flows with the PTDF (reactances, see module ptdf)
+    - voltage magnitudes with the same linear model built from the line
+      resistances, which is a good approximation in LV and MV grids with
+      active power at unity power factor.
+The binding cases can be confirmed with a full power flow in PyPSA.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class HostingCapacity():
+    """
+    Hosting capacity of buses from linear sensitivities.
+
+    Parameters
+    ----------
+    importer: ImporterXMLSincal
+        importer with converted buses, lines and generators
+    v_min: float, default 0.95
+        lower voltage limit in p.u.
+    v_max: float, default 1.05
+        upper voltage limit in p.u.
+    loading: float, default 1.
+        maximum loading of the lines relative to s_nom
+    """
+
+    def __init__(self, importer, v_min=0.95, v_max=1.05, loading=1.):
+        self.importer = importer
+        self.flows = importer.ptdf(weight='x')
+        self.voltages = importer.ptdf(weight='r')
+        self.s_nom = (importer.lines['s_nom'].reindex(self.flows.lines)
+                      .astype(float).values * loading)
+        self.s_nom[~(self.s_nom > 0)] = np.inf
+        self.v_min = v_min
+        self.v_max = v_max
+
+    def voltage_sensitivity(self, buses):
+        """
+        Returns the change of the voltage magnitude of all buses in p.u. per
+        MW injected at each of the given buses (buses x candidates), solved
+        for all candidates at once.
+        """
+        engine = self.voltages
+        cols = engine.buses.get_indexer(buses)
+        rhs = np.zeros((len(engine.buses), len(cols)))
+        rhs[cols, np.arange(len(cols))] = 1.
+        sens = np.zeros((len(engine.buses), len(cols)))
+        sens[engine.calc] = engine.factorise().solve(rhs[engine.calc])
+        return sens
+
+    def base_state(self, snapshots=None):
+        """
+        Returns the line flows and voltages of the base state from the load
+        series of the given snapshots (snapshots x lines and
+        snapshots x buses). Without snapshots an empty network is assumed.
+        """
+        nbuses = len(self.flows.buses)
+        if snapshots is None:
+            injections = pd.DataFrame(np.zeros((1, nbuses)),
+                                      columns=self.flows.buses)
+        else:
+            p_set = self.importer._window_p_set(snapshots)
+            injections = self.flows.loadinjections(self.importer.loads, p_set)
+        flows = self.flows.flows(injections, method='factor').values
+        p = injections.values
+        engine = self.voltages
+        voltages = np.ones_like(p)
+        voltages[:, engine.calc] += engine.factorise().solve(
+                np.ascontiguousarray(p[:, engine.calc].T)).T
+        return np.nan_to_num(flows), voltages
+
+    @staticmethod
+    def _minlimit(bound, state, sensitivity, snapchunk):
+        """
+        Returns the smallest non-negative change dp over all snapshots, so
+        that state + dp * sensitivity reaches the bound (elements x
+        candidates). The snapshots are evaluated in chunks of snapchunk.
+        """
+        minimum = np.full(sensitivity.shape, np.inf)
+        for t0 in range(0, len(state), snapchunk):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                limit = ((bound[None] - state[t0:t0+snapchunk, :, None]) /
+                         sensitivity[None])
+            limit[:, sensitivity == 0] = np.inf
+            minimum = np.minimum(minimum,
+                                 np.where(limit < 0, 0., limit).min(axis=0))
+        return minimum
+
+    def capacity(self,
+                 buses=None,
+                 snapshots=None,
+                 mode='feedin',
+                 levels=None,
+                 chunk=500,
+                 confirm=False,
+                 margin=0.1,
+                 max_elements=int(1e7)):
+        """
+        Calculates the hosting capacity of the candidate buses.
+
+        Parameters
+        ----------
+        buses: list, default None
+            candidate buses; if None, all buses connected to a slack
+        snapshots: pd.Index, default None
+            snapshots of the load series used as base state; the capacity is
+            the minimum over all of them. If None, an empty network is used.
+        mode: str, default 'feedin'
+            'feedin' for additional generation, 'load' for additional load
+        levels: list, default None
+            if given, a table of candidates x levels (in MW) is returned,
+            that states whether each level can be hosted.
+        chunk: int, default 500
+            number of candidates evaluated at once; limits the memory
+        confirm: boolean, default False
+            confirm the capacities with a full power flow (see confirm)
+        margin: float, default 0.1
+            relative margin of the candidates, that are confirmed (see
+            confirm)
+        max_elements: int, default 1e7
+            maximum size of the intermediate snapshots x lines x candidates
+            arrays; chunk and the number of snapshots evaluated at once are
+            reduced to stay below it.
+
+        Returns
+        -------
+        capacity: pd.DataFrame
+            per candidate bus: capacity in MW, the binding element and
+            whether it is a line or a voltage limit
+        feasible: pd.DataFrame
+            only if levels are given
+        """
+        engine = self.flows
+        if buses is None:
+            buses = engine.buses[~engine.buses.isin(engine.unsupplied) &
+                                 ~engine.buses.isin(engine.slack)]
+        buses = pd.Index(buses)
+        sign = 1. if mode == 'feedin' else -1.
+        flows, voltages = self.base_state(snapshots)
+        ptdf = np.nan_to_num(engine.ptdf)
+        width = max(len(engine.lines), len(engine.buses), 1)
+        snapchunk = min(len(flows), max(1, max_elements // width))
+        chunk = max(1, min(chunk, max_elements // (snapchunk * width)))
+
+        results = []
+        for start in range(0, len(buses), chunk):
+            cand = buses[start:start+chunk]
+            cols = engine.buses.get_indexer(cand)
+
+            # line limits: |f0 + dp * a| <= s_nom
+            a = sign * ptdf[:, cols]
+            limit = self._minlimit(np.sign(a) * self.s_nom[:, None],
+                                   flows, a, snapchunk)
+            line = limit.argmin(axis=0)
+            line_cap = limit[line, np.arange(len(cols))]
+
+            # voltage limits: v_min <= v0 + dp * s <= v_max
+            s = sign * self.voltage_sensitivity(cand)
+            bound = np.where(s > 0, self.v_max, self.v_min)
+            limit = self._minlimit(bound, voltages, s, snapchunk)
+            bus = limit.argmin(axis=0)
+            bus_cap = limit[bus, np.arange(len(cols))]
+
+            results += [pd.DataFrame(
+                    {'capacity': np.minimum(line_cap, bus_cap),
+                     'line_capacity': line_cap,
+                     'voltage_capacity': bus_cap,
+                     'binding': np.where(line_cap <= bus_cap,
+                                         engine.lines[line],
+                                         engine.buses[bus]),
+                     'limit': np.where(line_cap <= bus_cap,
+                                       'line', 'voltage')},
+                    index=cand)]
+        capacity = pd.concat(results)
+        capacity.index.name = 'bus'
+
+        if confirm is True:
+            capacity = self.confirm(capacity, snapshots=snapshots, mode=mode,
+                                    margin=margin, levels=levels)
+        if levels is None:
+            return capacity
+        levels = np.asarray(levels, dtype=float)
+        feasible = pd.DataFrame(levels[None, :] <=
+                                capacity['capacity'].values[:, None],
+                                index=capacity.index,
+                                columns=levels)
+        return capacity, feasible
+
+    def confirm(self, capacity, snapshots=None, mode='feedin', margin=0.1,
+                levels=None):
+        """
+        Confirms the capacities with a non-linear power flow in PyPSA. For
+        each confirmed candidate the capacity is added at its bus and the
+        maximum line loading and the voltage range are stored in the columns
+        pf_loading, pf_v_min and pf_v_max (NaN for the other ones). The
+        network of the importer must have been created with importnetwork.
+        Only the candidates near a limit of the network are confirmed:
+            - the binding ones, whose capacity is within margin (relative)
+              of the smallest capacity of all candidates
+            - if levels are given, the ones with a level within margin of
+              their capacity, as only for them the non-linear power flow may
+              change whether the level can be hosted
+        Set margin to np.inf to confirm all candidates.
+        """
+        cap = capacity['capacity']
+        finite = np.isfinite(cap)
+        selected = finite & (cap <= cap[finite].min() * (1. + margin))
+        if levels is not None:
+            levels = np.asarray(levels, dtype=float)
+            near = (np.abs(levels[None, :] - cap.values[:, None]) <=
+                    margin * cap.values[:, None]).any(axis=1)
+            selected |= finite & near
+        print('confirming {} of {} candidates'.format(selected.sum(),
+                                                      len(cap)))
+
+        network = self.importer.network.copy()
+        if snapshots is None:
+            snapshots = network.snapshots[:1]
+            network.set_snapshots(snapshots)
+            p_set = pd.DataFrame(0., index=snapshots,
+                                 columns=network.loads.index)
+        else:
+            network.set_snapshots(snapshots)
+            p_set = self.importer._window_p_set(snapshots)
+        network.import_series_from_dataframe(p_set, 'Load', 'p_set')
+        sign = 1. if mode == 'feedin' else -1.
+
+        s_nom = network.lines['s_nom'].where(network.lines['s_nom'] > 0)
+        network.add('Generator', 'hosting_capacity', bus=capacity.index[0],
+                    control='PQ')
+        checks = []
+        for bus, value in cap[selected].items():
+            network.generators.loc['hosting_capacity', 'bus'] = bus
+            network.generators.loc['hosting_capacity', 'p_set'] = sign * value
+            network.pf()
+            loading = network.lines_t.p0.abs().div(s_nom).max().max()
+            v_mag = network.buses_t.v_mag_pu
+            checks += [(loading, v_mag.min().min(), v_mag.max().max())]
+            print('confirmed bus {}'.format(bus))
+        checks = pd.DataFrame(checks,
+                              index=capacity.index[selected.values],
+                              columns=['pf_loading', 'pf_v_min', 'pf_v_max'])
+        return capacity.join(checks)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module provides a fast hydraulic calculation of the feed line of the
+district heating networks imported by DHimport. The mass flows of the pipes
+and the pressures of the nodes are solved with a Newton iteration on sparse
+matrices (Darcy friction after Swamee-Jain). The results can be used as
+starting values for TESPy or as a quick screening.
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import spsolve
+
+from ptdf import incidence_matrix
+
+
+class HydraulicSolver():
+    """
+    Newton iteration over the mass flows of the pipes and the pressures of
+    the nodes.
+
+    Equations: the pressure drop of each pipe
+    p0 - p1 = f * L / (2 * rho * D * A²) * m * |m| (f = 64/Re for laminar
+    flow, else Swamee-Jain; the larger one below Re = 2300) and the mass
+    balance of each node without fixed pressure. Elements with a fixed
+    pressure difference (pressure regulators) have the column dp set instead
+    of L and D.
+    Nodes without connection to a node with fixed pressure get nan.
+
+    Parameters
+    ----------
+    nodes: pd.Index
+        names of the nodes
+    pipes: pd.DataFrame
+        pipes with the columns bus0 and bus1 (nodes of terminal 1 and 2),
+        L (m), D (m), ks (m) and optionally dp (fixed pressure difference
+        p0 - p1 in bar)
+    supply_nodes: list
+        nodes with fixed pressure (infeeders)
+    rho: float, default 965.
+        density of the water in kg/m³
+    mu: float, default 3.15e-4
+        dynamic viscosity in Pa s
+    """
+
+    def __init__(self, nodes, pipes, supply_nodes, rho=965., mu=3.15e-4):
+        self.nodes = pd.Index(nodes)
+        self.pipes = pipes.index
+        self.rho = rho
+        self.mu = mu
+        self.incidence = incidence_matrix(self.nodes, pipes)
+        npipes = len(pipes)
+
+        if 'dp' in pipes.columns:
+            self.dp_fixed = pipes['dp'].astype(float).values * 1e5
+        else:
+            self.dp_fixed = np.full(npipes, np.nan)
+        self.fixed = ~np.isnan(self.dp_fixed)
+        self.L = pipes['L'].astype(float).values
+        self.D = pipes['D'].astype(float).values
+        self.ks = pipes['ks'].astype(float).values
+        self.area = np.pi * self.D**2 / 4.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # linear resistance of laminar flow (Hagen-Poiseuille):
+            self.r_lam = np.where(self.fixed, 0.,
+                                  32. * mu * self.L /
+                                  (rho * self.area * self.D**2))
+
+        # only sub-networks with a supply node can be calculated:
+        adjacency = abs(self.incidence.T) @ abs(self.incidence)
+        ncomp, labels = connected_components(adjacency, directed=False)
+        supply = self.nodes.get_indexer(pd.Index(supply_nodes).unique())
+        supply = supply[supply >= 0]
+        supplied = np.zeros(ncomp, dtype=bool)
+        supplied[labels[supply]] = True
+        self.supply = supply
+        bus0 = self.nodes.get_indexer(pipes['bus0'])
+        self.calc_pipes = np.flatnonzero(supplied[labels[bus0]])
+        calc = supplied[labels]
+        calc[supply] = False
+        self.free = np.flatnonzero(calc)
+        self.unsupplied = self.nodes[~supplied[labels]]
+        if len(self.unsupplied) > 0:
+            print('{} nodes are not connected to an infeeder'.format(
+                    len(self.unsupplied)))
+
+    @classmethod
+    def from_importer(cls, importer, **kwargs):
+        """
+        Creates the solver from the tables of a DHimport: pipes from
+        flowLine (see DHimport.pipe_parameters), pressure regulators from
+        flowPressureReg (pInlet - pOutlet) and the nodes of the infeeders as
+        supply nodes.
+        """
+        terminals = importer.xmls['flowTerminal']
+        # nodes of terminal 1 (bus0) and terminal 2 (bus1) of each element:
+        ends = terminals.sort_values('TerminalNo').groupby(level=0)['Node_ID']
+        bus0 = ends.first()
+        bus1 = ends.last()
+        parameters = importer.pipe_parameters()
+        pipes = pd.DataFrame({'bus0': bus0.reindex(parameters.index),
+                              'bus1': bus1.reindex(parameters.index),
+                              'L': parameters['L'],
+                              'D': parameters['D'],
+                              'ks': parameters['ks'],
+                              'dp': np.nan})
+        regulators = importer.xmls['flowPressureReg']
+        if not regulators.empty:
+            regs = pd.DataFrame({'bus0': bus0.reindex(regulators.index),
+                                 'bus1': bus1.reindex(regulators.index),
+                                 'L': np.nan,
+                                 'D': np.nan,
+                                 'ks': np.nan,
+                                 'dp': -importer.preg_parameters()['pr']})
+            pipes = pd.concat([pipes, regs])
+        supply = terminals.loc[terminals.index.isin(
+                importer.xmls['flowInfeeder'].index), 'Node_ID']
+        nodes = pd.Index(terminals['Node_ID'].unique())
+        return cls(nodes, pipes, list(supply), **kwargs)
+
+    def pressuredrop(self, m, pipes=None):
+        """
+        Returns the pressure drop (Pa) and its derivative by the mass flow
+        of the pipes (positions, default: all).
+        """
+        if pipes is None:
+            pipes = np.arange(len(self.pipes))
+        L, D, ks = self.L[pipes], self.D[pipes], self.ks[pipes]
+        r_lam, fixed = self.r_lam[pipes], self.fixed[pipes]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reynolds = 4. * np.abs(m) / (np.pi * D * self.mu)
+            turbulent = 0.25 / np.log10(ks / (3.7 * D) +
+                                        5.74 / reynolds**0.9)**2
+            k = turbulent * L / (2. * self.rho * D * self.area[pipes]**2)
+            # the larger of the laminar and turbulent friction keeps the
+            # pressure drop continuous in the transition region:
+            laminar = (reynolds < 2300) & (r_lam >= k * np.abs(m))
+            dp = np.where(laminar, r_lam * m, k * m * np.abs(m))
+            deriv = np.where(laminar, r_lam, 2. * k * np.abs(m))
+        dp = np.where(fixed, self.dp_fixed[pipes], dp)
+        deriv = np.where(fixed, 0., deriv)
+        return dp, deriv
+
+    def solve(self, demand, p_supply=15., tol=1e-6, max_iter=30):
+        """
+        Solves the mass flows and pressures.
+
+        Parameters
+        ----------
+        demand: pd.Series
+            mass flow taken from each node in kg/s
+        p_supply: float, default 15.
+            pressure of the supply nodes in bar
+        tol: float, default 1e-6
+            tolerance of the mass flows and mass balances in kg/s
+        max_iter: int, default 30
+
+        Returns
+        -------
+        results: dict
+            m (pd.Series, mass flow of the pipes from bus0 to bus1 in kg/s),
+            v (pd.Series, velocity in the pipes in m/s), p (pd.Series,
+            pressure of the nodes in bar) and iterations
+        """
+        pipes = self.calc_pipes
+        free = self.free
+        incidence = self.incidence[pipes]
+        a_free = incidence[:, free].tocsc()
+        d = demand.reindex(self.nodes, fill_value=0.).values[free]
+        p = np.full(len(self.nodes), np.nan)
+        p[self.supply] = p_supply * 1e5
+        p[free] = p_supply * 1e5
+        m = np.zeros(len(pipes))
+        for i in range(max_iter):
+            dp, deriv = self.pressuredrop(m, pipes)
+            res_pipes = incidence @ np.nan_to_num(p) - dp
+            res_nodes = a_free.T @ m + d
+            jacobian = sp.bmat([[-sp.diags(deriv), a_free],
+                                [a_free.T, None]], format='csc')
+            step = spsolve(jacobian, -np.r_[res_pipes, res_nodes])
+            m += step[:len(pipes)]
+            p[free] += step[len(pipes):]
+            error = max(np.abs(step[:len(pipes)]).max(initial=0.),
+                        np.abs(res_nodes).max(initial=0.))
+            if error < tol:
+                break
+        print('hydraulic pre-solver: {} iterations (error {:.2e} kg/s)'.format(
+                i+1, error))
+        flows = np.full(len(self.pipes), np.nan)
+        flows[pipes] = m
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocity = flows / (self.rho * self.area)
+        return {'m': pd.Series(flows, index=self.pipes),
+                'v': pd.Series(velocity, index=self.pipes),
+                'p': pd.Series(p / 1e5, index=self.nodes),
+                'iterations': i+1}
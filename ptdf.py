@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module provides a linear (DC) power flow based on power transfer
+distribution factors (PTDF) for the networks converted by ImporterXMLSincal.
+The network matrix is factorised once per topology; the line flows of all
+snapshots are then calculated at once with one matrix product.
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+
+def incidence_matrix(buses, lines):
+    """
+    Creates the sparse incidence matrix of the lines with +1 at bus0 and -1 at
+    bus1.
+
+    Parameters
+    ----------
+    buses: pd.Index
+        names of the buses
+    lines: pd.DataFrame
+        lines with the columns bus0 and bus1
+
+    Returns
+    -------
+    incidence: scipy.sparse.csr_matrix
+        lines x buses
+    """
+    bus0 = buses.get_indexer(lines['bus0'])
+    bus1 = buses.get_indexer(lines['bus1'])
+    if (bus0 < 0).any() or (bus1 < 0).any():
+        raise KeyError('lines {} are connected to unknown buses'.format(
+                list(lines.index[(bus0 < 0) | (bus1 < 0)])))
+    nlines = len(lines)
+    rows = np.r_[np.arange(nlines), np.arange(nlines)]
+    data = np.r_[np.ones(nlines), -np.ones(nlines)]
+    return sp.csr_matrix((data, (rows, np.r_[bus0, bus1])),
+                         shape=(nlines, len(buses)))
+
+
+def load_injections(buses, loads, p_set):
+    """
+    Aggregates the p_set of the loads to the injections of the buses.
+
+    Parameters
+    ----------
+    buses: pd.Index
+        names of the buses
+    loads: pd.DataFrame
+        loads with the column bus
+    p_set: pd.DataFrame
+        snapshots x loads in MW (or Mvar)
+
+    Returns
+    -------
+    injections: pd.DataFrame
+        snapshots x buses in MW (loads are negative injections)
+    """
+    bus = buses.get_indexer(loads['bus'].reindex(p_set.columns))
+    if (bus < 0).any():
+        print('WARNING: {} loads are not connected to a known bus and are '
+              'neglected.'.format((bus < 0).sum()))
+    found = np.flatnonzero(bus >= 0)
+    mapping = sp.csr_matrix((-np.ones(len(found)), (found, bus[found])),
+                            shape=(len(p_set.columns), len(buses)))
+    return pd.DataFrame((mapping.T @ p_set.values.T).T,
+                        index=p_set.index,
+                        columns=buses)
+
+
+def slack_buses(importer):
+    """
+    Returns the buses of the slack generators of an ImporterXMLSincal
+    (index: generator). The generators of Infeeder elements are connected
+    to 'b'+Node_ID by dfstocomponents, which is not a bus; their bus is
+    taken from the terminals of the element (Element_ID -> Node_ID).
+    """
+    generators = importer.generators
+    slack = generators.loc[generators['control'].str.lower() == 'slack',
+                           'bus'].astype(str)
+    unknown = ~slack.isin(importer.buses.index)
+    xmls = getattr(importer, 'xmls', {})
+    if unknown.any() and 'terminal' in xmls:
+        terminals = xmls['terminal']
+        nodes = pd.Series(terminals['Node_ID'].astype(str).values,
+                          index=terminals['Element_ID'].astype(str).values)
+        nodes = nodes[~nodes.index.duplicated()]
+        found = nodes.reindex(slack.index[unknown].astype(str))
+        slack[unknown] = np.where(found.notna(), found.values,
+                                  slack[unknown].values)
+    return slack
+
+
+class PTDF():
+    """
+    Linear power flow with power transfer distribution factors.
+
+    The susceptance matrix of the network is set up from the per unit
+    reactances of the lines (x / v_nom², base power 1 MVA as in PyPSA) and
+    factorised once. Each connected sub-network needs a slack bus; lines of
+    sub-networks without slack get nan flows.
+
+    Parameters
+    ----------
+    buses: pd.DataFrame
+        buses with the column v_nom in kV
+    lines: pd.DataFrame
+        lines with the columns bus0, bus1 and x in Ohm
+    slack_buses: list
+        names of the slack buses
+    weight: str, default 'x'
+        column of lines used as branch impedance
+    """
+
+    def __init__(self, buses, lines, slack_buses, weight='x'):
+        self.buses = buses.index
+        self.lines = lines.index
+        self.key = self.topologykey(buses, lines, slack_buses, weight)
+
+        v_nom = buses['v_nom'].astype(float)
+        # per unit impedances, like PyPSA with a base power of 1 MVA:
+        z_pu = (lines[weight].astype(float) /
+                v_nom.reindex(lines['bus0']).values**2)
+        self.b = 1. / z_pu.values
+        self.incidence = incidence_matrix(self.buses, lines)
+        self.bmatrix = (self.incidence.T @ sp.diags(self.b) @
+                        self.incidence).tocsc()
+
+        # find the sub-networks and their slack buses:
+        ncomp, labels = connected_components(self.bmatrix, directed=False)
+        slack = self.buses.get_indexer(pd.Index(slack_buses).unique())
+        slack = slack[slack >= 0]
+        supplied = np.zeros(ncomp, dtype=bool)
+        supplied[labels[slack]] = True
+        # per sub-network only one slack is used:
+        slack = pd.Series(slack).groupby(labels[slack]).first().values
+
+        self.slack = self.buses[slack]
+        calc = supplied[labels]
+        calc[slack] = False
+        self.calc = np.flatnonzero(calc)
+        self.unsupplied = self.buses[~supplied[labels]]
+        bus0 = self.buses.get_indexer(lines['bus0'])
+        self.lines_unsupplied = self.lines[~supplied[labels[bus0]]]
+        if len(self.unsupplied) > 0:
+            print('{} buses are not connected to a slack bus'.format(
+                    len(self.unsupplied)))
+
+        self._lu = None
+        self._ptdf = None
+
+    @staticmethod
+    def topologykey(buses, lines, slack_buses, weight='x'):
+        """
+        Returns a hash of everything the PTDF depends on, to check if a
+        cached PTDF is still valid.
+        """
+        parts = [pd.util.hash_pandas_object(pd.Series(buses.index)).values,
+                 pd.util.hash_pandas_object(buses['v_nom'].astype(float),
+                                            index=False).values,
+                 pd.util.hash_pandas_object(lines[['bus0', 'bus1']],
+                                            index=True).values,
+                 pd.util.hash_pandas_object(lines[weight].astype(float),
+                                            index=False).values,
+                 pd.util.hash_pandas_object(pd.Series(sorted(slack_buses),
+                                                      dtype=object)).values]
+        return hash(np.concatenate(parts).tobytes())
+
+    @classmethod
+    def from_importer(cls, importer, weight='x'):
+        """
+        Creates the PTDF from the dataframes converted by an
+        ImporterXMLSincal (buses, lines and generators, see slack_buses).
+        """
+        slack = slack_buses(importer)
+        return cls(importer.buses, importer.lines, list(slack), weight=weight)
+
+    @classmethod
+    def from_network(cls, network, weight='x'):
+        """
+        Creates the PTDF from the buses, lines and slack generators of a
+        pypsa network.
+        """
+        generators = network.generators
+        slack = generators['bus'][generators['control'].str.lower() == 'slack']
+        return cls(network.buses, network.lines, list(slack), weight=weight)
+
+    def factorise(self):
+        """
+        Returns the sparse LU-factorisation of the reduced susceptance matrix,
+        which is computed only once.
+        """
+        if self._lu is None:
+            reduced = self.bmatrix[self.calc][:, self.calc]
+            self._lu = splu(reduced.tocsc())
+        return self._lu
+
+    @property
+    def ptdf(self):
+        """
+        The dense PTDF matrix (lines x buses). The columns of slack buses and
+        buses without slack are zero.
+        Caution: for big networks this matrix needs a lot of memory; use
+        flows with method='factor' instead.
+        """
+        if self._ptdf is None:
+            lu = self.factorise()
+            # B_red^-1 * (diag(b) * A_red)^T, solved for all lines at once:
+            rhs = (sp.diags(self.b) @ self.incidence[:, self.calc]).T
+            ptdf = np.zeros((len(self.lines), len(self.buses)))
+            ptdf[:, self.calc] = lu.solve(rhs.toarray()).T
+            ptdf[self.lines.get_indexer(self.lines_unsupplied)] = np.nan
+            self._ptdf = ptdf
+        return self._ptdf
+
+    def loadinjections(self, loads, p_set):
+        """
+        Aggregates the p_set of the loads to the injections of the buses.
+
+        Parameters
+        ----------
+        loads: pd.DataFrame
+            loads with the column bus
+        p_set: pd.DataFrame
+            snapshots x loads in MW
+
+        Returns
+        -------
+        injections: pd.DataFrame
+            snapshots x buses in MW (loads are negative injections)
+        """
+        return load_injections(self.buses, loads, p_set)
+
+    def flows(self, injections, method='ptdf'):
+        """
+        Calculates the line flows of all snapshots at once.
+
+        Parameters
+        ----------
+        injections: pd.DataFrame
+            snapshots x buses in MW
+        method: str, default 'ptdf'
+            'ptdf' uses one product with the (cached) dense PTDF,
+            'factor' solves with the sparse factorisation for all snapshots
+            at once and needs less memory for big networks.
+
+        Returns
+        -------
+        flows: pd.DataFrame
+            snapshots x lines in MW (from bus0 to bus1)
+        """
+        p = injections.reindex(columns=self.buses, fill_value=0.).values
+        if method == 'ptdf':
+            flows = p @ self.ptdf.T
+        else:
+            theta = np.zeros((len(self.buses), len(p)))
+            theta[self.calc] = self.factorise().solve(
+                    np.ascontiguousarray(p[:, self.calc].T))
+            flows = (sp.diags(self.b) @ self.incidence @ theta).T
+            flows[:, self.lines.get_indexer(self.lines_unsupplied)] = np.nan
+        return pd.DataFrame(flows, index=injections.index, columns=self.lines)
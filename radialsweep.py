@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module provides a backward/forward sweep power flow for radial networks
+converted by ImporterXMLSincal. Radial sub-networks are ordered from their
+slack bus outward once; the sweep then runs for all snapshots together. Meshed
+sub-networks can be calculated with PyPSA instead.
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components, breadth_first_order
+from scipy.sparse.linalg import splu
+
+from ptdf import incidence_matrix, slack_buses
+
+
+class BackwardForwardSweep():
+    """
+    Backward/forward sweep for radial sub-networks.
+
+    The radial buses are ordered from the slack outward. With this order the
+    relation between the currents of the buses and the currents of the lines
+    feeding them is a triangular sparse matrix M: M * I_line = I_bus
+    (backward sweep) and M^T * V = V_slack - Z * I_line (forward sweep). M is
+    factorised once and each sweep is one solve for all snapshots.
+    The shunt capacitances of the lines are neglected.
+
+    Parameters
+    ----------
+    buses: pd.DataFrame
+        buses with the column v_nom in kV
+    lines: pd.DataFrame
+        lines with the columns bus0, bus1, r and x in Ohm
+    slack_buses: list
+        names of the slack buses
+    """
+
+    def __init__(self, buses, lines, slack_buses):
+        self.buses = buses.index
+        self.lines = lines.index
+        incidence = incidence_matrix(self.buses, lines)
+        adjacency = abs(incidence.T) @ abs(incidence)
+        ncomp, labels = connected_components(adjacency, directed=False)
+
+        slack = self.buses.get_indexer(pd.Index(slack_buses).unique())
+        slack = slack[slack >= 0]
+        bus0 = self.buses.get_indexer(lines['bus0'])
+        bus1 = self.buses.get_indexer(lines['bus1'])
+        nbuses = np.bincount(labels, minlength=ncomp)
+        nlines = np.bincount(labels[bus0], minlength=ncomp)
+
+        # line between each pair of buses:
+        pairs = pd.Series(np.arange(len(lines)),
+                          index=pd.MultiIndex.from_arrays(
+                                  [np.minimum(bus0, bus1),
+                                   np.maximum(bus0, bus1)]))
+
+        order, parent = [], []
+        self.slack = []
+        radial = np.zeros(ncomp, dtype=bool)
+        for comp_slack in pd.Series(slack).groupby(labels[slack]).first():
+            comp = labels[comp_slack]
+            if nlines[comp] != nbuses[comp] - 1:
+                continue
+            radial[comp] = True
+            self.slack += [comp_slack]
+            comp_order, preds = breadth_first_order(adjacency,
+                                                    comp_slack,
+                                                    directed=False,
+                                                    return_predecessors=True)
+            order += [comp_order[1:]]
+            parent += [preds[comp_order[1:]]]
+
+        order = np.concatenate(order) if order else np.zeros(0, dtype=int)
+        parent = np.concatenate(parent) if parent else np.zeros(0, dtype=int)
+        self.order = order
+        self.parent = parent
+        self.branch = pairs.loc[list(zip(np.minimum(order, parent),
+                                         np.maximum(order, parent)))].values
+        self.slack = np.array(self.slack, dtype=int)
+        self.radial = self.buses[radial[labels]]
+        self.meshed = self.buses[~radial[labels]]
+        supplied = np.zeros(ncomp, dtype=bool)
+        supplied[labels[slack]] = True
+        # meshed buses, that can be calculated by the fallback:
+        self.meshed_supplied = self.buses[~radial[labels] & supplied[labels]]
+        print('{} buses are radial, {} are meshed or without slack'.format(
+                len(self.radial), len(self.meshed)))
+
+        # position of the buses in the order (-1 for slack buses):
+        position = np.full(len(self.buses), -1)
+        position[order] = np.arange(len(order))
+        self.from_slack = position[parent] < 0
+        rows = position[parent[~self.from_slack]]
+        cols = np.flatnonzero(~self.from_slack)
+        child = sp.csc_matrix((np.ones(len(rows)), (rows, cols)),
+                              shape=(len(order), len(order)))
+        self.matrix = (sp.identity(len(order), format='csc') - child).tocsc()
+        self._lu = splu(self.matrix, permc_spec='NATURAL') if len(order) \
+            else None
+
+        v_nom = buses['v_nom'].astype(float).values
+        z = (lines['r'].astype(float).values +
+             1j * lines['x'].astype(float).values)
+        self.z = z[self.branch] / v_nom[bus0[self.branch]]**2
+        self.orientation = bus0[self.branch] == parent
+
+    @classmethod
+    def from_importer(cls, importer):
+        """
+        Creates the sweep from the dataframes converted by an
+        ImporterXMLSincal (buses, lines and generators).
+        """
+        return cls(importer.buses, importer.lines, list(slack_buses(importer)))
+
+    def _solve(self, rhs, trans='N'):
+        # the factorisation is real, so real and imaginary part are solved
+        # separately
+        return (self._lu.solve(np.ascontiguousarray(rhs.real), trans=trans) +
+                1j * self._lu.solve(np.ascontiguousarray(rhs.imag),
+                                    trans=trans))
+
+    def _meshed_network(self, network, snapshots, p, q, v_slack):
+        """
+        Returns a copy of the meshed sub-networks with a slack bus, in which
+        the injections p and q (arrays snapshots x buses) replace the loads
+        and time series of the network.
+        """
+        sub = network[network.buses.index.isin(self.meshed_supplied)]
+        sub.set_snapshots(snapshots)
+        sub.mremove('Load', sub.loads.index)
+        for component in sub.one_port_components - {'Load'}:
+            static = sub.df(component)
+            for attr in ['p_set', 'q_set']:
+                if attr in static.columns:
+                    static[attr] = 0.
+                    sub.pnl(component)[attr] = pd.DataFrame(index=snapshots)
+        buses = sub.buses.index
+        cols = self.buses.get_indexer(buses)
+        names = 'sweep ' + buses
+        sub.madd('Load', names, bus=buses,
+                 p_set=pd.DataFrame(-p[:, cols], snapshots, names),
+                 q_set=pd.DataFrame(-q[:, cols], snapshots, names))
+        sub.buses['v_mag_pu_set'] = v_slack
+        sub.buses_t['v_mag_pu_set'] = pd.DataFrame(index=snapshots)
+        return sub
+
+    def solve(self, p, q=None, v_slack=1., tol=1e-8, max_iter=30,
+              network=None):
+        """
+        Runs the power flow for all snapshots at once.
+
+        Parameters
+        ----------
+        p: pd.DataFrame
+            snapshots x buses, active power injections in MW (loads are
+            negative)
+        q: pd.DataFrame, default None
+            snapshots x buses, reactive power injections in Mvar
+        v_slack: float, default 1.
+            voltage of the slack buses in p.u.
+        tol: float, default 1e-8
+            tolerance of the voltages in p.u.
+        max_iter: int, default 30
+        network: pypsa.Network, default None
+            if given, the meshed sub-networks with a slack bus are calculated
+            with the non-linear power flow of PyPSA (with the injections p
+            and q and v_slack at their slack buses); else and for sub-networks
+            without slack the results are nan.
+
+        Returns
+        -------
+        results: dict
+            DataFrames (snapshots x buses or lines) v_mag_pu, v_ang, p0, q0,
+            p1 and q1 and the Series converged (per snapshot, also of the
+            meshed sub-networks calculated with PyPSA)
+        """
+        snapshots = p.index
+        p = p.reindex(columns=self.buses, fill_value=0.).values
+        if q is None:
+            q = np.zeros_like(p)
+        else:
+            q = q.reindex(columns=self.buses, fill_value=0.).values
+        nsnaps = len(snapshots)
+        v = np.full((nsnaps, len(self.buses)), np.nan, dtype=complex)
+        v[:, self.slack] = v_slack
+        line_s0 = np.full((nsnaps, len(self.lines)), np.nan, dtype=complex)
+        line_s1 = line_s0.copy()
+        converged = np.ones(nsnaps, dtype=bool)
+
+        if len(self.order) > 0:
+            # consumed power of the ordered buses (snapshots in columns):
+            s_load = -(p[:, self.order] + 1j * q[:, self.order]).T
+            v_root = np.where(self.from_slack, v_slack, 0.)[:, None]
+            v_bus = np.ones_like(s_load) * v_slack
+            for i in range(max_iter):
+                i_line = self._solve(np.conj(s_load / v_bus))
+                v_new = self._solve(v_root - self.z[:, None] * i_line,
+                                    trans='T')
+                error = np.abs(v_new - v_bus).max(axis=0)
+                v_bus = v_new
+                if error.max(initial=0.) < tol:
+                    break
+            converged = error < tol
+            if converged.all():
+                print('sweep converged after {} iterations (error '
+                      '{:.2e})'.format(i+1, error.max(initial=0.)))
+            else:
+                print('WARNING: sweep did not converge for {} of {} '
+                      'snapshots after {} iterations (error {:.2e})'.format(
+                              (~converged).sum(), nsnaps, i+1, error.max()))
+            i_line = self._solve(np.conj(s_load / v_bus))
+            v[:, self.order] = v_bus.T
+            v_parent = v[:, self.parent].T
+            s_send = v_parent * np.conj(i_line)
+            s_recv = v_bus * np.conj(i_line)
+            s0 = np.where(self.orientation[:, None], s_send, -s_recv)
+            s1 = np.where(self.orientation[:, None], -s_recv, s_send)
+            line_s0[:, self.branch] = s0.T
+            line_s1[:, self.branch] = s1.T
+
+        results = {'v_mag_pu': pd.DataFrame(np.abs(v), snapshots, self.buses),
+                   'v_ang': pd.DataFrame(np.angle(v), snapshots, self.buses),
+                   'p0': pd.DataFrame(line_s0.real, snapshots, self.lines),
+                   'q0': pd.DataFrame(line_s0.imag, snapshots, self.lines),
+                   'p1': pd.DataFrame(line_s1.real, snapshots, self.lines),
+                   'q1': pd.DataFrame(line_s1.imag, snapshots, self.lines),
+                   'converged': pd.Series(converged, snapshots)}
+
+        if network is not None and len(self.meshed_supplied) > 0:
+            print('calculating {} meshed buses with pypsa'.format(
+                    len(self.meshed_supplied)))
+            sub = self._meshed_network(network, snapshots, p, q, v_slack)
+            status = sub.pf(snapshots)
+            results['converged'] &= status['converged'].loc[snapshots].all(
+                    axis=1)
+            for attr in ['v_mag_pu', 'v_ang']:
+                frame = sub.buses_t[attr].loc[snapshots]
+                results[attr][frame.columns] = frame
+            for attr in ['p0', 'q0', 'p1', 'q1']:
+                frame = sub.lines_t[attr].loc[snapshots]
+                results[attr][frame.columns] = frame
+        return results
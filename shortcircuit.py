@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module provides a short-circuit calculation for all buses of the networks
+converted by ImporterXMLSincal, following the equivalent voltage source method
+of IEC 60909. The admittance matrices of the positive and zero sequence are
+factorised once; the Thevenin impedances of all buses are then calculated in
+batched solves.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+from ptdf import incidence_matrix, slack_buses
+from xmlimport import XMLimport
+
+
+def read_infeeders(importer, sk='Sk2', rx='R_X'):
+    """
+    Reads the short-circuit power and the R/X-ratio of the infeeders from
+    Infeeder.xml, if the file was exported with the network. The default
+    attributes are the fields of the Sincal table Infeeder.
+
+    Parameters
+    ----------
+    importer: ImporterXMLSincal
+    sk: str, default 'Sk2'
+        attribute with the initial short-circuit power Sk'' in MVA
+    rx: str, default 'R_X'
+        attribute with the R/X-ratio
+
+    Returns
+    -------
+    infeeders: pd.DataFrame or None
+        infeeders with the columns sk and rx (index: Element_ID; empty
+        values are nan), None if the file or the attribute sk was not found
+    """
+    xml = XMLimport(importer.name,
+                    foldername=importer.foldername,
+                    list_file={'infeeder': ['Infeeder.xml', 'Element_ID']},
+                    path=importer.base_path)
+    try:
+        xml.xmltodfs()
+    except FileNotFoundError:
+        print('Infeeder.xml not found, default values are used.')
+        return None
+    data = xml.xmls['infeeder']
+    if data.empty or sk not in data.columns:
+        print('no attribute {} in Infeeder.xml (found: {}), default values '
+              'are used.'.format(sk, sorted(data.columns)))
+        return None
+    infeeders = pd.DataFrame({'sk': pd.to_numeric(data[sk],
+                                                  errors='coerce')})
+    if rx in data.columns:
+        infeeders['rx'] = pd.to_numeric(data[rx], errors='coerce')
+    else:
+        print('no attribute {} in Infeeder.xml, the default R/X-ratio is '
+              'used.'.format(rx))
+    infeeders.index = infeeders.index.astype(str)
+    return infeeders
+
+
+class ShortCircuit():
+    """
+    Short-circuit currents of all buses.
+
+    The networks are set up in per unit (base power 1 MVA and v_nom of the
+    buses). The infeeders are modelled as impedances Zq = c / Sk'' with the
+    given R/X-ratio at their buses, the lines with their series impedances;
+    shunt capacitances and loads are neglected (IEC 60909).
+    Buses of sub-networks without infeeder get nan.
+
+    Parameters
+    ----------
+    buses: pd.DataFrame
+        buses with the column v_nom in kV
+    lines: pd.DataFrame
+        lines with the columns bus0, bus1, r and x in Ohm and optionally r0
+        and x0 in Ohm (zero sequence); without them no single-phase fault
+        currents are calculated
+    infeeders: pd.DataFrame
+        infeeders with the columns bus, sk (Sk'' in MVA) and rx (R/X-ratio)
+    c: float, default 1.1
+        voltage factor (1.1 for maximum, 0.95 for minimum currents in LV)
+    z0_ratio: float, default 1.
+        ratio of the zero to the positive sequence impedance of the infeeders
+    """
+
+    def __init__(self, buses, lines, infeeders, c=1.1, z0_ratio=1.):
+        self.buses = buses.index
+        self.lines = lines.index
+        self.c = c
+        self.v_nom = buses['v_nom'].astype(float).values
+        self.incidence = incidence_matrix(self.buses, lines)
+        v2 = self.v_nom[self.buses.get_indexer(lines['bus0'])]**2
+
+        # infeeder impedances in p.u.:
+        bus = self.buses.get_indexer(infeeders['bus'])
+        if (bus < 0).any():
+            print('WARNING: {} infeeders are not connected to a known bus '
+                  'and are neglected.'.format((bus < 0).sum()))
+        infeeders = infeeders[bus >= 0]
+        bus = bus[bus >= 0]
+        rx = infeeders['rx'].astype(float).values
+        x_q = c / infeeders['sk'].astype(float).values / np.sqrt(1. + rx**2)
+        z_q = x_q * (rx + 1j)
+        y_q = np.bincount(bus, weights=(1. / z_q).real,
+                          minlength=len(self.buses)) + \
+            1j * np.bincount(bus, weights=(1. / z_q).imag,
+                             minlength=len(self.buses))
+
+        # only sub-networks with an infeeder can be calculated:
+        adjacency = abs(self.incidence.T) @ abs(self.incidence)
+        ncomp, labels = connected_components(adjacency, directed=False)
+        supplied = np.zeros(ncomp, dtype=bool)
+        supplied[labels[bus]] = True
+        self.calc = np.flatnonzero(supplied[labels])
+        self.unsupplied = self.buses[~supplied[labels]]
+        if len(self.calc) == 0:
+            raise ValueError('No bus is connected to an infeeder. Check, '
+                             'that the buses of the infeeders (slack '
+                             'generators) are in buses.')
+        if len(self.unsupplied) > 0:
+            print('{} buses are not connected to an infeeder'.format(
+                    len(self.unsupplied)))
+
+        z = (lines['r'].astype(float).values +
+             1j * lines['x'].astype(float).values) / v2
+        self.ybus = self._ybus(z, y_q)
+        self._lu = splu(self.ybus[self.calc][:, self.calc].tocsc())
+        if 'r0' in lines.columns and 'x0' in lines.columns:
+            z0 = (lines['r0'].astype(float).values +
+                  1j * lines['x0'].astype(float).values) / v2
+            self.ybus0 = self._ybus(z0, y_q / z0_ratio)
+            self._lu0 = splu(self.ybus0[self.calc][:, self.calc].tocsc())
+        else:
+            self.ybus0 = None
+            self._lu0 = None
+
+    def _ybus(self, z, y_shunt):
+        return (self.incidence.T @ sp.diags(1. / z) @ self.incidence +
+                sp.diags(y_shunt)).tocsc()
+
+    @classmethod
+    def from_importer(cls, importer, sk=250., rx=0.1, c=1.1, z0_ratio=1.):
+        """
+        Creates the calculation from the dataframes converted by an
+        ImporterXMLSincal. The zero sequence impedances of the lines are
+        taken from Line.xml (r0 and x0 per km times l); lines not found there
+        (e.g. merged by reducenetwork) get the positive sequence values.
+        The slack generators are used as infeeders (at the nodes of their
+        terminals, see ptdf.slack_buses); their Sk'' and R/X-ratio
+        are read from Infeeder.xml (see read_infeeders), if available, else
+        the given defaults are used.
+
+        Parameters
+        ----------
+        importer: ImporterXMLSincal
+        sk: float, default 250.
+            default short-circuit power of the infeeders in MVA
+        rx: float, default 0.1
+            default R/X-ratio of the infeeders
+        c: float, default 1.1
+        z0_ratio: float, default 1.
+        """
+        lines = importer.lines[['bus0', 'bus1', 'r', 'x']].copy()
+        line_xml = importer.xmls['line'].reindex(lines.index)
+        for seq in ['r0', 'x0']:
+            if seq in line_xml.columns:
+                lines[seq] = (line_xml['l'].astype(float) *
+                              line_xml[seq].astype(float))
+            else:
+                lines[seq] = np.nan
+        missing = lines['r0'].isna() | lines['x0'].isna()
+        if missing.any():
+            print('{} lines without zero sequence data get the positive '
+                  'sequence values'.format(missing.sum()))
+            lines.loc[missing, 'r0'] = lines.loc[missing, 'r']
+            lines.loc[missing, 'x0'] = lines.loc[missing, 'x']
+
+        infeeders = slack_buses(importer).to_frame('bus')
+        infeeders['sk'] = sk
+        infeeders['rx'] = rx
+        data = read_infeeders(importer)
+        if data is not None:
+            data = data.reindex(infeeders.index)
+            infeeders['sk'] = data['sk'].fillna(sk)
+            if 'rx' in data.columns:
+                infeeders['rx'] = data['rx'].fillna(rx)
+        return cls(importer.buses, lines, infeeders, c=c, z0_ratio=z0_ratio)
+
+    def _diagonal(self, lu, block):
+        # diagonal of the inverse of the reduced matrix, solved for blocks of
+        # unit vectors:
+        n = len(self.calc)
+        diag = np.empty(n, dtype=complex)
+        for start in range(0, n, block):
+            cols = np.arange(start, min(start + block, n))
+            rhs = np.zeros((n, len(cols)), dtype=complex)
+            rhs[cols, np.arange(len(cols))] = 1.
+            diag[cols] = lu.solve(rhs)[cols, np.arange(len(cols))]
+        return diag
+
+    def impedances(self, block=500):
+        """
+        Calculates the Thevenin impedances of all buses.
+
+        Parameters
+        ----------
+        block: int, default 500
+            number of buses solved at once; limits the memory used
+            (block x buses complex values)
+
+        Returns
+        -------
+        impedances: pd.DataFrame
+            buses with the columns z1 and z0 (complex, in Ohm)
+        """
+        z1 = np.full(len(self.buses), np.nan, dtype=complex)
+        z0 = z1.copy()
+        v2 = self.v_nom[self.calc]**2
+        z1[self.calc] = self._diagonal(self._lu, block) * v2
+        if self._lu0 is not None:
+            z0[self.calc] = self._diagonal(self._lu0, block) * v2
+        return pd.DataFrame({'z1': z1, 'z0': z0}, index=self.buses)
+
+    def calculate(self, block=500):
+        """
+        Calculates the short-circuit currents of all buses.
+
+        Parameters
+        ----------
+        block: int, default 500
+            see impedances
+
+        Returns
+        -------
+        results: pd.DataFrame
+            buses with the columns
+            - ik3: initial three-phase short-circuit current Ik'' in kA
+            - ip: peak short-circuit current in kA (method B)
+            - sk3: three-phase short-circuit power in MVA
+            - ik1: single-phase (line to earth) current in kA
+            - r_x: R/X-ratio of the Thevenin impedance
+        """
+        z = self.impedances(block=block)
+        v_nom = self.v_nom
+        z1 = z['z1'].values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ik3 = self.c * v_nom / (math.sqrt(3) * np.abs(z1))
+            r_x = z1.real / z1.imag
+            kappa = 1.02 + 0.98 * np.exp(-3. * r_x)
+            ik1 = (math.sqrt(3) * self.c * v_nom /
+                   np.abs(2. * z1 + z['z0'].values))
+        results = pd.DataFrame({'ik3': ik3,
+                                'ip': kappa * math.sqrt(2) * ik3,
+                                'sk3': math.sqrt(3) * v_nom * ik3,
+                                'ik1': ik1,
+                                'r_x': r_x},
+                               index=self.buses)
+        print('short-circuit currents of {} buses calculated'.format(
+                len(self.calc)))
+        return results
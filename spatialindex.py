@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018-2019 Christian Brosig (TH Köln)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This module provides a spatial index (KD-tree) over the coordinates of the
+nodes of imported networks, e.g. to match stations to lines, profiles to buses
+or to select regions without scanning all nodes.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex():
+    """
+    KD-tree over planar coordinates (e.g. UTM in m).
+
+    Parameters
+    ----------
+    x: array-like
+        x-coordinates (easting)
+    y: array-like
+        y-coordinates (northing)
+    names: pd.Index
+        names of the nodes
+    """
+
+    def __init__(self, x, y, names):
+        self.names = pd.Index(names)
+        self.coords = np.column_stack([np.asarray(x, dtype=float),
+                                       np.asarray(y, dtype=float)])
+        self.key = self.coordinatekey(x, y, names)
+        self.tree = cKDTree(self.coords)
+
+    @staticmethod
+    def coordinatekey(x, y, names):
+        """
+        Returns a hash of the coordinates, to check if a cached index is
+        still valid.
+        """
+        parts = [pd.util.hash_pandas_object(pd.Series(names)).values,
+                 np.asarray(x, dtype=float).tobytes(),
+                 np.asarray(y, dtype=float).tobytes()]
+        return hash(b''.join(bytes(part) for part in parts))
+
+    @classmethod
+    def from_frame(cls, frame, x='x', y='y'):
+        """
+        Creates the index from the columns x and y of a dataframe.
+        """
+        return cls(frame[x].astype(float).values,
+                   frame[y].astype(float).values,
+                   frame.index)
+
+    def nearest(self, x, y, k=1, max_distance=np.inf):
+        """
+        Finds the nearest nodes of one or more points.
+
+        Parameters
+        ----------
+        x, y: float or array-like
+            coordinates of the points
+        k: int, default 1
+            number of neighbours
+        max_distance: float, default inf
+            nodes further away are not returned
+
+        Returns
+        -------
+        nearest: pd.DataFrame
+            one row per point and neighbour with the columns point (position
+            of the point), node and distance; points without a node within
+            max_distance are left out
+        """
+        points = np.column_stack([np.atleast_1d(x), np.atleast_1d(y)])
+        distance, pos = self.tree.query(points, k=k,
+                                        distance_upper_bound=max_distance)
+        distance = distance.reshape(len(points), -1)
+        pos = pos.reshape(len(points), -1)
+        point = np.repeat(np.arange(len(points)), pos.shape[1])
+        distance = distance.ravel()
+        pos = pos.ravel()
+        found = pos < len(self.names)
+        return pd.DataFrame({'point': point[found],
+                             'node': self.names[pos[found]],
+                             'distance': distance[found]})
+
+    def radius(self, x, y, r):
+        """
+        Returns the names of all nodes within the distance r of the point
+        (x, y).
+        """
+        pos = np.sort(self.tree.query_ball_point([x, y], r)).astype(int)
+        return self.names[pos]
+
+    def bbox(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the names of all nodes within the bounding box.
+        """
+        center = [(xmin + xmax) / 2., (ymin + ymax) / 2.]
+        half = max(xmax - xmin, ymax - ymin) / 2.
+        # square with the larger side of the box (maximum norm), then the
+        # exact box:
+        pos = np.sort(self.tree.query_ball_point(center, half, p=np.inf))
+        pos = pos.astype(int)
+        coords = self.coords[pos]
+        inside = ((coords[:, 0] >= xmin) & (coords[:, 0] <= xmax) &
+                  (coords[:, 1] >= ymin) & (coords[:, 1] <= ymax))
+        return self.names[pos[inside]]
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the import of many export folders.
+"""
+
+import os
+import pickle
+
+from batch_import import batch_import
+from conftest import write_export
+
+
+def test_batch_import(tmp_path):
+    write_export(str(tmp_path / 'exports' / 'feeder_a'))
+    write_export(str(tmp_path / 'exports' / 'feeder_b'))
+    # a folder without xml-files fails without stopping the others:
+    os.makedirs(str(tmp_path / 'exports' / 'feeder_c'))
+    output = str(tmp_path / 'networks')
+    summary = batch_import([str(tmp_path / 'exports' / 'feeder_*')],
+                           output, processes=2)
+    assert list(summary.index) == ['feeder_a', 'feeder_b', 'feeder_c']
+    assert list(summary['status']) == ['ok', 'ok', 'failed']
+    assert 'FileNotFoundError' in summary.loc['feeder_c', 'error']
+    assert os.path.exists(os.path.join(output, 'summary.csv'))
+    with open(os.path.join(output, 'feeder_a.p'), 'rb') as file:
+        network = pickle.load(file)
+    assert list(network.lines.index) == ['L1', 'L2', 'L3']
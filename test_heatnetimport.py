@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of DHimport, which need TESPy and the components of dhs_comps.
+"""
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('tespy')
+pytest.importorskip('dhs_comps')
+
+from heatnetimport_ver01 import DHimport, infeeder, pipe, sc  # noqa: E402
+
+
+def smallnetwork():
+    """
+    Infeeder at N0, a loop of four pipes (N0-N1-N2-N3-N0) and consumers at
+    N1 and N2.
+    """
+    terminals = [('i', 'N0', '1', 'FlowInfeederH'),
+                 ('p1', 'N0', '1', 'FlowLine'), ('p1', 'N1', '2', 'FlowLine'),
+                 ('p2', 'N1', '1', 'FlowLine'), ('p2', 'N2', '2', 'FlowLine'),
+                 ('p3', 'N0', '1', 'FlowLine'), ('p3', 'N3', '2', 'FlowLine'),
+                 ('p4', 'N2', '1', 'FlowLine'), ('p4', 'N3', '2', 'FlowLine'),
+                 ('c1', 'N1', '1', 'FlowConsumer'),
+                 ('c2', 'N2', '1', 'FlowConsumer')]
+    index = pd.Index([t[0] for t in terminals], name='Element_ID')
+    elements = pd.DataFrame({'Type': [t[3] for t in terminals]}, index=index)
+    elements = elements[~elements.index.duplicated()]
+    nodes = ['N0', 'N1', 'N2', 'N3']
+    dhi = DHimport('test', 'test')
+    dhi.xmls = {
+        'flowTerminal': pd.DataFrame({'Node_ID': [t[1] for t in terminals],
+                                      'TerminalNo': [t[2] for t in terminals]},
+                                     index=index),
+        'flowElement': elements,
+        'flowLine': pd.DataFrame({'SandRoughness': '0.1',
+                                  'LineLength': '100',
+                                  'Diameter': '80',
+                                  'HeatingCond': '0.3'},
+                                 index=['p1', 'p2', 'p3', 'p4']),
+        'flowConsumer': pd.DataFrame({'Power': ['0.4', '0.1'], 'T': '50'},
+                                     index=['c1', 'c2']),
+        'flowPressureReg': pd.DataFrame(columns=['pInlet', 'pOutlet']),
+        'flowInfeeder': pd.DataFrame(index=['i']),
+        'flowHSNodeResult': pd.DataFrame({'Circuit': '1', 'pDiff': '1'},
+                                         index=nodes)}
+    return dhi
+
+
+def test_seed_tespy():
+    dhi = smallnetwork()
+    components = {'infeedi': infeeder('infeedi')}
+    for par in dhi.pipe_parameters().itertuples():
+        label = 'pipe' + str(par.Index)
+        components[label] = pipe(label=label, ks_pb=par.ks, L_pb=par.L,
+                                 D_pb=par.D, ks_pf=par.ks, L_pf=par.L,
+                                 D_pf=par.D, kA_pb=par.kA, kA_pf=par.kA,
+                                 Tamb=0, design_pf=['kA'], design_pb=['kA'])
+    for i in dhi.xmls['flowConsumer'].index:
+        components['con' + i] = sc('con' + i)
+    dhi.forks, dhi.conns = dhi.build_junctions(components)
+    dhi.presolve()
+
+    seeded = dhi.seed_tespy()
+    assert seeded > 0
+    # at most three elements per node, so there are no connections between
+    # forks and all connections get starting values:
+    assert seeded == len(dhi.conns)
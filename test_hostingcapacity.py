@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the hosting capacity from linear sensitivities.
+"""
+
+import numpy as np
+
+from hostingcapacity import HostingCapacity
+
+
+def test_line_limit_without_load(feeder):
+    importer = feeder(nbuses=6)
+    capacity = HostingCapacity(importer, v_min=0., v_max=2.,
+                               loading=0.5).capacity()
+    # all power flows through the lines towards the slack:
+    assert np.allclose(capacity['capacity'], 0.1)
+    assert (capacity['limit'] == 'line').all()
+
+
+def test_line_limit_with_load(feeder):
+    importer = feeder(nbuses=6)
+    snapshots = importer.snapshots.index
+    capacity = HostingCapacity(importer, v_min=0.,
+                               v_max=2.).capacity(snapshots=snapshots)
+    # feed-in at the end of the feeder: the last line carries the feed-in
+    # minus the load of bus 5, the snapshot with the least load is binding
+    load = importer.loads_p_set['l5'].min()
+    assert np.isclose(capacity.loc['5', 'line_capacity'], 0.2 + load)
+    assert capacity.loc['5', 'binding'] == '5'
+
+
+def test_max_elements(feeder):
+    importer = feeder(nbuses=10, mesh=True)
+    snapshots = importer.snapshots.index
+    engine = HostingCapacity(importer)
+    for mode in ['feedin', 'load']:
+        full = engine.capacity(snapshots=snapshots, mode=mode)
+        capped = engine.capacity(snapshots=snapshots, mode=mode,
+                                 max_elements=50)
+        assert full.equals(capped)
+
+
+def test_confirm_near_limit(feeder, capsys):
+    importer = feeder(nbuses=6)
+    importer.importnetwork()
+    engine = HostingCapacity(importer, v_min=0., v_max=2.)
+    snapshots = importer.snapshots.index
+    capacity = engine.capacity(snapshots=snapshots, confirm=True, margin=0.)
+    # only the candidate with the smallest capacity is calculated:
+    confirmed = capacity['pf_loading'].notna()
+    assert list(capacity.index[confirmed]) == [capacity['capacity'].idxmin()]
+    assert 'confirming 1 of 5 candidates' in capsys.readouterr().out
+    # the linear capacity loads the binding line to about 100 %:
+    assert np.isclose(capacity.loc[confirmed, 'pf_loading'].iloc[0], 1.,
+                      atol=0.05)
+    level = capacity['capacity'].max()
+    capacity, _ = engine.capacity(snapshots=snapshots, confirm=True,
+                                  margin=0., levels=[level])
+    assert capacity['pf_loading'].notna().sum() == 2
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the hydraulic pre-solver.
+"""
+
+import numpy as np
+import pandas as pd
+
+from hydraulics import HydraulicSolver
+
+
+def pipes(rows):
+    return pd.DataFrame([row[1:] for row in rows],
+                        index=[row[0] for row in rows],
+                        columns=['bus0', 'bus1', 'L', 'D', 'ks'])
+
+
+def test_meshed_network():
+    # supply at S, a loop A-B-C and a pipe to the unsupplied nodes X-Y
+    network = pipes([('p1', 'S', 'A', 200., 0.1, 1e-4),
+                     ('p2', 'A', 'B', 150., 0.08, 1e-4),
+                     ('p3', 'B', 'C', 100., 0.08, 1e-4),
+                     ('p4', 'A', 'C', 300., 0.065, 1e-4),
+                     ('p5', 'X', 'Y', 100., 0.05, 1e-4)])
+    nodes = ['S', 'A', 'B', 'C', 'X', 'Y']
+    solver = HydraulicSolver(nodes, network, ['S'])
+    demand = pd.Series({'B': 2., 'C': 3.})
+    results = solver.solve(demand, p_supply=10.)
+    m, p = results['m'], results['p']
+
+    # mass balance of all nodes and the pressure drop of all pipes:
+    assert np.isclose(m['p1'], 5.)
+    assert np.isclose(m['p2'] - m['p3'], 2.)
+    assert np.isclose(m['p3'] + m['p4'], 3.)
+    supplied = ['p1', 'p2', 'p3', 'p4']
+    dp, _ = solver.pressuredrop(m[supplied].values, np.arange(4))
+    drop = (p[network.loc[supplied, 'bus0']].values -
+            p[network.loc[supplied, 'bus1']].values) * 1e5
+    assert np.allclose(drop, dp, rtol=1e-6)
+    assert p['S'] == 10.
+    assert p[['X', 'Y']].isna().all() and np.isnan(m['p5'])
+
+
+def test_pressuredrop_continuous():
+    solver = HydraulicSolver(['S', 'A'], pipes([('p', 'S', 'A', 100., 0.1,
+                                                 1e-4)]), ['S'])
+    # around the change from laminar to turbulent friction:
+    m = np.linspace(0.05, 1., 2000)
+    dp = np.array([solver.pressuredrop(np.array([flow]))[0][0]
+                   for flow in m])
+    assert (np.diff(dp) > 0).all()
+    assert np.abs(np.diff(dp)).max() < 10 * np.abs(np.diff(dp)).mean()
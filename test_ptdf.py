@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the linear power flow with PTDFs and of the contingency screening.
+"""
+
+import numpy as np
+import pandas as pd
+
+from contingency import ContingencyScreening
+
+
+def test_flows_match_lpf(feeder):
+    importer = feeder(nbuses=10, mesh=True)
+    importer.importnetwork()
+    importer.network.lpf()
+    expected = importer.network.lines_t.p0
+    for method in ['ptdf', 'factor']:
+        flows = importer.ptdf_flows(method=method)
+        assert np.allclose(flows[expected.columns].values, expected.values)
+
+
+def test_ptdf_is_cached(feeder):
+    importer = feeder()
+    engine = importer.ptdf()
+    assert importer.ptdf() is engine
+    importer.lines.loc['3', 'x'] *= 2.
+    assert importer.ptdf() is not engine
+
+
+def test_screening_matches_n_1(feeder):
+    importer = feeder(nbuses=10, mesh=True)
+    importer.lines['s_nom'] = 0.04
+    flows = importer.ptdf_flows()
+    screening = ContingencyScreening.from_importer(importer)
+    violations = screening.screen(flows, max_elements=500)
+    found = set(zip(violations['snapshot'], violations['outage'],
+                    violations['line']))
+
+    # base case and brute force: remove each line and run the lpf again
+    expected = set()
+    s_nom = importer.lines['s_nom']
+    for outage in [''] + list(screening.outages):
+        if outage in screening.islanding:
+            continue
+        case = feeder(nbuses=10, mesh=True)
+        case.lines['s_nom'] = 0.04
+        case.lines = case.lines.drop(outage, errors='ignore')
+        post = case.ptdf_flows()
+        over = post.abs() > s_nom[post.columns]
+        snapshot, line = np.nonzero(over.values)
+        expected |= set(zip(post.index[snapshot], [outage] * len(line),
+                            post.columns[line]))
+    assert len(expected) > 0
+    assert found == expected
+
+
+def test_screening_without_outages(feeder):
+    importer = feeder()
+    importer.lines['s_nom'] = 0.04
+    flows = importer.ptdf_flows()
+    screening = ContingencyScreening.from_importer(importer, outages=[])
+    violations = screening.screen(flows)
+    assert len(violations) > 0
+    assert (violations['outage'] == '').all()
+    assert isinstance(violations['snapshot'].iloc[0], pd.Timestamp)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the backward/forward sweep against the power flow of PyPSA.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ptdf import load_injections
+
+
+def compare(results, network):
+    for attr in ['v_mag_pu', 'v_ang']:
+        expected = network.buses_t[attr]
+        assert np.allclose(results[attr][expected.columns].values,
+                           expected.values, atol=1e-6)
+    for attr in ['p0', 'q0', 'p1', 'q1']:
+        expected = network.lines_t[attr]
+        assert np.allclose(results[attr][expected.columns].values,
+                           expected.values, atol=1e-6)
+
+
+def test_sweep_matches_pf(feeder):
+    importer = feeder(nbuses=12)
+    # a branch with reversed orientation:
+    importer.lines.loc['7', ['bus0', 'bus1']] = ['7', '3']
+    importer.importnetwork()
+    importer.network.pf()
+    results = importer.run_sweep(fallback=False)
+    compare(results, importer.network)
+    assert results['converged'].all()
+
+
+def test_not_converged(feeder, capsys):
+    importer = feeder(nbuses=12)
+    importer.loads_p_set *= 5.
+    importer.run_sweep()
+    sweep = importer._sweep
+    p = load_injections(sweep.buses, importer.loads, importer.loads_p_set)
+    results = sweep.solve(p, max_iter=2)
+    assert not results['converged'].any()
+    assert 'did not converge' in capsys.readouterr().out
+
+
+def test_meshed_fallback(feeder):
+    importer = feeder(nbuses=8, mesh=True)
+    importer.importnetwork()
+    importer.network.pf()
+    results = importer.run_sweep(fallback=False)
+    assert results['v_mag_pu'].isna().all().all()
+    results = importer.run_sweep()
+    compare(results, importer.network)
+    assert results['converged'].all()
+
+
+def test_meshed_fallback_new_snapshots(feeder):
+    importer = feeder(nbuses=8, mesh=True)
+    importer.importnetwork()
+    importer.run_sweep(fallback=False)
+    sweep = importer._sweep
+    p = load_injections(sweep.buses, importer.loads,
+                        importer.loads_p_set.iloc[:2])
+    p.index = pd.date_range('2030-01-01', periods=2, freq='h')
+    results = sweep.solve(p, v_slack=1.02, network=importer.network)
+    assert np.allclose(results['v_mag_pu']['0'], 1.02)
+    assert results['v_mag_pu'].notna().all().all()
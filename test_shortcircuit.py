@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the short-circuit calculation on an Infeeder-fed export.
+"""
+
+import math
+import os
+
+import numpy as np
+
+from ptdf import PTDF, slack_buses
+from shortcircuit import ShortCircuit, read_infeeders
+
+
+def converted(export):
+    export.import_xml()
+    export.dfstocomponents()
+    return export
+
+
+def test_slack_buses_of_infeeders(export):
+    importer = converted(export)
+    # the converter connects the infeeder to 'b'+Node_ID:
+    assert importer.generators.loc['I1', 'bus'] == 'b1'
+    assert list(slack_buses(importer)) == ['1']
+    assert list(PTDF.from_importer(importer).slack) == ['1']
+
+
+def test_shortcircuit_infeeder(export):
+    importer = converted(export)
+    results = ShortCircuit.from_importer(importer).calculate()
+    # Sk'' and R/X of Infeeder.xml:
+    assert np.isclose(results.loc['1', 'sk3'], 100.)
+    assert np.isclose(results.loc['1', 'r_x'], 0.2)
+    # infeeder and three lines of 0.1 km (0.2 + 0.08j Ohm/km):
+    z_q = 1.1 * 0.4**2 / 100. * (0.2 + 1j) / math.sqrt(1.04)
+    z = z_q + 3 * 0.1 * (0.2 + 0.08j)
+    assert np.isclose(results.loc['4', 'ik3'],
+                      1.1 * 0.4 / (math.sqrt(3) * abs(z)))
+    # node 5 is separated by an open breaker:
+    assert np.isnan(results.loc['5', 'ik3'])
+
+
+def test_read_infeeders_without_file(export):
+    os.remove(os.path.join(export.base_path, 'Infeeder.xml'))
+    assert read_infeeders(export) is None
+    importer = converted(export)
+    results = ShortCircuit.from_importer(importer, sk=250.).calculate()
+    assert np.isclose(results.loc['1', 'sk3'], 250.)
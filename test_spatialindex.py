@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the KD-tree over node coordinates.
+"""
+
+import numpy as np
+
+from spatialindex import SpatialIndex
+
+
+def test_nearest():
+    index = SpatialIndex([0., 1., 2.], [0., 0., 0.], ['a', 'b', 'c'])
+    nearest = index.nearest([0.1, 1.9], [0., 0.], max_distance=0.5)
+    assert list(nearest['node']) == ['a', 'c']
+    assert np.allclose(nearest['distance'], [0.1, 0.1])
+    assert index.nearest(10., 10., max_distance=1.).empty
+
+
+def test_radius():
+    index = SpatialIndex([0., 1., 2.], [0., 0., 0.], ['a', 'b', 'c'])
+    assert list(index.radius(0.9, 0., 1.)) == ['a', 'b']
+    assert list(index.radius(0., 0., 0.5)) == ['a']
+
+
+def test_radius_empty():
+    index = SpatialIndex([0., 1., 2.], [0., 0., 0.], ['a', 'b', 'c'])
+    assert len(index.radius(100., 100., 1.)) == 0
+
+
+def test_bbox():
+    index = SpatialIndex([0., 1., 2.], [0., 1., 0.], ['a', 'b', 'c'])
+    assert list(index.bbox(-1., -1., 1.5, 0.5)) == ['a']
+    assert len(index.bbox(5., 5., 6., 6.)) == 0
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the ImporterXMLSincal: import of an xml-export, cache, reduction of
+the network and time series calculations.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from xml_to_pypsa import ImporterXMLSincal
+
+
+def reducible(feeder):
+    """
+    Feeder with loads only at the buses 3, 6 and 9, a spur s1-s2 at bus 7
+    and a dummy line from bus 5 to bus d, which is connected to bus 8.
+    """
+    importer = feeder(nbuses=10)
+    loads = ['l3', 'l6', 'l9']
+    importer.loads = importer.loads.loc[loads]
+    importer.loads_p_set = importer.loads_p_set[loads]
+    for bus in ['d', 's1', 's2']:
+        importer.buses.loc[bus] = [0.4, 0., 0., 'AC']
+    importer.lines.loc['ld'] = ['d', '5', 1e-7, 1e-7, 0., 0.2]
+    importer.lines.loc['ls1'] = ['7', 's1', 0.05, 0.02, 0., 0.2]
+    importer.lines.loc['ls2'] = ['s2', 's1', 0.05, 0.02, 0., 0.2]
+    importer.lines.loc['x5'] = ['d', '8', 0.1, 0.03, 0., 0.2]
+    importer.lines.loc['4', ['bus0', 'bus1']] = ['4', '3']
+    return importer
+
+
+def test_reduced_lpf(feeder):
+    full = reducible(feeder)
+    full.importnetwork()
+    full.network.lpf()
+    reduced = reducible(feeder)
+    reduced.reducenetwork()
+    assert len(reduced.buses) < len(full.buses)
+    reduced.importnetwork()
+    reduced.network.lpf()
+    v_ang, p0 = reduced.expand_results(reduced.network.buses_t.v_ang,
+                                       reduced.network.lines_t.p0,
+                                       weight='x')
+    expected = full.network.buses_t.v_ang
+    assert np.allclose(v_ang[expected.columns].values, expected.values,
+                       atol=1e-6)
+    dummies = reduced.reduction_lines.index[
+            reduced.reduction_lines['kind'] == 'dummy']
+    expected = full.network.lines_t.p0.drop(columns=dummies)
+    assert np.allclose(p0[expected.columns].values, expected.values,
+                       atol=1e-6)
+
+
+def test_scoped_import(export):
+    export.import_xml(start=['3'], stop=['2'])
+    assert sorted(export.xmls['node'].index) == ['2', '3', '4']
+    assert sorted(export.xmls['element'].index) == ['D1', 'L2', 'L3']
+    export.import_xml(bbox=(350050, 5649000, 350450, 5651000))
+    assert sorted(export.xmls['node'].index) == ['2', '3', '4', '5']
+
+
+def test_network_cache(export, tmp_path, capsys):
+    cachedir = str(tmp_path / 'cache')
+    path = os.path.dirname(export.base_path)
+    export.build_network(cachedir=cachedir)
+    importer = ImporterXMLSincal('grid', 'grid', path=path)
+    importer.build_network(cachedir=cachedir)
+    assert 'loaded network from cache' in capsys.readouterr().out
+    assert importer.lines.equals(export.lines)
+    assert list(importer.network.lines.index) == ['L1', 'L2', 'L3']
+    # other parameters are not taken from the cache:
+    importer = ImporterXMLSincal('grid', 'grid', path=path)
+    importer.build_network(cachedir=cachedir, with_breaker=False)
+    assert 'loaded network from cache' not in capsys.readouterr().out
+    assert 'L4' in importer.network.lines.index
+
+
+def test_run_pf_chunked(feeder, tmp_path):
+    importer = feeder(nsnaps=30)
+    importer.importnetwork()
+    importer.network.lpf()
+    expected = importer.network.lines_t.p0
+    importer.importnetwork()
+    p_set = importer.network.loads_t.p_set.copy()
+    files = importer.run_pf_chunked(window=8, directory=str(tmp_path))
+    flows = pd.read_csv(files[('lines_t', 'p0')], index_col=0,
+                        parse_dates=True)
+    assert np.allclose(flows[expected.columns].values, expected.values)
+    # the network keeps all snapshots and its series:
+    assert len(importer.network.snapshots) == 30
+    assert importer.network.loads_t.p_set.equals(p_set)
+
+
+def test_memmap_profiles(feeder, tmp_path):
+    reference = feeder(nsnaps=30)
+    reference.importnetwork()
+    reference.network.lpf()
+    flows = reference.network.lines_t.p0
+    importer = feeder(nsnaps=30)
+    expected = importer.loads_p_set
+    filename = str(tmp_path / 'loads.csv')
+    # the csv holds the buses and kW:
+    profiles = expected.rename(columns=lambda name: name[1:]) * 1000.
+    profiles.insert(0, 'Time', expected.index.strftime('%Y/%m/%d %H:%M'))
+    profiles.to_csv(filename, sep=';', index=False)
+    del importer.loads_p_set
+    importer.importloadswithprofiles(filename, ltype='', chunksize=7,
+                                     memmap=str(tmp_path / 'loads.dat'))
+    p_set = importer.loads_p_set
+    base = p_set.values
+    while not isinstance(base, np.memmap) and base.base is not None:
+        base = base.base
+    assert isinstance(base, np.memmap)
+    assert np.allclose(p_set[expected.columns].values, expected.values)
+    # the series are only read for the windows:
+    importer.importnetwork(lazy_profiles=True)
+    files = importer.run_pf_chunked(window=8, directory=str(tmp_path))
+    result = pd.read_csv(files[('lines_t', 'p0')], index_col=0,
+                         parse_dates=True)
+    assert np.allclose(result[flows.columns].values, flows.values)
+
+
+def write_profiles(filename, times, columns):
+    values = np.arange(1., len(times) + 1.)
+    frame = pd.DataFrame({column: values * (i + 1)
+                          for i, column in enumerate(columns)})
+    frame.insert(0, 'Time', times)
+    frame.to_csv(filename, sep=';', index=False)
+
+
+def test_profile_library(feeder, tmp_path, capsys):
+    importer = feeder(nbuses=4, nsnaps=8)
+    # l1 keeps its measured series:
+    importer.loads_p_set = importer.loads_p_set[['l1']]
+    filename = str(tmp_path / 'library.csv')
+    times = pd.date_range('2019-01-01', periods=8, freq='15min')
+    write_profiles(filename, times.strftime('%Y/%m/%d %H:%M'), ['H0', 'G0'])
+    importer.importprofilelibrary(filename)
+    importer.assignprofiles('H0')
+    assert sorted(importer.loads_profile.index) == ['l2', 'l3']
+    importer.assignprofiles({'l3': 'G0'})
+    assert list(importer.loads_profile['profile']) == ['H0', 'G0']
+
+    importer.importnetwork()
+    p_set = importer.network.loads_t.p_set
+    assert sorted(p_set.columns) == ['l1', 'l2', 'l3']
+    # 1 MWh per MWh of annual energy over the horizon of 2 hours:
+    assert np.isclose(p_set['l3'].sum() * 0.25, 0.01)
+    assert p_set['l1'].equals(importer.loads_p_set['l1'])
+
+    importer.importnetwork(lazy_profiles=True)
+    assert 'not imported' in capsys.readouterr().out
+    assert importer.network.loads_t.p_set.empty
+
+
+def test_replacetime(tmp_path):
+    importer = ImporterXMLSincal('profiles', 'profiles')
+    filename = str(tmp_path / 'library.csv')
+    # the hour 02:00 is doubled at the end of the summer time:
+    times = ['2019/10/27 00:00', '2019/10/27 01:00', '2019/10/27 02:00',
+             '2019/10/27 02:00', '2019/10/27 03:00', '2019/10/27 04:00']
+    write_profiles(filename, times, ['H0'])
+    importer.importprofilelibrary(filename, replacetime=True)
+    index = importer.profile_library.index
+    assert index.is_unique and len(index) == 6
+    assert index[-1] == pd.Timestamp('2019-10-27 05:00')
@@ -22,13 +22,61 @@ network.
 """
 
 import os
+import hashlib
 import pandas as pd
 import numpy as np
 import math
 import pypsa
 import networkx as nx
+import scipy.sparse as sp
 import pickle
+import multiprocessing
 from xmlimport import XMLimport
+from ptdf import PTDF, load_injections, incidence_matrix, slack_buses
+from radialsweep import BackwardForwardSweep
+from spatialindex import SpatialIndex
+
+# network structure of a worker process, see run_pf_parallel
+_worker_network = None
+
+
+def _init_pfworker(network):
+    """
+    Stores the network structure once per worker process.
+    """
+    global _worker_network
+    _worker_network = network
+
+
+def _run_pfbatch(batch):
+    """
+    Runs the power flow of one batch of snapshots in a worker process and
+    returns the requested result frames.
+    """
+    snapshots, p_set, pf, outputs = batch
+    network = _worker_network
+    network.set_snapshots(snapshots)
+    if not p_set.empty:
+        network.import_series_from_dataframe(p_set, 'Load', 'p_set')
+    getattr(network, pf)()
+    return {output: getattr(network, output[0])[output[1]].copy()
+            for output in outputs}
+
+
+def _run_subnetwork(job):
+    """
+    Runs the power flow of one sub-network in a worker process. Errors are
+    returned instead of raised, so that one failing island does not abort
+    the other ones.
+    """
+    subnet, network, pf, outputs = job
+    try:
+        getattr(network, pf)()
+    except Exception as error:
+        return subnet, None, '{}: {}'.format(type(error).__name__, error)
+    results = {output: getattr(network, output[0])[output[1]].copy()
+               for output in outputs}
+    return subnet, results, None
 
 
 class ImporterXMLSincal():
@@ -88,16 +136,265 @@ class ImporterXMLSincal():
                                                                 self.foldername)
 
     # %%
-    def import_xml(self):
+    def import_xml(self, bbox=None, start=None, station=None, stop=None):
+        """
+        Imports the xml-files of list_file to self.xmls.
+        Optionally only a part of the network is imported: the nodes within
+        a bounding box or the nodes reached from start nodes or stations
+        (see _scopefilters). Only the nodes, terminals, elements, lines,
+        loads, breakers and eco-stations of this part are read.
+
+        Parameters
+        ----------
+        :bbox (tuple): default: None
+            (xmin, ymin, xmax, ymax) in the coordinates of GraphicNode
+        :start (list): default: None
+            Node_IDs to start the search from
+        :station (list): default: None
+            EcoStation_IDs; their nodes are used as start nodes
+        :stop (list): default: None
+            Node_IDs where the search ends (included, but not passed)
+        """
         xml = XMLimport(self.name,
                         foldername=self.foldername,
                         list_file=self.list_file,
                         path=self.base_path)
-        xml.xmltodfs()
+        filters = None
+        if bbox is not None or start is not None or station is not None:
+            filters = self._scopefilters(xml, bbox=bbox, start=start,
+                                         station=station, stop=stop)
+        xml.xmltodfs(filters=filters)
         self.xmls = xml.xmls
 
+    @staticmethod
+    def _expand(terminals, start, stop):
+        # breadth-first search over the incidence of nodes and elements
+        nodes = pd.Index(terminals['Node_ID'].unique()).union(pd.Index(start))
+        elements = pd.Index(terminals['Element_ID'].unique())
+        incidence = sp.csr_matrix(
+                (np.ones(len(terminals)),
+                 (nodes.get_indexer(terminals['Node_ID']),
+                  elements.get_indexer(terminals['Element_ID']))),
+                shape=(len(nodes), len(elements)))
+        adjacency = (incidence @ incidence.T).tocsr()
+        visited = np.zeros(len(nodes), dtype=bool)
+        stopped = nodes.isin(stop)
+        frontier = nodes.get_indexer(start)
+        visited[frontier] = True
+        expand = frontier
+        while len(expand) > 0:
+            neighbours = np.unique(adjacency[expand].indices)
+            frontier = neighbours[~visited[neighbours]]
+            visited[frontier] = True
+            expand = frontier[~stopped[frontier]]
+        return nodes[visited]
+
+    def _scopefilters(self, xml, bbox=None, start=None, station=None,
+                      stop=None):
+        """
+        Finds the nodes, terminals, elements and eco-stations of a part of
+        the network by reading only the id-columns of the files and returns
+        the filters for XMLimport.xmltodfs.
+        With bbox, all nodes within the box are taken. Else, the nodes are
+        searched breadth-first from the start nodes (and the nodes of the
+        stations) over the terminals; open breakers are not passed.
+        In both cases only elements with all terminals in the part are kept.
+        """
+        terminals = xml.read_columns('terminal',
+                                     ['Terminal_ID', 'Node_ID', 'Element_ID'])
+        nodetable = xml.read_columns('node', ['Node_ID', 'EcoStation_ID'])
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            graphic = xml.read_columns('graphicNode',
+                                       ['Node_ID', 'NodeStartX', 'NodeStartY'])
+            x = graphic['NodeStartX'].astype(float)
+            y = graphic['NodeStartY'].astype(float)
+            inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+            nodes = pd.Index(graphic.loc[inside, 'Node_ID'])
+        else:
+            start = [] if start is None else [str(node) for node in start]
+            if station is not None:
+                station = [str(st) for st in station]
+                at_station = nodetable['EcoStation_ID'].isin(station)
+                start += list(nodetable.loc[at_station, 'Node_ID'])
+            stop = [] if stop is None else [str(node) for node in stop]
+            breakers = xml.read_columns('breaker',
+                                        ['Terminal_ID', 'Flag_State'])
+            opened = breakers.loc[breakers['Flag_State'] == '0', 'Terminal_ID']
+            closed = terminals[~terminals['Terminal_ID'].isin(opened)]
+            nodes = self._expand(closed, start, stop)
+
+        complete = terminals['Node_ID'].isin(nodes).groupby(
+                terminals['Element_ID']).all()
+        elements = complete.index[complete]
+        terms = terminals.loc[terminals['Element_ID'].isin(elements),
+                              'Terminal_ID']
+        stations = nodetable.loc[nodetable['Node_ID'].isin(nodes),
+                                 'EcoStation_ID']
+        print('scope: {} nodes, {} elements'.format(len(nodes),
+                                                    len(elements)))
+        filters = {'node': ['Node_ID', nodes],
+                   'graphicNode': ['Node_ID', nodes],
+                   'terminal': ['Terminal_ID', terms],
+                   'element': ['Element_ID', elements],
+                   'line': ['Element_ID', elements],
+                   'load': ['Element_ID', elements],
+                   'breaker': ['Terminal_ID', terms],
+                   'ecoStation': ['EcoStation_ID', stations.dropna()]}
+        return {name: filters[name] for name in filters
+                if name in self.list_file}
+
+    # %%
+    def fingerprint(self, **params):
+        """
+        Returns a fingerprint of the xml-files of the network and the given
+        parameters, see XMLimport.fingerprint.
+        """
+        xml = XMLimport(self.name,
+                        foldername=self.foldername,
+                        list_file=self.list_file,
+                        path=self.base_path)
+        return xml.fingerprint(extra=params)
+
+    # attributes stored in the cache besides the network (if available):
+    _cache_attrs = ['xmls', 'buses', 'lines', 'generators', 'loads',
+                    'net_voltage', 'line_del', 'snapshots', 'loads_p_set',
+                    'profile_library', 'loads_profile', 'reduction_buses',
+                    'reduction_lines']
+
+    def _profilekey(self):
+        """
+        Returns a hash of the load profiles imported so far (snapshots,
+        loads_p_set, profile library and assigned profiles), which are part
+        of the network as well.
+        """
+        sha = hashlib.sha1()
+        for attr in ['snapshots', 'loads_p_set', 'profile_library',
+                     'loads_profile']:
+            if hasattr(self, attr):
+                data = getattr(self, attr)
+                sha.update(attr.encode())
+                sha.update(pd.util.hash_pandas_object(data).values.tobytes())
+                if isinstance(data, pd.DataFrame):
+                    sha.update(pd.util.hash_pandas_object(
+                            pd.Series(data.columns)).values.tobytes())
+        return sha.hexdigest()
+
+    def _cachefile(self, cachedir, params):
+        params = dict(params, profiles=self._profilekey())
+        return '{}/{}_{}.p'.format(cachedir,
+                                   self.name,
+                                   self.fingerprint(**params))
+
+    def save_network_cache(self, cachedir, **params):
+        """
+        Stores self.network with the converted dataframes (buses, lines,
+        generators, loads, xmls), the snapshots and load series and the
+        mapping of reducenetwork (if available) in cachedir, so that all
+        functions work on a loaded network as on a built one. The file is
+        keyed by the fingerprint of the xml-files, the load profiles (see
+        _profilekey) and the given parameters.
+
+        Parameters
+        ----------
+        :cachedir (str):
+            directory of the cache
+        :params:
+            parameters used to build the network
+        """
+        if not os.path.exists(cachedir):
+            os.makedirs(cachedir)
+        cache = {'network': self.network}
+        for attr in self._cache_attrs:
+            if hasattr(self, attr):
+                cache[attr] = getattr(self, attr)
+        with open(self._cachefile(cachedir, params), 'wb') as file:
+            pickle.dump(cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_network_cache(self, cachedir, **params):
+        """
+        Loads self.network and the converted dataframes from cachedir, if
+        they were stored with the same xml-files, load profiles and
+        parameters (see save_network_cache).
+
+        Returns
+        -------
+        found: boolean
+            True, if the network was loaded from the cache
+        """
+        filename = self._cachefile(cachedir, params)
+        if not os.path.exists(filename):
+            return False
+        with open(filename, 'rb') as file:
+            cache = pickle.load(file)
+        for attr in cache:
+            setattr(self, attr, cache[attr])
+        print('loaded network from cache {}'.format(filename))
+        return True
+
+    def build_network(self,
+                      cachedir=None,
+                      set_net_voltage='0',
+                      with_breaker=True,
+                      repair=True,
+                      dummyparameters=False,
+                      reduce=False,
+                      scope=None):
+        """
+        Runs the whole import: import_xml, linecheck and repairlines,
+        dfstocomponents, optionally dummyparameters_tozerolines and
+        reducenetwork, and importnetwork.
+        If cachedir is given, the final network is stored there and the whole
+        import is skipped on the next run, as long as the xml-files, the
+        load profiles imported before and the parameters did not change.
+
+        Parameters
+        ----------
+        :cachedir (str): default: None
+            directory of the cache; if None, no cache is used
+        :set_net_voltage (str): default: '0'
+            see dfstocomponents
+        :with_breaker (bool): default: True
+            see dfstocomponents
+        :repair (bool): default: True
+            repair lines, that connect more than two nodes
+        :dummyparameters (bool): default: False
+            set dummy parameters to lines without r, x or b
+        :reduce (bool): default: False
+            reduce the network before the import to pypsa
+        :scope (dict): default: None
+            keyword arguments of import_xml to import only a part of the
+            network, e.g. {'bbox': (xmin, ymin, xmax, ymax)} or
+            {'station': ['12']}
+        """
+        params = {'set_net_voltage': set_net_voltage,
+                  'with_breaker': with_breaker,
+                  'repair': repair,
+                  'dummyparameters': dummyparameters,
+                  'reduce': reduce,
+                  'scope': scope}
+        if cachedir is not None and self.load_network_cache(cachedir,
+                                                            **params):
+            return
+
+        self.import_xml(**(scope or {}))
+        if repair is True:
+            brokenlines = self.linecheck()
+            if brokenlines is not None:
+                self.repairlines(brokenlines)
+        self.dfstocomponents(set_net_voltage=set_net_voltage,
+                             with_breaker=with_breaker)
+        if dummyparameters is True:
+            self.dummyparameters_tozerolines()
+        if reduce is True:
+            self.reducenetwork()
+        self.importnetwork()
+
+        if cachedir is not None:
+            self.save_network_cache(cachedir, **params)
+
     # %%
-    def export_xml_topickles(self, directory):
+    def export_xml_topickles(self, directory, confirm=True):
         """
         Exports the dataframes to the indicated directory.
 
@@ -105,6 +402,9 @@ class ImporterXMLSincal():
         ----------
         :directory (str):
             name of directory to export pickle to
+        :confirm (bool): default: True
+            if the directory already exists, wait for a confirmation before
+            overwriting. Set it to False for non-interactive use.
         :self.list_file (dict):
 
         +++
@@ -116,7 +416,8 @@ class ImporterXMLSincal():
             os.makedirs(directory)
         else:
             print('path already exists - files might get overwritten!')
-            input("PRESS ENTER TO CONTINUE. TO ABORT PRESS CTRL+C!")
+            if confirm is True:
+                input("PRESS ENTER TO CONTINUE. TO ABORT PRESS CTRL+C!")
 
         for name in self.list_file:
             filename = directory+'/'+str(name)+'.p'
@@ -526,6 +827,224 @@ class ImporterXMLSincal():
             self.loads.index = self.loads['name']
             self.loads = self.loads.drop(columns='name')
 
+    def reducenetwork(self,
+                      z_dummy=0.001,
+                      merge_dummies=True,
+                      drop_spurs=True,
+                      merge_series=True):
+        """
+        Reduces the converted dataframes (see dfstocomponents) before they are
+        imported into pypsa. Buses with loads or generators are never
+        removed. Three steps are performed:
+            - dummy lines (e.g. from repairlines or dummyparameters) with an
+              impedance below z_dummy are merged into one bus.
+            - dangling spurs, that end in buses without load or generator,
+              are dropped.
+            - series lines meeting at buses with two lines and without load
+              or generator are merged into one equivalent line.
+        All removed buses and lines are stored in removal order in
+        self.reduction_buses and self.reduction_lines, so that results can be
+        expanded back onto the original elements with expand_results.
+
+        Parameters
+        ----------
+        :z_dummy (float): default: 0.001
+            lines with an impedance sqrt(r²+x²) up to this value in Ohm are
+            treated as dummy lines
+        :merge_dummies (bool): default: True
+        :drop_spurs (bool): default: True
+        :merge_series (bool): default: True
+        """
+        columns = self.lines.columns
+        lines = self.lines.to_dict('index')
+        protected = set(self.generators['bus'])
+        if hasattr(self, 'loads'):
+            protected |= set(self.loads['bus'])
+
+        removed_buses = []  # (bus, kind, bus0, bus1, weight, weight_x)
+        removed_lines = []  # (line, kind, line, sign)
+        bus_names = list(self.buses.index)
+        nbuses = len(bus_names)
+        nlines = len(lines)
+
+        # adjacency of buses and lines:
+        adjacent = {bus: set() for bus in bus_names}
+        for name, line in lines.items():
+            adjacent[line['bus0']].add(name)
+            adjacent[line['bus1']].add(name)
+
+        def remove_line(name):
+            line = lines.pop(name)
+            adjacent[line['bus0']].discard(name)
+            adjacent[line['bus1']].discard(name)
+            return line
+
+        def impedance(line):
+            return math.hypot(line['r'], line['x'])
+
+        if merge_dummies is True:
+            dummies = [name for name, line in lines.items()
+                       if impedance(line) <= z_dummy]
+            # all buses connected by dummy lines are merged into the first
+            # one of them (union find):
+            parent = {}
+
+            def find(bus):
+                while parent.get(bus, bus) != bus:
+                    bus = parent[bus]
+                return bus
+
+            for name in dummies:
+                root0 = find(lines[name]['bus0'])
+                root1 = find(lines[name]['bus1'])
+                if root0 != root1:
+                    # keep protected buses as representative
+                    if root1 in protected and root0 not in protected:
+                        root0, root1 = root1, root0
+                    parent[root1] = root0
+                remove_line(name)
+                removed_lines += [(name, 'dummy', None, 0)]
+
+            for bus in list(parent):
+                root = find(bus)
+                if root == bus:
+                    continue
+                for name in list(adjacent[bus]):
+                    line = lines[name]
+                    for end in ['bus0', 'bus1']:
+                        if line[end] == bus:
+                            line[end] = root
+                    adjacent[root].add(name)
+                    if line['bus0'] == line['bus1']:
+                        remove_line(name)
+                        removed_lines += [(name, 'dummy', None, 0)]
+                del adjacent[bus]
+                removed_buses += [(bus, 'dummy', root, root, 0., 0.)]
+
+        if drop_spurs is True:
+            leaves = [bus for bus in adjacent
+                      if len(adjacent[bus]) == 1 and bus not in protected]
+            while leaves:
+                bus = leaves.pop()
+                if bus not in adjacent or len(adjacent[bus]) != 1:
+                    continue
+                name = next(iter(adjacent[bus]))
+                line = remove_line(name)
+                other = line['bus1'] if line['bus0'] == bus else line['bus0']
+                del adjacent[bus]
+                removed_buses += [(bus, 'spur', other, other, 0., 0.)]
+                removed_lines += [(name, 'spur', None, 0)]
+                if len(adjacent[other]) == 1 and other not in protected:
+                    leaves += [other]
+
+        if merge_series is True:
+            for bus in list(adjacent):
+                if bus in protected or len(adjacent[bus]) != 2:
+                    continue
+                name_a, name_b = sorted(adjacent[bus])
+                line_a, line_b = lines[name_a], lines[name_b]
+                other_a = line_a['bus1'] if line_a['bus0'] == bus else line_a['bus0']
+                other_b = line_b['bus1'] if line_b['bus0'] == bus else line_b['bus0']
+                if other_a == other_b:
+                    # parallel lines, merging would create a loop
+                    continue
+                remove_line(name_b)
+                # the equivalent line keeps name and direction of line a:
+                z_a, z_b = impedance(line_a), impedance(line_b)
+                z = z_a + z_b if z_a + z_b > 0 else 1.
+                x = line_a['x'] + line_b['x']
+                x = x if x != 0 else 1.
+                if line_a['bus1'] == bus:
+                    line_a['bus1'] = other_b
+                    sign = 1 if line_b['bus0'] == bus else -1
+                    weight = z_a / z
+                    weight_x = line_a['x'] / x
+                else:
+                    line_a['bus0'] = other_b
+                    sign = 1 if line_b['bus1'] == bus else -1
+                    weight = z_b / z
+                    weight_x = line_b['x'] / x
+                for attr in ['r', 'x', 'b']:
+                    line_a[attr] = line_a[attr] + line_b[attr]
+                line_a['s_nom'] = min(line_a['s_nom'], line_b['s_nom'])
+                adjacent[bus].discard(name_a)
+                adjacent[other_b].add(name_a)
+                del adjacent[bus]
+                removed_buses += [(bus, 'series', line_a['bus0'],
+                                   line_a['bus1'], weight, weight_x)]
+                removed_lines += [(name_b, 'series', name_a, sign)]
+
+        self.reduction_buses = pd.DataFrame(
+                removed_buses, columns=['name', 'kind', 'bus0', 'bus1',
+                                        'weight', 'weight_x']
+                ).set_index('name')
+        self.reduction_lines = pd.DataFrame(
+                removed_lines, columns=['name', 'kind', 'line',
+                                        'sign']).set_index('name')
+
+        self.buses = self.buses.loc[list(adjacent)]
+        self.lines = pd.DataFrame.from_dict(lines, orient='index',
+                                            columns=columns)
+        self.lines.index.name = 'name'
+        merged = self.reduction_buses[self.reduction_buses['kind'] == 'dummy']
+        self.generators['bus'] = self.generators['bus'].replace(merged['bus0'])
+        if hasattr(self, 'loads'):
+            self.loads['bus'] = self.loads['bus'].replace(merged['bus0'])
+
+        print('reduced network from {} to {} buses and from {} to {} '
+              'lines'.format(nbuses, len(self.buses), nlines, len(self.lines)))
+        print(self.reduction_buses['kind'].value_counts().to_string())
+
+    def expand_results(self, bus_results=None, line_results=None, weight='z'):
+        """
+        Expands results of a reduced network (see reducenetwork) back onto
+        the original buses and lines.
+            - merged buses get the values of their representative bus.
+            - buses of dropped spurs get the values of the bus, the spur was
+              connected to.
+            - buses between series lines are interpolated linearly by the
+              reactance (weight='x') or the impedance magnitude (weight='z')
+              of the lines. With 'x' this is exact for voltage angles of a
+              linear power flow; 'z' is an approximation for voltage
+              magnitudes.
+            - series lines get the flow of their equivalent line, spur lines
+              a flow of zero. The flow on dummy lines is unknown (nan).
+
+        Parameters
+        ----------
+        :bus_results (pd.DataFrame): default: None
+            snapshots x buses, e.g. network.buses_t.v_ang
+        :line_results (pd.DataFrame): default: None
+            snapshots x lines, e.g. network.lines_t.p0
+        :weight (str): default: 'z'
+            'x' for voltage angles, 'z' for voltage magnitudes
+
+        Returns
+        -------
+        bus_results, line_results: pd.DataFrame
+            the expanded results (None, if not given)
+        """
+        if bus_results is not None:
+            bus_results = bus_results.copy()
+            # buses are expanded in reverse order of removal, so that the
+            # buses they refer to are already known:
+            column = 'weight_x' if weight == 'x' else 'weight'
+            for bus, red in self.reduction_buses[::-1].iterrows():
+                res0 = bus_results[red['bus0']]
+                res1 = bus_results[red['bus1']]
+                bus_results[bus] = res0 + red[column] * (res1 - res0)
+
+        if line_results is not None:
+            line_results = line_results.copy()
+            for line, red in self.reduction_lines[::-1].iterrows():
+                if red['kind'] == 'series':
+                    line_results[line] = red['sign'] * line_results[red['line']]
+                elif red['kind'] == 'spur':
+                    line_results[line] = 0.
+                else:
+                    line_results[line] = np.nan
+        return bus_results, line_results
+
     def transform_gen_toTKN(self):
         """
             In low-voltage grids, isolation boxes may be mistaken for
@@ -797,11 +1316,109 @@ class ImporterXMLSincal():
                                          r=r,
                                          x=x)
 
+    def spatial_index(self):
+        """
+        Returns a KD-tree over the bus coordinates (see
+        spatialindex.SpatialIndex), e.g. to find the nearest bus of a
+        station or profile. The latitude and longitude of the buses (columns
+        x and y) are transformed back to UTM (zone 32) in m. The index is
+        cached and only built again, if the coordinates changed.
+        """
+        buses = self.buses if hasattr(self, 'buses') else self.network.buses
+        lat = buses['x'].astype(float).values
+        long = buses['y'].astype(float).values
+        key = SpatialIndex.coordinatekey(lat, long, buses.index)
+        if getattr(self, '_spatial', None) is None or self._spatial_key != key:
+            try:
+                import utm
+            except ImportError:
+                raise ImportError('<no module named utm found>')
+            easting, northing, _, _ = utm.from_latlon(lat, long,
+                                                      force_zone_number=32)
+            self._spatial = SpatialIndex(easting, northing, buses.index)
+            self._spatial_key = key
+        return self._spatial
+
+    def _readprofiles(self,
+                      filename,
+                      dtype='float64',
+                      chunksize=None,
+                      timeformat='%Y/%m/%d %H:%M',
+                      decimal='.',
+                      factor=1.,
+                      memmap=None):
+        """
+        Reads a profile csv with a Time column and one column per profile
+        into a dataframe with a datetimeindex. All values are multiplied by
+        factor and stored as dtype; with chunksize the file is converted
+        chunk by chunk. With memmap the converted chunks are written to this
+        file and the dataframe is a memory map of it.
+        """
+        # read the header first, to set the dtype of all profile columns
+        # directly in the parser instead of converting afterwards:
+        header = pd.read_csv(filename, sep=';', nrows=0).columns
+        dtypes = {column: dtype for column in header if column != 'Time'}
+        dtypes['Time'] = str
+
+        def convert(chunk):
+            # to correctly import date and time, a fixed format is used:
+            chunk.index = pd.to_datetime(chunk['Time'], format=timeformat)
+            chunk = chunk.drop(columns='Time')
+            return chunk * np.dtype(dtype).type(factor)
+
+        reader = pd.read_csv(filename,
+                             sep=';',
+                             dtype=dtypes,
+                             decimal=decimal,
+                             chunksize=chunksize)
+        if chunksize is None:
+            profiles = convert(reader)
+        elif memmap is None:
+            profiles = pd.concat([convert(chunk) for chunk in reader])
+        else:
+            # the rows of the chunks are appended to the file, so that a
+            # window of snapshots is one contiguous block on disk:
+            index = []
+            with open(memmap, 'wb') as file:
+                for chunk in reader:
+                    chunk = convert(chunk)
+                    index += [chunk.index]
+                    file.write(np.ascontiguousarray(chunk.values,
+                                                    dtype=dtype).tobytes())
+            columns = header.drop('Time')
+            if not index:
+                return pd.DataFrame(columns=columns, dtype=dtype,
+                                    index=pd.DatetimeIndex([], name='Time'))
+            index = index[0].append(index[1:])
+            values = np.memmap(memmap, dtype=dtype, mode='r+',
+                               shape=(len(index), len(columns)))
+            profiles = pd.DataFrame(values, index=index, columns=columns,
+                                    copy=False)
+        profiles.index.name = 'Time'
+        return profiles
+
+    @staticmethod
+    def _regularindex(index):
+        """
+        Returns a regular datetimeindex with the same start and length as
+        index. The time step is the most frequent step of index, so that
+        duplicated or missing hours of the change between summer and winter
+        time are replaced.
+        """
+        step = index.to_series().diff().mode()[0]
+        return pd.date_range(start=index[0], periods=len(index), freq=step,
+                             name=index.name)
+
     def importloadswithprofiles(self,
                                 filename,
                                 ltype='rh0',
                                 feedin=False,
-                                replacetime=False):
+                                replacetime=False,
+                                dtype='float64',
+                                chunksize=None,
+                                timeformat='%Y/%m/%d %H:%M',
+                                decimal='.',
+                                memmap=None):
         """
         This function imports loadprofiles and transforms them into a pypsa
         readable dataframe.
@@ -822,87 +1439,232 @@ class ImporterXMLSincal():
         :replacetime (bool):
             if there should be a problem with summer and winter time, this can
             be set to replace the datetimeindex
+        :dtype (str): default: 'float64'
+            dtype of the stored profiles. 'float32' halves the memory of
+            loads_p_set, which matters for long series on many buses.
+        :chunksize (int): default: None
+            if given, the csv is read in chunks of this many rows. Each chunk
+            is converted to dtype before the next one is read, so only one
+            chunk is held by the parser at a time. Without memmap the chunks
+            are joined into loads_p_set in memory.
+        :timeformat (str): default: '%Y/%m/%d %H:%M'
+            fixed format of the Time column
+        :decimal (str): default: '.'
+            decimal separator of the csv; set to ',' for german exports
+        :memmap (str): default: None
+            file, to which the chunks are written (needs chunksize). The
+            series of the loads are a memory map of this file, so files
+            larger than memory can be imported: only the snapshots of a
+            window are read by run_pf_chunked, run_pf_parallel, run_sweep or
+            ptdf_flows (with importnetwork(lazy_profiles=True)). Joining them
+            with load series imported before loads them into memory.
 
         +++
         TODO: - implement an option to include unique identifiers in the csv
-              - change lambda and use a def instead...
         +++
         """
-        # to correctly import date and time, this function is defined:
-        dateparse = lambda x: pd.datetime.strptime(x, '%Y/%m/%d %H:%M')
-        loaddat = pd.read_csv(filename,
-                              sep=';',
-                              parse_dates=['Time'],
-                              date_parser=dateparse)
-        loaddat.index = loaddat['Time']
-        loaddat = loaddat.drop(columns='Time')
+        # kW to MW and the sign of feedins are applied while reading:
+        loaddat = self._readprofiles(filename,
+                                     dtype=dtype,
+                                     chunksize=chunksize,
+                                     timeformat=timeformat,
+                                     decimal=decimal,
+                                     factor=-0.001 if feedin is True else 0.001,
+                                     memmap=memmap)
 
         # PyPSA has problems with summer and winter time. If necessary, they
         # can be replaced here:
         if replacetime is True:
-            start_time = loaddat.index[0]
-            end_time = loaddat.index[-1]
-            f = '15min'
-            dti = pd.date_range(start=start_time,
-                                end=end_time,
-                                freq=f)
-            loaddat.index = dti
-
-        # convert kW to MW
-        loaddat = loaddat/1000
-
-        # if it is a feedin, this is converted here:
-        if feedin is True:
-            loaddat = loaddat*(-1)
+            loaddat.index = self._regularindex(loaddat.index)
 
         if not hasattr(self, 'loads'):
             print('no loads until now. Implementing.')
             self.loads = pd.DataFrame(columns=['bus', 'p_set'])
             self.loads.index.name = 'name'
 
-        i = 0
-        for node in loaddat.columns:
-            new_node = node
-            if '.' in node:
-#                new_node = node[0:len(node)-3]  # clean it from any float-numbers
-                print('WARNING: the load on bus {} may not be recognized!'.format(node),
-                      'Please clean it from any float-numbers.',
-                      'If a . is part of the name, ignore this warning.')
-            name = 'l'+new_node+ltype
-
-            if feedin is True:
-                p_set = loaddat[node].min()
-            else:
-                p_set = loaddat[node].max()
-            load = {'bus': new_node,
-                    'p_set': p_set}
-            self.loads.loc[name] = load
-            i += 1
+        nodes = loaddat.columns
+        floatnodes = [node for node in nodes if '.' in node]
+        if floatnodes:
+            print('WARNING: the loads on buses {} may not be recognized!'.format(floatnodes),
+                  'Please clean them from any float-numbers.',
+                  'If a . is part of the name, ignore this warning.')
+        names = ['l' + node + ltype for node in nodes]
+        loaddat.columns = names
+
+        # create all loads at once:
+        if feedin is True:
+            p_set = loaddat.min()
+        else:
+            p_set = loaddat.max()
+        loads = pd.DataFrame({'bus': nodes,
+                              'p_set': p_set.astype(float).values},
+                             index=names)
+        loads.index.name = self.loads.index.name
+        self.loads = pd.concat([self.loads.drop(index=names, errors='ignore'),
+                                loads])
 
         if not hasattr(self, 'snapshots'):
             print('no loadprofile until now. Implementing.')
-            column = loaddat.columns[0]
-            self.snapshots = loaddat[column].copy()
-            self.snapshots.name = 'weighting'
-            self.snapshots[:] = 1
+            self.snapshots = pd.Series(1.0,
+                                       index=loaddat.index,
+                                       name='weighting')
 
         if not hasattr(self, 'loads_p_set'):
-            self.loads_p_set = loaddat.copy()
-            for column in self.loads_p_set.columns:
-                self.loads_p_set = self.loads_p_set.rename(columns={column: 'l'+column+ltype})
+            self.loads_p_set = loaddat
+        else:
+            self.loads_p_set = pd.concat(
+                    [self.loads_p_set.drop(columns=names, errors='ignore'),
+                     loaddat.reindex(self.loads_p_set.index)],
+                    axis=1)
+
+    def importprofilelibrary(self,
+                             filename,
+                             dtype='float32',
+                             timeformat='%Y/%m/%d %H:%M',
+                             decimal='.',
+                             replacetime=False):
+        """
+        Imports a library of standard load profiles (e.g. H0, G0, L0), that
+        are shared by many loads. Each profile is normalized to an energy of
+        1 MWh over the imported horizon, so that a load is fully described by
+        the name of its profile and its annual energy (see assignprofiles).
+
+        Parameters
+        ----------
+        :filename (str):
+            name of the profile file to be imported
+            this file should be a .csv with rows:
+                Time;H0;G0;...
+                YYYY/MM/DD HH:MM;1.3;2.1;...
+            the unit of the values does not matter, as they get normalized
+        :dtype (str): default: 'float32'
+            dtype of the stored profiles
+        :timeformat (str): default: '%Y/%m/%d %H:%M'
+            fixed format of the Time column
+        :decimal (str): default: '.'
+            decimal separator of the csv
+        :replacetime (bool):
+            if there should be a problem with summer and winter time, this can
+            be set to replace the datetimeindex
+        """
+        library = self._readprofiles(filename,
+                                     dtype=dtype,
+                                     timeformat=timeformat,
+                                     decimal=decimal)
+        if replacetime is True:
+            library.index = self._regularindex(library.index)
+
+        # duration of one snapshot in hours:
+        hours = library.index.to_series().diff().median() / pd.Timedelta('1h')
+        energy = library.sum() * hours
+        self.profile_library = library / energy.astype(dtype)
+
+        if not hasattr(self, 'snapshots'):
+            print('no loadprofile until now. Implementing.')
+            self.snapshots = pd.Series(1.0,
+                                       index=library.index,
+                                       name='weighting')
+
+    def assignprofiles(self, profiles='H0', scale=None):
+        """
+        Assigns a profile of the profile library to the loads. Instead of a
+        dense column for every load only the name of the profile and a scale
+        factor are stored in self.loads_profile. The dense p_set is built by
+        profile_p_set, when it is needed. Loads with a measured series in
+        loads_p_set (see importloadswithprofiles) keep it.
+
+        Parameters
+        ----------
+        :profiles (str, dict or pd.Series): default: 'H0'
+            name of the profile for all loads without series or profile, or a
+            mapping of load names to profile names (replaces their profile).
+            Loads without a profile keep their static p_set.
+        :scale (pd.Series): default: None
+            annual energy in MWh per load. If not given, the p_set of
+            dfstocomponents is used, which holds Eap from Load.xml in MWh.
+        """
+        if not hasattr(self, 'profile_library'):
+            raise AttributeError('no profile library found! '
+                                 'Run importprofilelibrary first.')
+
+        measured = pd.Index([])
+        if hasattr(self, 'loads_p_set'):
+            measured = self.loads_p_set.columns
+        profiled = pd.Index([])
+        if hasattr(self, 'loads_profile'):
+            profiled = self.loads_profile.index
+
+        if isinstance(profiles, str):
+            names = self.loads.index.difference(measured.union(profiled),
+                                                sort=False)
+            profiles = pd.Series(profiles, index=names)
         else:
-            loads_p_set_local = loaddat.copy()
-            for column in loads_p_set_local.columns:
-                new_columnname = 'l'+column+ltype
-                loads_p_set_local = loads_p_set_local.rename(columns={column: new_columnname})
-                self.loads_p_set[new_columnname] = loads_p_set_local[new_columnname]
+            profiles = pd.Series(profiles).reindex(self.loads.index).dropna()
+            skipped = profiles.index.intersection(measured)
+            if len(skipped) > 0:
+                print('WARNING: the loads {} have a measured series and keep '
+                      'it.'.format(list(skipped)))
+                profiles = profiles.drop(skipped)
+
+        unknown = set(profiles.unique()) - set(self.profile_library.columns)
+        if unknown:
+            raise KeyError('profiles {} are not part of the profile '
+                           'library'.format(sorted(unknown)))
+
+        if scale is None:
+            scale = self.loads['p_set']
+        scale = pd.Series(scale).reindex(profiles.index).astype(float)
+
+        assigned = pd.DataFrame({'profile': profiles, 'scale': scale})
+        if hasattr(self, 'loads_profile'):
+            assigned = pd.concat([self.loads_profile.drop(
+                    index=assigned.index, errors='ignore'), assigned])
+        self.loads_profile = assigned
+        print('assigned {} loads to {} profiles'.format(
+                len(profiles), profiles.nunique()))
+
+    def profile_p_set(self, snapshots=None):
+        """
+        Builds the dense p_set of all loads with an assigned profile for the
+        given snapshots, e.g. for one chunk of a time series calculation.
+
+        Parameters
+        ----------
+        :snapshots (pd.Index): default: None
+            snapshots to build the p_set for; if None, all snapshots of the
+            profile library are used.
 
-    def importnetwork(self):
+        Returns
+        -------
+        p_set: pd.DataFrame
+            snapshots x loads in MW
+        """
+        library = self.profile_library
+        if snapshots is not None:
+            library = library.loc[snapshots]
+        codes = library.columns.get_indexer(self.loads_profile['profile'])
+        scale = self.loads_profile['scale'].values.astype(library.values.dtype)
+        return pd.DataFrame(library.values[:, codes] * scale,
+                            index=library.index,
+                            columns=self.loads_profile.index)
+
+    def importnetwork(self, lazy_profiles=False):
         """
         This function imports the converted dataframes into pypsa, checks the
         network for consistency and prints out, if not connected subgraphs are
         present.
 
+        Parameters
+        ----------
+        :lazy_profiles (bool): default: False
+            if loads are assigned to the profile library (see assignprofiles),
+            their dense p_set is built for all snapshots here. Set it to True
+            to skip this for long horizons; run_pf_chunked, run_pf_parallel
+            and run_sweep build it for chunks of snapshots, while the network
+            itself only holds the static p_set of these loads. The series of
+            loads_p_set are skipped as well, so that a memory mapped
+            loads_p_set (see importloadswithprofiles) is only read in chunks.
+
         +++
         TODO:
         - check if the dataframes are available. (partly done)
@@ -935,13 +1697,401 @@ class ImporterXMLSincal():
             print('implementing snapshots')
             self.network.set_snapshots(self.snapshots.index)
 
-        if hasattr(self, 'loads_p_set'):
-            print('implementing load series')
-            self.network.import_series_from_dataframe(self.loads_p_set,
-                                                      'Load',
-                                                      'p_set')
+        if lazy_profiles is False:
+            if hasattr(self, 'loads_p_set'):
+                print('implementing load series')
+                self.network.import_series_from_dataframe(self.loads_p_set,
+                                                          'Load',
+                                                          'p_set')
+            if hasattr(self, 'loads_profile'):
+                print('implementing load series from profile library')
+                self.network.import_series_from_dataframe(
+                        self.profile_p_set(self.network.snapshots),
+                        'Load', 'p_set')
+        elif hasattr(self, 'loads_p_set') or hasattr(self, 'loads_profile'):
+            print('WARNING: the load series are not imported; use '
+                  'run_pf_chunked, run_pf_parallel or run_sweep, or import '
+                  'the network with lazy_profiles=False.')
         self.network.consistency_check()
 
+    def _window_p_set(self, snapshots):
+        """
+        Returns the p_set of all loads with a time series for the given
+        snapshots, taken from loads_p_set and/or the profile library.
+        """
+        p_set = []
+        if hasattr(self, 'loads_p_set'):
+            p_set += [self.loads_p_set.loc[snapshots]]
+        if hasattr(self, 'loads_profile'):
+            p_set += [self.profile_p_set(snapshots)]
+        if not p_set:
+            return pd.DataFrame(index=snapshots)
+        return pd.concat(p_set, axis=1)
+
+    def _set_window(self, snapshots):
+        """
+        Reduces the snapshots of the network to the given window and sets the
+        load series for it. All time dependent results of the network are
+        reallocated for the window only.
+        """
+        self.network.set_snapshots(snapshots)
+        p_set = self._window_p_set(snapshots)
+        if not p_set.empty:
+            self.network.import_series_from_dataframe(p_set, 'Load', 'p_set')
+
+    def _save_series(self):
+        """
+        Returns the snapshots, snapshot weightings and time series of all
+        components of the network, to restore them after a calculation in
+        windows (see _restore_series).
+        """
+        network = self.network
+        series = {}
+        for component in network.all_components:
+            # set_snapshots changes the index of empty frames in place:
+            series[component] = {attr: frame.copy() if frame.empty else frame
+                                 for attr, frame in
+                                 network.pnl(component).items()}
+        return (network.snapshots, network.snapshot_weightings.copy(),
+                series)
+
+    def _restore_series(self, saved):
+        """
+        Restores the snapshots and time series of _save_series.
+        """
+        snapshots, weightings, series = saved
+        network = self.network
+        network.set_snapshots(snapshots)
+        network.snapshot_weightings = weightings
+        for component, frames in series.items():
+            pnl = network.pnl(component)
+            for attr, frame in frames.items():
+                pnl[attr] = frame
+
+    def run_pf_chunked(self,
+                       window=96,
+                       directory='results',
+                       pf='lpf',
+                       outputs=None):
+        """
+        Runs a (linear) power flow over all snapshots in windows of a fixed
+        size. The results of each window are appended to csv-files in
+        directory and released before the next window is calculated, so the
+        peak memory depends on the window size, not on the horizon.
+        Afterwards (also if a window fails) the snapshots and time series of
+        the network are restored; the results are only kept in the files.
+
+        Parameters
+        ----------
+        :window (int): default: 96
+            number of snapshots calculated at once (96 = one day in 15 min)
+        :directory (str): default: 'results'
+            directory the results are written to; one file per output, named
+            component-attribute.csv (e.g. buses_t-v_ang.csv)
+        :pf (str): default: 'lpf'
+            'lpf' for a linear, 'pf' for a non-linear power flow
+        :outputs (list): default: None
+            list of tuples (component, attribute) to be stored, e.g.
+            [('buses_t', 'v_ang'), ('lines_t', 'p0')]. If None, voltage
+            angles and active line flows are stored (and voltage magnitudes
+            and reactive line flows for pf).
+
+        Returns
+        -------
+        files: dict
+            the written filenames for each output
+        """
+        if outputs is None:
+            outputs = [('buses_t', 'v_ang'), ('lines_t', 'p0')]
+            if pf == 'pf':
+                outputs += [('buses_t', 'v_mag_pu'), ('lines_t', 'q0')]
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        files = {output: directory + '/' + '-'.join(output) + '.csv'
+                 for output in outputs}
+
+        snapshots = self.snapshots.index
+        nwindows = int(math.ceil(len(snapshots) / window))
+        saved = self._save_series()
+        try:
+            for num, start in enumerate(range(0, len(snapshots), window)):
+                self._set_window(snapshots[start:start+window])
+                getattr(self.network, pf)()
+                for output in outputs:
+                    component, attr = output
+                    results = getattr(self.network, component)[attr]
+                    results.to_csv(files[output],
+                                   mode='w' if num == 0 else 'a',
+                                   header=num == 0)
+                print('calculated window {} of {}'.format(num+1, nwindows))
+        finally:
+            self._restore_series(saved)
+        return files
+
+    def run_pf_parallel(self,
+                        processes=None,
+                        batch_size=None,
+                        pf='lpf',
+                        outputs=None,
+                        directory=None):
+        """
+        Runs a (linear) power flow over all snapshots in parallel. The
+        snapshots are split into batches, which are calculated by a pool of
+        worker processes. The network structure is sent to each worker only
+        once, for each batch only the snapshots and the load series are sent.
+        The results are merged in order into the result frames of
+        self.network.
+
+        Parameters
+        ----------
+        :processes (int): default: None
+            number of worker processes; if None, all cores are used
+        :batch_size (int): default: None
+            number of snapshots per batch; if None, the snapshots are split
+            into four batches per process
+        :pf (str): default: 'lpf'
+            'lpf' for a linear, 'pf' for a non-linear power flow
+        :outputs (list): default: None
+            list of tuples (component, attribute) to be merged, see
+            run_pf_chunked
+        :directory (str): default: None
+            if given, the merged results are also written to csv-files
+
+        Returns
+        -------
+        results: dict
+            the merged result frames for each output
+        """
+        if outputs is None:
+            outputs = [('buses_t', 'v_ang'), ('lines_t', 'p0')]
+            if pf == 'pf':
+                outputs += [('buses_t', 'v_mag_pu'), ('lines_t', 'q0')]
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        snapshots = self.snapshots.index
+        if batch_size is None:
+            batch_size = max(1, int(math.ceil(len(snapshots) /
+                                              (4 * processes))))
+        batches = (snapshots[start:start+batch_size]
+                   for start in range(0, len(snapshots), batch_size))
+        batches = ((batch, self._window_p_set(batch), pf, outputs)
+                   for batch in batches)
+
+        # the time series are sent with each batch, the structure only once:
+        structure = self.network.copy(with_time=False)
+        results = {output: [] for output in outputs}
+        pool = multiprocessing.Pool(processes,
+                                    initializer=_init_pfworker,
+                                    initargs=(structure,))
+        try:
+            for num, batch_results in enumerate(pool.imap(_run_pfbatch,
+                                                          batches)):
+                for output in outputs:
+                    results[output] += [batch_results[output]]
+                print('calculated batch {}'.format(num+1))
+        except BaseException:
+            # stop the remaining batches, if one fails:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+        if directory is not None and not os.path.exists(directory):
+            os.makedirs(directory)
+        for output in outputs:
+            component, attr = output
+            if results[output]:
+                results[output] = pd.concat(results[output])
+            else:
+                results[output] = getattr(self.network,
+                                          component)[attr].iloc[:0]
+            if list(self.network.snapshots) == list(snapshots):
+                getattr(self.network, component)[attr] = results[output]
+            if directory is not None:
+                results[output].to_csv(directory + '/' + '-'.join(output) +
+                                       '.csv')
+        return results
+
+    def ptdf(self, weight='x'):
+        """
+        Returns the PTDF-engine (see module ptdf) of the converted dataframes.
+        It is cached and only set up again, if the topology or the line
+        parameters changed. With weight='r' the engine gives the linear
+        voltage sensitivities used by the module hostingcapacity.
+        """
+        slack = slack_buses(self)
+        key = PTDF.topologykey(self.buses, self.lines, list(slack), weight)
+        if not hasattr(self, '_ptdf'):
+            self._ptdf = {}
+        if weight not in self._ptdf or self._ptdf[weight].key != key:
+            self._ptdf[weight] = PTDF.from_importer(self, weight=weight)
+        return self._ptdf[weight]
+
+    def ptdf_flows(self, snapshots=None, method='ptdf'):
+        """
+        Calculates the linear line flows of all (or the given) snapshots at
+        once with the cached PTDF (see ptdf). The injections are taken from
+        the load series (loads_p_set and/or the profile library).
+
+        Parameters
+        ----------
+        :snapshots (pd.Index): default: None
+            snapshots to be calculated; if None, all snapshots
+        :method (str): default: 'ptdf'
+            'ptdf' for one product with the dense PTDF, 'factor' for a solve
+            with the sparse factorisation (less memory for big networks)
+
+        Returns
+        -------
+        flows: pd.DataFrame
+            snapshots x lines in MW
+        """
+        if snapshots is None:
+            snapshots = self.snapshots.index
+        engine = self.ptdf()
+        p_set = self._window_p_set(snapshots)
+        injections = engine.loadinjections(self.loads, p_set)
+        return engine.flows(injections, method=method)
+
+    def run_sweep(self, snapshots=None, fallback=True):
+        """
+        Runs a backward/forward sweep power flow (see module radialsweep) for
+        all radial sub-networks and all (or the given) snapshots at once.
+        The ordering of the radial sub-networks is cached and only set up
+        again, if the topology or the line parameters changed.
+
+        Parameters
+        ----------
+        :snapshots (pd.Index): default: None
+            snapshots to be calculated; if None, all snapshots
+        :fallback (bool): default: True
+            calculate meshed sub-networks with the pypsa power flow of
+            self.network (see importnetwork)
+
+        Returns
+        -------
+        results: dict
+            DataFrames v_mag_pu, v_ang, p0, q0, p1 and q1 and the Series
+            converged (per snapshot)
+        """
+        if snapshots is None:
+            snapshots = self.snapshots.index
+        slack = slack_buses(self)
+        key = (PTDF.topologykey(self.buses, self.lines, list(slack), 'r'),
+               PTDF.topologykey(self.buses, self.lines, list(slack), 'x'))
+        if getattr(self, '_sweepkey', None) != key:
+            self._sweep = BackwardForwardSweep.from_importer(self)
+            self._sweepkey = key
+
+        p_set = self._window_p_set(snapshots)
+        p = load_injections(self._sweep.buses, self.loads, p_set)
+        network = None
+        if fallback is True and hasattr(self, 'network'):
+            network = self.network
+        return self._sweep.solve(p, network=network)
+
+    def _ybuskey(self):
+        """
+        Returns a hash of the buses and line parameters the Ybus depends on.
+        """
+        lines = self.lines[['bus0', 'bus1', 'r', 'x', 'b']]
+        parts = [pd.util.hash_pandas_object(pd.Series(self.buses.index)).values,
+                 pd.util.hash_pandas_object(self.buses['v_nom'].astype(float),
+                                            index=False).values,
+                 pd.util.hash_pandas_object(lines, index=True).values]
+        return hash(np.concatenate(parts).tobytes())
+
+    def _ybus_contribution(self, lines):
+        """
+        Returns the part of the Ybus of the given lines: the series
+        admittances 1/(r+jx) and half of the shunt susceptance b at each end.
+        """
+        incidence = incidence_matrix(self.ybus_buses, lines)
+        y = 1. / (lines['r'].astype(float).values +
+                  1j * lines['x'].astype(float).values)
+        b = lines['b'].astype(float).values
+        if self._ybus_pu is True:
+            v_nom = self.buses['v_nom'].astype(float)
+            v2 = v_nom.reindex(lines['bus0']).values**2
+            y = y * v2
+            b = b * v2
+        shunt = abs(incidence).T @ (0.5j * b)
+        return (incidence.T @ sp.diags(y) @ incidence +
+                sp.diags(shunt)).tocsr()
+
+    def ybus(self, per_unit=False):
+        """
+        Returns the bus admittance matrix assembled directly from the
+        converted buses and lines (see dfstocomponents) without a pypsa
+        network. It is cached and only assembled again, if the buses or
+        lines changed; add_lines and remove_lines update it incrementally.
+        The order of the buses and lines is stored in self.ybus_buses and
+        self.ybus_lines.
+
+        Parameters
+        ----------
+        :per_unit (bool): default: False
+            if False, the matrix is in S; if True, in p.u. with a base
+            power of 1 MVA and v_nom of the buses (as in PyPSA)
+
+        Returns
+        -------
+        ybus: scipy.sparse.csr_matrix
+            complex, buses x buses
+        """
+        key = self._ybuskey()
+        if (getattr(self, '_ybus', None) is None or
+                self._ybus_pu != per_unit or self._ybus_key != key):
+            self.ybus_buses = self.buses.index
+            self.ybus_lines = self.lines.index
+            self._ybus_pu = per_unit
+            self._ybus = self._ybus_contribution(self.lines)
+            self._ybus_key = key
+        return self._ybus
+
+    def add_lines(self, lines):
+        """
+        Adds lines to self.lines and updates the cached Ybus (see ybus)
+        incrementally.
+
+        Parameters
+        ----------
+        :lines (pd.DataFrame):
+            new lines with the columns of self.lines
+        """
+        self.lines = pd.concat([self.lines, lines])
+        if getattr(self, '_ybus', None) is not None:
+            if lines['bus0'].isin(self.ybus_buses).all() and \
+                    lines['bus1'].isin(self.ybus_buses).all():
+                self._ybus = self._ybus + self._ybus_contribution(lines)
+                self.ybus_lines = self.ybus_lines.append(lines.index)
+                self._ybus_key = self._ybuskey()
+            else:
+                # new buses change the dimension, so it is assembled again
+                self._ybus = None
+
+    def remove_lines(self, names):
+        """
+        Removes lines from self.lines and updates the cached Ybus (see ybus)
+        incrementally.
+
+        Parameters
+        ----------
+        :names (list):
+            names of the lines to be removed
+        """
+        lines = self.lines.loc[names]
+        self.lines = self.lines.drop(names)
+        if getattr(self, '_ybus', None) is not None:
+            self._ybus = self._ybus - self._ybus_contribution(lines)
+            self._ybus.eliminate_zeros()
+            self.ybus_lines = self.ybus_lines.drop(names)
+            self._ybus_key = self._ybuskey()
+
     def check_connectivity(self, printdata=False):
         """
         checks, if there are not connected graphs inside the network and
@@ -968,6 +2118,85 @@ class ImporterXMLSincal():
                     print("\tNodes:", sg.nodes(data=True))
                     print("\tEdges:", sg.edges())
 
+    def run_pf_subnetworks(self, processes=None, pf='pf', outputs=None):
+        """
+        Runs the power flow for each sub-network (see check_connectivity)
+        independently in a pool of worker processes and merges the results
+        into the result frames of self.network.
+        If the power flow of a sub-network fails, it is reported and stored
+        in self.failed_subnetworks, while the other sub-networks are still
+        calculated. The results of failed sub-networks are set to nan.
+
+        Parameters
+        ----------
+        :processes (int): default: None
+            number of worker processes; if None, all cores are used
+        :pf (str): default: 'pf'
+            'pf' for a non-linear, 'lpf' for a linear power flow
+        :outputs (list): default: None
+            list of tuples (component, attribute) to be merged. If None, the
+            bus voltages and powers, the line flows and the generator powers
+            are merged.
+
+        Returns
+        -------
+        failed: dict
+            error messages of the failed sub-networks
+        """
+        if outputs is None:
+            outputs = [('buses_t', 'v_ang'), ('buses_t', 'p'),
+                       ('lines_t', 'p0'), ('lines_t', 'p1'),
+                       ('generators_t', 'p')]
+            if pf == 'pf':
+                outputs += [('buses_t', 'v_mag_pu'), ('buses_t', 'q'),
+                            ('lines_t', 'q0'), ('lines_t', 'q1'),
+                            ('generators_t', 'q')]
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        self.network.determine_network_topology()
+        subnets = self.network.sub_networks.index
+        print('calculating {} sub-networks'.format(len(subnets)))
+        jobs = ((subnet,
+                 self.network[self.network.buses.sub_network == subnet],
+                 pf,
+                 outputs) for subnet in subnets)
+
+        results = {output: [] for output in outputs}
+        self.failed_subnetworks = {}
+        pool = multiprocessing.Pool(processes)
+        try:
+            for subnet, sub_results, error in pool.imap_unordered(
+                    _run_subnetwork, jobs):
+                if error is not None:
+                    print('power flow of sub-network {} failed: {}'.format(
+                            subnet, error))
+                    self.failed_subnetworks[subnet] = error
+                    continue
+                for output in outputs:
+                    results[output] += [sub_results[output]]
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+        for output in outputs:
+            component, attr = output
+            names = getattr(self.network, component[:-2]).index
+            merged = pd.DataFrame(index=self.network.snapshots,
+                                  columns=names,
+                                  dtype=float)
+            for frame in results[output]:
+                merged[frame.columns] = frame
+            getattr(self.network, component)[attr] = merged
+
+        print('{} of {} sub-networks failed'.format(
+                len(self.failed_subnetworks), len(subnets)))
+        return self.failed_subnetworks
+
     def del_nogen_subs(self):
         """
         function deletes subgraphs that have no (slack) generator.
@@ -22,6 +22,7 @@ in dataframes via the class XMLimport. It is based on the etree package.
 """
 
 import os
+import hashlib
 import xml.etree.ElementTree as ET
 import pandas as pd
 import pickle
@@ -97,12 +98,43 @@ class XMLimport():
                 pathname of the searched file
         """
 
+        xml_path = None
         for roots, dirs, files in os.walk(self.base_path):
             if filename in files:
                 xml_path = os.path.join(roots, filename)
 
+        if xml_path is None:
+            raise FileNotFoundError('{} not found in {}'.format(
+                    filename, self.base_path))
         return xml_path
 
+    # %%
+    def fingerprint(self, extra=None):
+        """
+            Creates a fingerprint of the content of all files in list_file,
+            e.g. to detect, if a cached result is still valid.
+
+            Parameters
+            ----------
+            extra: dict
+                further parameters to be included in the fingerprint, e.g.
+                parameters of the processing steps
+
+            Returns
+            ----------
+            fingerprint: str
+                hex digest of the sha1-hash
+        """
+        sha = hashlib.sha1()
+        for name in sorted(self.list_file):
+            sha.update(name.encode())
+            with open(self.find_file(self.list_file[name][0]), 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    sha.update(block)
+        if extra is not None:
+            sha.update(repr(sorted(extra.items())).encode())
+        return sha.hexdigest()
+
     # %%
     def find_attributes(self, root):
         """
@@ -143,7 +175,58 @@ class XMLimport():
         return attr_series
 
     # %%
-    def xmltodfs(self):
+    def iter_attributes(self, filepath):
+        """
+            Iterates over the attributes of the elements in the data-section
+            of an XML_file without building the whole tree (iterparse).
+            Each element is dropped after it was read.
+
+            Parameters
+            ----------
+            filepath: str
+                path of the xml-file
+
+            Yields
+            ----------
+            attrib: dict
+                attributes of one element
+        """
+        stack = []
+        for event, element in ET.iterparse(filepath, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                continue
+            stack.pop()
+            if len(stack) == 2 and stack[0].tag == 'xml' and \
+                    stack[1].tag.split('}', 1)[-1] == 'data':
+                yield dict(element.attrib)
+                stack[1].remove(element)
+
+    # %%
+    def read_columns(self, name, columns):
+        """
+            Reads only some columns of a file of list_file, e.g. to decide
+            which rows are needed before the full import.
+
+            Parameters
+            ----------
+            name: str
+                name of the dataframe in list_file
+            columns: list
+                names of the attributes to be read
+
+            Returns
+            ----------
+            data: pd.DataFrame
+                one row per element with the given columns
+        """
+        filepath = self.find_file(self.list_file[name][0])
+        rows = [[attrib.get(col) for col in columns]
+                for attrib in self.iter_attributes(filepath)]
+        return pd.DataFrame(rows, columns=columns)
+
+    # %%
+    def xmltodfs(self, filters=None):
         """
         This function reads in the raw data of the xml-files specified in
         list_file and saves them in separate dataframes.
@@ -153,6 +236,10 @@ class XMLimport():
         :self.list_file: dict
             a list of all files to be imported; parameter is taken from the
             class - no input parameter
+        :filters: dict, default None
+            {name of the dataframe: [column, values]}; only the elements with
+            the column in values are read from these files (streamed with
+            iter_attributes), the other elements are never materialised.
 
         Returns
         -------
@@ -172,18 +259,25 @@ class XMLimport():
             # inserts all found files to list
             filepath = self.find_file(self.list_file[name][0])
 
-            # parse the xml-file
-            tree = ET.parse(filepath)
-
-            # finds root of the xml-file
-            xml_root = tree.getroot()
-
-            # finds all attributes in xml-file
-            attr_series_result = self.find_attributes(xml_root)
-
-            # converts list into dataframe
-            self.xmls[name] = pd.DataFrame.from_dict(data=attr_series_result,
-                                                     orient='columns')
+            if filters is not None and name in filters:
+                column, values = filters[name]
+                values = set(values)
+                rows = [attrib for attrib in self.iter_attributes(filepath)
+                        if attrib.get(column) in values]
+                self.xmls[name] = pd.DataFrame(rows)
+            else:
+                # parse the xml-file
+                tree = ET.parse(filepath)
+
+                # finds root of the xml-file
+                xml_root = tree.getroot()
+
+                # finds all attributes in xml-file
+                attr_series_result = self.find_attributes(xml_root)
+
+                # converts list into dataframe
+                self.xmls[name] = pd.DataFrame.from_dict(
+                        data=attr_series_result, orient='columns')
 
             # set the index column of the file, if one is given
             namegiven = len(self.list_file[name]) > 1